@@ -1,12 +1,67 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Cookie, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import csv
+import io
+import json
 import psycopg2
-from db import get_db_connection
-from datetime import datetime
+from db import iniciar_pool, cerrar_pool, obtener_conexion, devolver_conexion
+from db_async import a_posicionales, iniciar_pool_async, cerrar_pool_async, obtener_conexion_async, devolver_conexion_async
+from datetime import datetime, timezone
+from typing import List, Optional
 import os
+import time
+from cache import cache_respuestas, coincide_etag
+from carga_paralela import cargar_csv_paralelo
+from carga_incremental import CargaEnCurso, cargar_csv_incremental
+from trabajos import ColaLlena, cola_cargas
+from validar_datos import ValidadorCsv
+from carga_masiva import COLUMNAS, FilaInvalida, leer_con_progreso, convertir_fila, convertir_registro, copiar_filas, copiar_filas_async
+from rechazos import RegistroRechazos, leer_rechazos
+from dimensiones import DESCONOCIDO, cache_dimensiones
+from instantanea import instantanea_contrataciones
+from replica import COOKIE_LSN, cookie_lsn, enrutador_lecturas, lsn_de_cookie
+from subida import SUBIDA_MAX_BYTES, LectorCsvSubido, LectorMultipart, SubidaDemasiadoGrande, SubidaInvalida, boundary_de
+from formatos import (
+    TIPO_ARROW, TIPO_CSV, ContratacionesTrimestre, DepartamentoSobrePromedio, ResultadoMetrica,
+    negociar_codificacion, negociar_formato, responder,
+)
+from sentencias import consultar_async, ejecutar, registrar_sentencia
+import metricas
+from metricas import DURACION_CONSULTA, medir, registrar_carga
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los pools se crean al iniciar y los comparten todos los endpoints: el síncrono para
+    # las cargas de CSV y el asíncrono para las rutas async
+    try:
+        iniciar_pool()
+        await iniciar_pool_async()
+        await cache_dimensiones.recargar_async()
+        if MOTOR_METRICAS == "memoria":
+            await instantanea_contrataciones.asegurar_async()
+    except Exception as e:
+        # Sin base de datos la API arranca igual: los pools y las cachés se crean en el primer uso
+        print(f"No se pudo conectar con la base de datos al iniciar: {e}")
+    yield
+    cola_cargas.cerrar()
+    await cerrar_pool_async()
+    cerrar_pool()
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Empleados por transacción en /insertar-lote/stream
+TAMANO_LOTE_STREAM = int(os.getenv("TAMANO_LOTE_STREAM", "5000"))
+# Bytes máximos de una línea de /insertar-lote/stream; una línea sin fin no crece sin límite en memoria
+MAX_LINEA_STREAM = int(os.getenv("MAX_LINEA_STREAM", str(1 << 20)))
+# Máximo de rechazos por página en GET /rechazos/{rechazos_id}
+MAX_RECHAZOS_POR_PAGINA = 1000
+# Procesos del modo de carga paralelo; vacío usa todos los núcleos
+CARGA_PROCESOS = int(os.getenv("CARGA_PROCESOS", "0")) or None
+# Año que consultan los endpoints de métricas cuando no se indica year ni from/to
+ANIO_POR_DEFECTO = 2021
+# "sql" calcula las métricas en PostgreSQL; "memoria" con la copia columnar de instantanea.py
+MOTOR_METRICAS = os.getenv("MOTOR_METRICAS", "sql")
 
 # Configurar CORS
 app.add_middleware(
@@ -17,107 +72,330 @@ app.add_middleware(
     allow_headers=["*"],  
 )
 
-def insertar_datos_desde_csv(nombre_tabla: str, ruta_archivo: str):
+# Latencia por ruta y solicitudes en curso; con METRICAS_HABILITADAS=false no se agrega nada al camino de cada solicitud
+if metricas.HABILITADAS:
+    app.add_middleware(metricas.MiddlewareMetricas)
+
+def claves_dimensiones(nombre_tabla: str):
+    """
+    Obtiene de la caché los ids válidos para las claves foráneas de una carga.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla destino.
+
+    Returns:
+        tuple: (ids de departments, ids de jobs) si la tabla es hired_employees; None en otro caso.
+    """
+    if nombre_tabla != "hired_employees":
+        return None
+    try:
+        cache_dimensiones.asegurar()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return cache_dimensiones.claves()
+
+async def claves_dimensiones_async():
+    """
+    Versión de claves_dimensiones() para las rutas async, que siempre cargan hired_employees.
+
+    Los ids devueltos no recargan la caché ante un id desconocido, porque la recarga
+    sincrónica bloquearía el event loop: las rutas juntan esas filas y las pasan a
+    revisar_inexistentes().
+    """
+    try:
+        await cache_dimensiones.asegurar_async()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return cache_dimensiones.claves(recargar=False)
+
+async def revisar_inexistentes(pendientes, convertir, filas, rechazos):
+    """
+    Resuelve las filas de un lote rechazadas por un department_id o job_id desconocido.
+
+    Hace una sola recarga asíncrona de la caché (limitada como recargar_por_falta) y vuelve a
+    convertir esas filas; las que pasan se agregan a `filas` y el resto se registra como rechazo.
+
+    Args:
+        pendientes (list): Tuplas (número de registro, registro original, FilaInvalida) de las
+            filas rechazadas por un id inexistente.
+        convertir (callable): Convierte un registro original; lanza FilaInvalida si no es válido.
+        filas (list): Filas válidas del lote, a la que se agregan las recuperadas.
+        rechazos (RegistroRechazos): Registro de rechazos del lote.
+    """
+    if pendientes and await cache_dimensiones.recargar_por_falta_async():
+        reintentos, pendientes = pendientes, []
+        for i, registro, _ in reintentos:
+            try:
+                filas.append((i, convertir(registro)))
+            except FilaInvalida as e:
+                pendientes.append((i, registro, e))
+    for i, registro, e in pendientes:
+        rechazos.registrar(i, e.motivo, registro, str(e))
+
+def respuesta_de_carga(nombre_tabla: str, filas_insertadas: int, rechazos: dict, segundos: Optional[float] = None):
+    """
+    Arma la respuesta de una carga de CSV.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla cargada.
+        filas_insertadas (int): Filas enviadas a la base de datos.
+        rechazos (dict): Resumen del registro de rechazos (RegistroRechazos.resumen()).
+        segundos (float): Duración de la carga, para informar filas por segundo.
+
+    Returns:
+        dict: Mensaje, conteos de rechazos por motivo y, si se indica la duración, filas por segundo.
+    """
+    registrar_carga(nombre_tabla, filas_insertadas, rechazos["por_motivo"])
+    if nombre_tabla in ("departments", "jobs"):
+        cache_dimensiones.invalidar()
+    mensaje = f"Datos de {nombre_tabla}.csv cargados: {filas_insertadas} filas insertadas"
+    if rechazos["total"]:
+        mensaje += f", {rechazos['total']} filas con problemas"
+    respuesta = {"mensaje": mensaje, "rechazos": rechazos}
+    if segundos is not None:
+        respuesta["filas_por_segundo"] = round(filas_insertadas / segundos, 1) if segundos > 0 else None
+    return respuesta
+
+def enviar_posicion_escritura(response: Response):
+    """
+    Envía al cliente la posición de WAL de la última escritura para que sus próximas lecturas
+    la vean aunque las atienda otro proceso (read-your-writes con réplica de lectura).
+
+    Args:
+        response (Response): Respuesta a la que se agrega la cookie.
+    """
+    if enrutador_lecturas.lsn_escrito:
+        response.set_cookie(COOKIE_LSN, cookie_lsn(enrutador_lecturas.lsn_escrito), httponly=True, samesite="lax")
+
+# Tipos de las columnas de COLUMNAS para los INSERT preparados de la carga fila por fila
+TIPOS_COLUMNAS = {
+    "hired_employees": ("INTEGER", "VARCHAR", "TIMESTAMP", "INTEGER", "INTEGER"),
+    "departments": ("INTEGER", "VARCHAR"),
+    "jobs": ("INTEGER", "VARCHAR"),
+}
+for _tabla, _columnas in COLUMNAS.items():
+    registrar_sentencia(
+        f"insertar_{_tabla}", TIPOS_COLUMNAS[_tabla],
+        f"INSERT INTO {_tabla} ({', '.join(_columnas)}) "
+        f"VALUES ({', '.join(f'${i}' for i in range(1, len(_columnas) + 1))}) ON CONFLICT DO NOTHING"
+    )
+
+def insertar_datos_desde_csv(nombre_tabla: str, ruta_archivo: str, progreso=None):
     """
     Inserta datos desde un archivo CSV en la base de datos sin omitir filas.
     
     Args:
         nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
         ruta_archivo (str): Ruta del archivo CSV.
+        progreso (callable): Función que recibe el avance de la carga, o None.
     
     Returns:
-        dict: Mensaje de éxito con estadísticas.
+        dict: Mensaje de éxito con estadísticas y el resumen de filas rechazadas.
     """
-    conexion = get_db_connection()
+    if nombre_tabla not in COLUMNAS:
+        raise HTTPException(status_code=400, detail="Nombre de tabla inválido")
+
+    claves = claves_dimensiones(nombre_tabla)
+    conexion = obtener_conexion()
     if conexion is None:
         raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
 
     cursor = conexion.cursor()
     filas_insertadas = 0
-    filas_con_problemas = []
 
     try:
-        with open(ruta_archivo, 'r') as archivo:
-            lector = csv.reader(archivo)
+        with open(ruta_archivo, 'r') as archivo, RegistroRechazos() as rechazos:
+            lector = leer_con_progreso(csv.reader(archivo), progreso)
             for i, fila in enumerate(lector, 1):
-                if nombre_tabla == "hired_employees":
-                    # Asegurar el número correcto de columnas
-                    while len(fila) < 5:
-                        fila.append('')
-                    try:
-                        # Convertir valores numéricos, permitiendo NULL si están vacíos
-                        id_empleado = int(fila[0]) if fila[0].strip() else None
-                        name = fila[1].strip() if fila[1].strip() else None
-                        datetime_valor = fila[2].strip() if fila[2].strip() else None
-                        department_id = int(fila[3]) if fila[3].strip() else None
-                        job_id = int(fila[4]) if fila[4].strip() else None
-                        
-                        # Insertar la fila, incluso si hay valores vacíos
-                        cursor.execute(
-                            "INSERT INTO hired_employees (id, name, datetime, department_id, job_id) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (id) DO NOTHING",
-                            (id_empleado, name, datetime_valor, department_id, job_id)
-                        )
-                        filas_insertadas += 1
-                    except ValueError as e:
-                        filas_con_problemas.append(f"Fila {i}: Error de conversión - {str(e)}: {fila}")
-                
-                elif nombre_tabla == "departments":
-                    while len(fila) < 2:
-                        fila.append('')
-                    try:
-                        id_departamento = int(fila[0]) if fila[0].strip() else None
-                        department = fila[1].strip() if fila[1].strip() else None
-                        cursor.execute(
-                            "INSERT INTO departments (id, department) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING",
-                            (id_departamento, department)
-                        )
-                        filas_insertadas += 1
-                    except ValueError as e:
-                        filas_con_problemas.append(f"Fila {i}: Error de conversión - {str(e)}: {fila}")
-                
-                elif nombre_tabla == "jobs":
-                    while len(fila) < 2:
-                        fila.append('')
-                    try:
-                        id_trabajo = int(fila[0]) if fila[0].strip() else None
-                        job = fila[1].strip() if fila[1].strip() else None
-                        cursor.execute(
-                            "INSERT INTO jobs (id, job) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING",
-                            (id_trabajo, job)
-                        )
-                        filas_insertadas += 1
-                    except ValueError as e:
-                        filas_con_problemas.append(f"Fila {i}: Error de conversión - {str(e)}: {fila}")
-                
-                else:
-                    raise HTTPException(status_code=400, detail="Nombre de tabla inválido")
+                try:
+                    # Las columnas faltantes y los valores vacíos se insertan como NULL
+                    # Sentencia preparada: cada fila solo envía sus valores, sin volver a analizar ni planificar
+                    ejecutar(cursor, f"insertar_{nombre_tabla}", convertir_fila(nombre_tabla, fila, claves))
+                    filas_insertadas += 1
+                except FilaInvalida as e:
+                    rechazos.registrar(i, e.motivo, fila, str(e))
+                    if progreso:
+                        progreso(rechazadas=1)
+        if nombre_tabla == "hired_employees":
+            # Mueve a particiones nuevas las filas de periodos que aún no tenían una
+            cursor.execute("SELECT asegurar_particiones_hired_employees('hired_employees_default');")
         
         conexion.commit()
-        mensaje = f"Datos de {nombre_tabla}.csv cargados: {filas_insertadas} filas insertadas"
-        if filas_con_problemas:
-            mensaje += f", {len(filas_con_problemas)} filas con problemas: {filas_con_problemas}"
-        return {"mensaje": mensaje}
+        enrutador_lecturas.registrar_escritura(conexion)
+        cache_respuestas.incrementar_version()
+        return respuesta_de_carga(nombre_tabla, filas_insertadas, rechazos.resumen())
     
     except Exception as e:
         conexion.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conexion.close()
+        devolver_conexion(conexion)
+
+def insertar_datos_con_copy(nombre_tabla: str, ruta_archivo: str, validar: bool = False, progreso=None):
+    """
+    Inserta datos desde un archivo CSV usando COPY hacia una tabla de staging.
+
+    El archivo se lee y se envía en streaming; las filas con errores de conversión
+    se escriben en el registro de rechazos igual que en la carga fila por fila. Con
+    `validar`, las filas pasan antes por el validador por bloques de validar_datos y los
+    problemas se resumen por categoría. En ambos casos los empleados con un departamento o
+    trabajo inexistente se rechazan según la caché de dimensiones.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
+        ruta_archivo (str): Ruta del archivo CSV.
+        validar (bool): Si se ejecuta la validación previa en línea.
+        progreso (callable): Función que recibe el avance de la carga, o None.
+
+    Returns:
+        dict: Mensaje de éxito con estadísticas, filas por segundo y el resumen de filas rechazadas.
+    """
+    claves = claves_dimensiones(nombre_tabla)
+    conexion = obtener_conexion()
+    if conexion is None:
+        raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
+
+    cursor = conexion.cursor()
+    rechazos = RegistroRechazos()
+
+    def filas_convertidas(lector):
+        for i, fila in enumerate(lector, 1):
+            try:
+                yield i, convertir_fila(nombre_tabla, fila, claves)
+            except FilaInvalida as e:
+                rechazos.registrar(i, e.motivo, fila, str(e))
+                if progreso:
+                    progreso(rechazadas=1)
+
+    try:
+        inicio = time.perf_counter()
+        validador = None
+        if validar:
+            ids_departamentos, ids_trabajos = claves or (None, None)
+            validador = ValidadorCsv(
+                nombre_tabla,
+                ids_departamentos=ids_departamentos,
+                ids_trabajos=ids_trabajos,
+                rechazos=rechazos,
+                recargar_claves=cache_dimensiones.recargar_por_falta if claves else None
+            )
+        with open(ruta_archivo, 'r') as archivo:
+            lector = leer_con_progreso(csv.reader(archivo), progreso)
+            filas = validador.filas(lector) if validador else filas_convertidas(lector)
+            filas_insertadas, _ = copiar_filas(cursor, nombre_tabla, filas)
+        if validador and progreso:
+            progreso(rechazadas=sum(validador.problemas.values()))
+        conexion.commit()
+        enrutador_lecturas.registrar_escritura(conexion)
+        cache_respuestas.incrementar_version()
+        segundos = time.perf_counter() - inicio
+
+        respuesta = respuesta_de_carga(nombre_tabla, filas_insertadas, rechazos.resumen(), segundos)
+        if validador:
+            resumen = validador.resumen()
+            respuesta["validacion"] = {"problemas": resumen["problemas"], "ejemplos": resumen["ejemplos"]}
+        return respuesta
+
+    except Exception as e:
+        conexion.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        rechazos.cerrar()
+        cursor.close()
+        devolver_conexion(conexion)
+
+def insertar_datos_en_paralelo(nombre_tabla: str, ruta_archivo: str, procesos: Optional[int], progreso=None):
+    """
+    Inserta datos desde un archivo CSV grande repartiendo la carga entre varios procesos.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
+        ruta_archivo (str): Ruta del archivo CSV.
+        procesos (int): Número de procesos trabajadores.
+        progreso (callable): Función que recibe el avance de la carga, o None.
 
-@app.post("/cargar-csv/{nombre_tabla}")
-def cargar_csv(nombre_tabla: str):
+    Returns:
+        dict: Mensaje de éxito con estadísticas, filas por segundo y procesos usados.
+    """
+    claves = claves_dimensiones(nombre_tabla)
+    try:
+        resultado = cargar_csv_paralelo(nombre_tabla, ruta_archivo, procesos, progreso, claves)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    enrutador_lecturas.registrar_escritura()
+    cache_respuestas.incrementar_version()
+
+    respuesta = respuesta_de_carga(nombre_tabla, resultado["filas_insertadas"], resultado["rechazos"], resultado["segundos"])
+    respuesta["procesos"] = resultado["procesos"]
+    return respuesta
+
+def insertar_datos_incremental(nombre_tabla: str, ruta_archivo: str, progreso=None):
+    """
+    Carga solo la parte nueva de un archivo CSV según el manifiesto de cargas.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
+        ruta_archivo (str): Ruta del archivo CSV.
+        progreso (callable): Función que recibe el avance de la carga, o None.
+
+    Returns:
+        dict: Mensaje con el estado ("sin_cambios", "incremental" o "completa"), el byte desde
+            el que se leyó, los lotes confirmados, filas por segundo y el resumen de filas rechazadas.
+    """
+    claves = claves_dimensiones(nombre_tabla)
+    conexion = obtener_conexion()
+    if conexion is None:
+        raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
+
+    try:
+        resultado = cargar_csv_incremental(conexion, nombre_tabla, ruta_archivo, progreso, claves=claves)
+    except CargaEnCurso as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        conexion.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        devolver_conexion(conexion)
+    if resultado["lotes"]:
+        enrutador_lecturas.registrar_escritura()
+        cache_respuestas.incrementar_version()
+
+    if resultado["estado"] == "sin_cambios":
+        respuesta = {
+            "mensaje": f"Datos de {nombre_tabla}.csv sin cambios desde la última carga",
+            "rechazos": resultado["rechazos"],
+        }
+    else:
+        respuesta = respuesta_de_carga(nombre_tabla, resultado["filas_insertadas"], resultado["rechazos"], resultado["segundos"])
+    respuesta.update(
+        estado=resultado["estado"], desde_byte=resultado["desde_byte"], lotes=resultado["lotes"],
+        bytes_pendientes=resultado["bytes_pendientes"]
+    )
+    return respuesta
+
+@app.post("/cargar-csv/{nombre_tabla}", status_code=202)
+def cargar_csv(nombre_tabla: str, modo: str = "copy", procesos: Optional[int] = None, validar: bool = False):
     """
     Endpoint para cargar datos desde un archivo CSV a la base de datos.
 
+    La carga se encola como un trabajo en segundo plano y la respuesta se devuelve de
+    inmediato; el avance y el resultado se consultan en GET /jobs/{trabajo_id}.
+
     Args:
         nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
+        modo (str): "copy" para la carga masiva con COPY, "paralelo" para repartirla entre
+            varios procesos, "incremental" para cargar solo lo que cambió desde la última carga
+            o "fila" para insertar fila por fila.
+        procesos (int): Procesos trabajadores del modo "paralelo"; por defecto CARGA_PROCESOS o los núcleos disponibles.
+        validar (bool): En modo "copy", valida las filas por bloques antes de enviarlas y resume los problemas por categoría.
 
     Returns:
-        dict: Mensaje de éxito si los datos se cargan correctamente.
+        dict: Id del trabajo, su estado y la URL para consultarlo.
 
     Raises:
-        HTTPException: Si el nombre de la tabla no es válido.
+        HTTPException: 400 si el nombre de la tabla o el modo no son válidos, 404 si no existe el
+            archivo CSV o 429 si la cola de cargas está llena.
     """
     rutas_archivos = {
         "hired_employees": "data/hired_employees.csv",
@@ -126,15 +404,186 @@ def cargar_csv(nombre_tabla: str):
     }
     if nombre_tabla not in rutas_archivos:
         raise HTTPException(status_code=400, detail="Nombre de tabla inválido")
-    return insertar_datos_desde_csv(nombre_tabla, rutas_archivos[nombre_tabla])
+    if modo not in ("copy", "paralelo", "incremental", "fila"):
+        raise HTTPException(status_code=400, detail="Modo de carga inválido")
+    if validar and modo != "copy":
+        raise HTTPException(status_code=400, detail="La validación previa solo está disponible en modo copy")
+    if modo == "paralelo" and procesos is not None and procesos < 1:
+        raise HTTPException(status_code=400, detail="El número de procesos debe ser mayor que 0")
+    ruta_archivo = rutas_archivos[nombre_tabla]
+
+    def ejecutar(trabajo):
+        if modo == "copy":
+            return insertar_datos_con_copy(nombre_tabla, ruta_archivo, validar, trabajo.registrar)
+        if modo == "paralelo":
+            return insertar_datos_en_paralelo(nombre_tabla, ruta_archivo, procesos or CARGA_PROCESOS, trabajo.registrar)
+        if modo == "incremental":
+            return insertar_datos_incremental(nombre_tabla, ruta_archivo, trabajo.registrar)
+        return insertar_datos_desde_csv(nombre_tabla, ruta_archivo, trabajo.registrar)
+
+    try:
+        tamano = os.path.getsize(ruta_archivo)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archivo {ruta_archivo} no encontrado")
+    try:
+        trabajo = cola_cargas.enviar(nombre_tabla, modo, ejecutar, tamano)
+    except ColaLlena as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"trabajo_id": trabajo.id, "estado": trabajo.estado, "url": f"/jobs/{trabajo.id}"}
+
+@app.post("/subir-csv/{nombre_tabla}")
+async def subir_csv(nombre_tabla: str, request: Request, response: Response):
+    """
+    Endpoint para cargar un CSV enviado en la solicitud como formulario multipart/form-data.
+
+    El archivo va en el campo `archivo` y puede estar comprimido con gzip. El cuerpo se
+    separa, descomprime y convierte a medida que llega y las filas van directo al COPY de la
+    carga masiva, sin guardar el archivo en memoria ni en disco. El siguiente bloque no se lee
+    hasta que asyncpg pudo enviar el anterior a PostgreSQL, así que un cliente más rápido que
+    la base queda frenado por el control de flujo de TCP. Toda la carga es una transacción:
+    si el cuerpo es inválido, supera SUBIDA_MAX_MB o se corta, no se inserta nada.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla donde se insertarán los datos.
+        request (Request): Solicitud con el formulario.
+        response (Response): Respuesta a la que se agrega la cookie con la posición de la escritura.
+
+    Returns:
+        dict: Mensaje con las filas insertadas, filas por segundo, rechazos, bytes recibidos y
+            si el archivo venía comprimido.
+
+    Raises:
+        HTTPException: 400 si la tabla o el formulario no son válidos, 413 si el cuerpo o el CSV
+            descomprimido superan el máximo, 415 si el cuerpo no es multipart/form-data o 500 si
+            falla la base de datos.
+    """
+    if nombre_tabla not in COLUMNAS:
+        raise HTTPException(status_code=400, detail="Nombre de tabla inválido")
+    boundary = boundary_de(request.headers.get("content-type"))
+    if boundary is None:
+        raise HTTPException(status_code=415, detail="Se espera multipart/form-data con el CSV en el campo 'archivo'")
+    if int(request.headers.get("content-length") or 0) > SUBIDA_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"El cuerpo supera el máximo de {SUBIDA_MAX_BYTES} bytes")
+
+    claves = await claves_dimensiones_async() if nombre_tabla == "hired_employees" else None
+    conexion = await obtener_conexion_async()
+    if conexion is None:
+        raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
+
+    multipart = LectorMultipart(boundary)
+    lector = LectorCsvSubido(SUBIDA_MAX_BYTES)
+    rechazos = RegistroRechazos()
+    recibidos = 0
+    i = 0
+
+    def convertir_una(fila):
+        return convertir_fila(nombre_tabla, fila, claves)
+
+    async def convertir(texto):
+        nonlocal i
+        filas = []
+        inexistentes = []
+        for fila in csv.reader(io.StringIO(texto)):
+            i += 1
+            try:
+                filas.append((i, convertir_una(fila)))
+            except FilaInvalida as e:
+                if e.clave_inexistente:
+                    inexistentes.append((i, fila, e))
+                else:
+                    rechazos.registrar(i, e.motivo, fila, str(e))
+        await revisar_inexistentes(inexistentes, convertir_una, filas, rechazos)
+        return filas
+
+    async def filas_subidas():
+        nonlocal recibidos
+        async for bloque in request.stream():
+            recibidos += len(bloque)
+            if recibidos > SUBIDA_MAX_BYTES:
+                raise SubidaDemasiadoGrande(f"El cuerpo supera el máximo de {SUBIDA_MAX_BYTES} bytes")
+            for datos in multipart.alimentar(bloque):
+                for texto in lector.alimentar(datos):
+                    yield await convertir(texto)
+        multipart.terminar()
+        yield await convertir(lector.terminar())
+
+    try:
+        inicio = time.perf_counter()
+        async with conexion.transaction():
+            filas_insertadas, _ = await copiar_filas_async(conexion, nombre_tabla, filas_subidas())
+        await enrutador_lecturas.registrar_escritura_async(conexion)
+        cache_respuestas.incrementar_version()
+        segundos = time.perf_counter() - inicio
+
+        enviar_posicion_escritura(response)
+        respuesta = respuesta_de_carga(nombre_tabla, filas_insertadas, rechazos.resumen(), segundos)
+        respuesta.update(bytes_recibidos=recibidos, comprimido=bool(lector.comprimido))
+        return respuesta
+    except SubidaDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except SubidaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        rechazos.cerrar()
+        await devolver_conexion_async(conexion)
+
+@app.get("/jobs/{trabajo_id}")
+def consultar_trabajo(trabajo_id: str, response: Response):
+    """
+    Endpoint para consultar el avance de una carga en segundo plano.
+
+    Args:
+        trabajo_id (str): Id devuelto por POST /cargar-csv/{nombre_tabla}.
+        response (Response): Respuesta; al completarse la carga lleva la cookie con su posición de WAL.
+
+    Returns:
+        dict: Estado, filas procesadas y rechazadas, filas por segundo, ETA y resultado o error.
+
+    Raises:
+        HTTPException: 404 si el trabajo no existe o ya salió del historial.
+    """
+    trabajo = cola_cargas.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if trabajo.estado == "completado":
+        enviar_posicion_escritura(response)
+    return trabajo.estado_actual()
+
+@app.get("/rechazos/{rechazos_id}")
+def consultar_rechazos(rechazos_id: str, cursor: int = 0, limite: int = 100):
+    """
+    Endpoint para consultar por páginas las filas rechazadas de una carga.
+
+    Args:
+        rechazos_id (str): Id del registro de rechazos devuelto en la respuesta de la carga.
+        cursor (int): Posición desde la que leer; 0 o el `siguiente` de la página anterior.
+        limite (int): Máximo de rechazos por página (hasta MAX_RECHAZOS_POR_PAGINA).
+
+    Returns:
+        dict: Rechazos de la página (fila, motivo, detalle y datos crudos) y el cursor siguiente,
+            o None si no hay más.
+
+    Raises:
+        HTTPException: 400 si el cursor o el límite no son válidos, 404 si el registro no existe.
+    """
+    if cursor < 0 or not 1 <= limite <= MAX_RECHAZOS_POR_PAGINA:
+        raise HTTPException(status_code=400, detail=f"El cursor debe ser positivo y el límite estar entre 1 y {MAX_RECHAZOS_POR_PAGINA}")
+    pagina = leer_rechazos(rechazos_id, cursor, limite)
+    if pagina is None:
+        raise HTTPException(status_code=404, detail="Registro de rechazos no encontrado")
+    rechazos, siguiente = pagina
+    return {"id": rechazos_id, "rechazos": rechazos, "siguiente": siguiente}
 
 @app.post("/insertar-lote")
-def insertar_lote(empleados: list[dict]):
+async def insertar_lote(empleados: list[dict], response: Response):
     """
     Endpoint para insertar una lista de empleados en la base de datos.
 
     Args:
         empleados (list[dict]): Lista de diccionarios con los datos de los empleados.
+        response (Response): Respuesta a la que se agrega la cookie con la posición de la escritura.
 
     Returns:
         dict: Mensaje de éxito si los datos se insertan correctamente.
@@ -145,54 +594,363 @@ def insertar_lote(empleados: list[dict]):
     if len(empleados) > 1000:
         raise HTTPException(status_code=400, detail="No se pueden insertar más de 1000 filas a la vez")
     
-    conexion = get_db_connection()
+    claves = await claves_dimensiones_async()
+    filas_validas = []
+    inexistentes = []
+
+    def convertir(empleado):
+        return convertir_registro(empleado, claves)
+
+    with RegistroRechazos() as rechazos:
+        for i, empleado in enumerate(empleados, 1):
+            try:
+                filas_validas.append((i, convertir(empleado)))
+            except FilaInvalida as e:
+                if e.clave_inexistente:
+                    inexistentes.append((i, empleado, e))
+                else:
+                    rechazos.registrar(i, e.motivo, empleado, str(e))
+        await revisar_inexistentes(inexistentes, convertir, filas_validas, rechazos)
+
+    conexion = await obtener_conexion_async()
+    if conexion is None:
+        raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
+
+    try:
+        # Todo el lote se envía en un único COPY en lugar de un INSERT por empleado
+        filas_insertadas = await insertar_lote_confirmado(conexion, filas_validas)
+        enviar_posicion_escritura(response)
+        registrar_carga("hired_employees", 0, rechazos.por_motivo)
+        mensaje = f"{filas_insertadas} empleados insertados exitosamente"
+        if rechazos.total:
+            mensaje += f", {rechazos.total} registros con problemas"
+        return {"mensaje": mensaje, "rechazos": rechazos.resumen()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await devolver_conexion_async(conexion)
+
+async def insertar_lote_confirmado(conexion, filas):
+    """
+    Inserta un lote de empleados ya convertidos en su propia transacción.
+
+    Args:
+        conexion: Conexión de asyncpg.
+        filas (list): Tuplas (número de registro, valores convertidos).
+
+    Returns:
+        int: Número de filas enviadas a la base de datos.
+    """
+    async with conexion.transaction():
+        filas_enviadas, _ = await copiar_filas_async(conexion, "hired_employees", filas)
+    # La posición se registra antes de invalidar para que ninguna lectura posterior use una réplica atrasada
+    await enrutador_lecturas.registrar_escritura_async(conexion)
+    cache_respuestas.incrementar_version()
+    # Se cuenta por lote confirmado para que un streaming interrumpido no pierda lo ya insertado
+    registrar_carga("hired_employees", filas_enviadas, {})
+    return filas_enviadas
+
+@app.post("/insertar-lote/stream")
+async def insertar_lote_stream(request: Request, response: Response, tamano_lote: int = TAMANO_LOTE_STREAM):
+    """
+    Endpoint para insertar empleados enviados como NDJSON (un objeto JSON por línea) sin límite de tamaño.
+
+    El cuerpo se procesa a medida que llega: cada línea se valida y los empleados se
+    confirman en lotes de `tamano_lote`, por lo que la memoria no depende del tamaño
+    total de la carga. El siguiente bloque del cuerpo no se lee hasta confirmar el lote.
+
+    Args:
+        request (Request): Solicitud con el cuerpo NDJSON, normalmente enviado en chunks.
+        response (Response): Respuesta a la que se agrega la cookie con la posición de la escritura.
+        tamano_lote (int): Número de empleados por transacción.
+
+    Returns:
+        dict: Mensaje con los empleados insertados, lotes confirmados y registros con problemas.
+
+    Raises:
+        HTTPException: 400 si el tamaño de lote no es válido, 413 si una línea supera
+            MAX_LINEA_STREAM bytes o 500 si falla la base de datos.
+    """
+    if tamano_lote < 1:
+        raise HTTPException(status_code=400, detail="El tamaño de lote debe ser mayor que 0")
+
+    claves = await claves_dimensiones_async()
+    conexion = await obtener_conexion_async()
     if conexion is None:
         raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
 
-    cursor = conexion.cursor()
     filas_insertadas = 0
-    filas_con_problemas = []
+    lotes_confirmados = 0
+    rechazos = RegistroRechazos()
+    lote = []
+    inexistentes = []
+    pendiente = b""
+    i = 0
+
+    def convertir(linea):
+        return convertir_registro(json.loads(linea), claves)
+
+    def procesar_linea(linea):
+        nonlocal i
+        if not linea.strip():
+            return
+        i += 1
+        try:
+            lote.append((i, convertir(linea)))
+        except FilaInvalida as e:
+            if e.clave_inexistente:
+                inexistentes.append((i, linea, e))
+            else:
+                rechazos.registrar(i, e.motivo, linea, str(e))
+        except ValueError as e:
+            rechazos.registrar(i, "json_invalido", linea, str(e))
+
+    async def confirmar_lote():
+        nonlocal lote, inexistentes, filas_insertadas, lotes_confirmados
+        await revisar_inexistentes(inexistentes, convertir, lote, rechazos)
+        if lote:
+            filas_insertadas += await insertar_lote_confirmado(conexion, lote)
+            lotes_confirmados += 1
+        lote, inexistentes = [], []
 
     try:
-        for i, empleado in enumerate(empleados, 1):
-            try:
-                # Verificar que todas las claves necesarias estén presentes
-                if not all(key in empleado for key in ["id", "name", "datetime", "department_id", "job_id"]):
-                    filas_con_problemas.append(f"Registro {i}: Faltan claves - {empleado}")
-                    continue
-                try:
-                    id_empleado = int(empleado["id"]) if empleado["id"] else None
-                    departamento_id = int(empleado["department_id"]) if empleado["department_id"] else None
-                    trabajo_id = int(empleado["job_id"]) if empleado["job_id"] else None
-                except (ValueError, TypeError):
-                    filas_con_problemas.append(f"Registro {i}: Error de conversión - {empleado}")
-                    continue
-                name = empleado["name"].strip() if empleado["name"] and empleado["name"].strip() else None
-                datetime_valor = empleado["datetime"].strip() if empleado["datetime"] and empleado["datetime"].strip() else None
-                
-                cursor.execute(
-                    "INSERT INTO hired_employees (id, name, datetime, department_id, job_id) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (id) DO NOTHING",
-                    (id_empleado, name, datetime_valor, departamento_id, trabajo_id)
+        async for bloque in request.stream():
+            pendiente += bloque
+            *lineas, pendiente = pendiente.split(b"\n")
+            if len(pendiente) > MAX_LINEA_STREAM or any(len(linea) > MAX_LINEA_STREAM for linea in lineas):
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Línea de más de {MAX_LINEA_STREAM} bytes ({filas_insertadas} empleados ya confirmados)"
                 )
-                filas_insertadas += 1
-            except Exception as e:
-                filas_con_problemas.append(f"Registro {i}: Error - {str(e)}: {empleado}")
-        
-        conexion.commit()
-        mensaje = f"{filas_insertadas} empleados insertados exitosamente"
-        if filas_con_problemas:
-            mensaje += f", {len(filas_con_problemas)} registros con problemas: {filas_con_problemas}"
-        return {"mensaje": mensaje}
+            for linea in lineas:
+                procesar_linea(linea)
+                if len(lote) + len(inexistentes) >= tamano_lote:
+                    await confirmar_lote()
+        procesar_linea(pendiente)
+        await confirmar_lote()
+
+        enviar_posicion_escritura(response)
+        registrar_carga("hired_employees", 0, rechazos.por_motivo)
+        mensaje = f"{filas_insertadas} empleados insertados exitosamente en {lotes_confirmados} lotes"
+        if rechazos.total:
+            mensaje += f", {rechazos.total} registros con problemas"
+        return {"mensaje": mensaje, "rechazos": rechazos.resumen()}
+    except HTTPException:
+        raise
     except Exception as e:
-        conexion.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"{str(e)} ({filas_insertadas} empleados ya confirmados)")
     finally:
-        cursor.close()
-        conexion.close()
+        rechazos.cerrar()
+        await devolver_conexion_async(conexion)
 
-def obtener_contrataciones_por_trimestre():
+async def responder_con_cache(
+    endpoint: str, parametros: tuple, modelo, calcular, if_none_match: Optional[str],
+    accept: Optional[str], accept_encoding: Optional[str], lsn_cliente: Optional[str] = None
+):
     """
-    Obtiene el número de empleados contratados por cada trabajo y departamento en 2021, dividido por trimestre.
+    Responde un endpoint de lectura desde el cache, con ETag y 304 Not Modified.
+
+    El ETag depende de la versión de datos, del período del TTL del cache y de la
+    representación (formato y compresión), así que un cliente con el ETag vigente recibe 304
+    sin que se ejecute la consulta ni se serialice el resultado, pero no más allá de un TTL.
+
+    Args:
+        endpoint (str): Nombre del endpoint.
+        parametros (tuple): Parámetros que determinan el resultado.
+        modelo (type): Modelo de pydantic de cada fila.
+        calcular (callable): Función asíncrona que ejecuta la consulta y devuelve las filas.
+        if_none_match (str): Valor de la cabecera If-None-Match.
+        accept (str): Valor de la cabecera Accept: JSON, CSV o Arrow IPC.
+        accept_encoding (str): Valor de la cabecera Accept-Encoding: br, gzip o sin comprimir.
+        lsn_cliente (str): Posición de WAL de la última escritura del cliente, o None.
+
+    Returns:
+        Response: 304 sin cuerpo o el resultado en el formato negociado.
+
+    Raises:
+        HTTPException: 406 si el cliente no acepta ninguno de los formatos disponibles.
+    """
+    formato = negociar_formato(accept)
+    if formato is None:
+        raise HTTPException(status_code=406, detail="Formatos disponibles: application/json, text/csv y " + TIPO_ARROW)
+    codificacion = negociar_codificacion(accept_encoding)
+
+    async def calcular_resultado():
+        return ResultadoMetrica(await calcular(), modelo)
+
+    version = cache_respuestas.version
+    etag = cache_respuestas.etag(endpoint, parametros + (formato, codificacion), version)
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if enrutador_lecturas.cliente_adelantado(lsn_cliente):
+        # El cliente escribió en otro proceso: ni el cache ni su ETag reflejan esa escritura
+        return responder(await calcular_resultado(), formato, codificacion, {"Cache-Control": "no-cache", "Vary": cabeceras["Vary"]})
+    if coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers=cabeceras)
+    resultado = await cache_respuestas.obtener_o_calcular_async(endpoint, parametros, version, calcular_resultado)
+    return responder(resultado, formato, codificacion, cabeceras)
+
+# Formatos alternativos de los endpoints de métricas, para la documentación de OpenAPI
+RESPUESTAS_METRICAS = {200: {"content": {TIPO_CSV: {}, TIPO_ARROW: {}}}}
+
+def rango_fechas(year: Optional[int], desde: Optional[datetime], hasta: Optional[datetime]):
+    """
+    Convierte los parámetros de filtro de los endpoints de métricas en un rango semiabierto [desde, hasta).
+
+    Args:
+        year (int): Año a consultar; excluyente con desde/hasta.
+        desde (datetime): Inicio del rango (incluido).
+        hasta (datetime): Fin del rango (excluido).
+
+    Returns:
+        tuple: (desde, hasta) como timestamps sin zona horaria. Sin parámetros se usa 2021.
+
+    Raises:
+        HTTPException: Si los parámetros son inconsistentes.
+    """
+    if year is not None and (desde is not None or hasta is not None):
+        raise HTTPException(status_code=400, detail="Use year o from/to, no ambos")
+    if desde is None and hasta is None:
+        year = ANIO_POR_DEFECTO if year is None else year
+        if not 1 <= year < 9999:
+            raise HTTPException(status_code=400, detail="Año inválido")
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    if desde is None or hasta is None:
+        raise HTTPException(status_code=400, detail="Se deben indicar from y to")
+    # La columna es TIMESTAMP sin zona; comparar contra un valor con zona impediría usar el índice
+    if desde.tzinfo is not None:
+        desde = desde.astimezone(timezone.utc).replace(tzinfo=None)
+    if hasta.tzinfo is not None:
+        hasta = hasta.astimezone(timezone.utc).replace(tzinfo=None)
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="from debe ser anterior a to")
+    return desde, hasta
+
+def _inicio_de_trimestre(fecha: datetime):
+    return fecha.day == 1 and fecha.month in (1, 4, 7, 10) and fecha.time() == datetime.min.time()
+
+# Subconsultas posibles de las métricas, con columnas department_id, job_id, quarter y hires,
+# y los tipos de sus parámetros. Cada métrica se registra como sentencia preparada por fuente.
+FUENTES_CONTRATACIONES = {
+    # Rangos que empiezan y terminan en inicio de trimestre: se lee la tabla resumen
+    "resumen": ("""
+        SELECT department_id, job_id, quarter, hires
+        FROM hired_employees_rollup
+        WHERE (year, quarter) >= (%s, %s) AND (year, quarter) < (%s, %s)
+    """, ("INTEGER", "INTEGER", "INTEGER", "INTEGER")),
+    # Cualquier otro rango: semiabierto sobre hired_employees, que puede usar el índice de datetime
+    "rango": ("""
+        SELECT department_id, job_id, EXTRACT(QUARTER FROM datetime)::INTEGER as quarter, 1 as hires
+        FROM hired_employees
+        WHERE datetime >= %s AND datetime < %s
+    """, ("TIMESTAMP", "TIMESTAMP")),
+}
+
+def fuente_contrataciones(desde: datetime, hasta: datetime):
+    """
+    Elige la subconsulta con las contrataciones del rango, con columnas department_id, job_id, quarter y hires.
+
+    Si el rango empieza y termina en inicio de trimestre se lee la tabla resumen; en otro
+    caso se filtra hired_employees con un rango semiabierto que puede usar el índice de datetime.
+
+    Args:
+        desde (datetime): Inicio del rango (incluido).
+        hasta (datetime): Fin del rango (excluido).
+
+    Returns:
+        tuple: (clave de FUENTES_CONTRATACIONES, SQL de la subconsulta, parámetros).
+    """
+    if _inicio_de_trimestre(desde) and _inicio_de_trimestre(hasta):
+        parametros = (desde.year, (desde.month + 2) // 3, hasta.year, (hasta.month + 2) // 3)
+        return "resumen", FUENTES_CONTRATACIONES["resumen"][0], parametros
+    return "rango", FUENTES_CONTRATACIONES["rango"][0], (desde, hasta)
+
+def sql_contrataciones_por_trimestre(fuente: str):
+    """Consulta de contrataciones por departamento, trabajo y trimestre sobre una subconsulta."""
+    return f"""
+        SELECT 
+            r.department_id,
+            r.job_id,
+            SUM(CASE WHEN r.quarter = 1 THEN r.hires ELSE 0 END) as Q1,
+            SUM(CASE WHEN r.quarter = 2 THEN r.hires ELSE 0 END) as Q2,
+            SUM(CASE WHEN r.quarter = 3 THEN r.hires ELSE 0 END) as Q3,
+            SUM(CASE WHEN r.quarter = 4 THEN r.hires ELSE 0 END) as Q4
+        FROM ({fuente}) r
+        GROUP BY r.department_id, r.job_id;
+    """
+
+def sql_contrataciones_por_departamento(fuente: str):
+    """Consulta de contrataciones por department_id sobre una subconsulta."""
+    # El promedio y el filtro se calculan en Python sobre este resultado
+    return f"""
+        SELECT department_id, SUM(hires) as contratados
+        FROM ({fuente}) r
+        GROUP BY department_id;
+    """
+
+def consulta_contrataciones_por_trimestre(desde: datetime, hasta: datetime):
+    """
+    Construye la consulta de contrataciones por trimestre para un rango de fechas.
+
+    La consulta agrupa por ids; los nombres se resuelven después con la caché de dimensiones.
+
+    Args:
+        desde (datetime): Inicio del rango (incluido).
+        hasta (datetime): Fin del rango (excluido).
+
+    Returns:
+        tuple: (SQL, parámetros).
+    """
+    _, fuente, parametros = fuente_contrataciones(desde, hasta)
+    return sql_contrataciones_por_trimestre(fuente), parametros
+
+for _clave, (_fuente, _tipos) in FUENTES_CONTRATACIONES.items():
+    registrar_sentencia(f"contrataciones_por_trimestre_{_clave}", _tipos, a_posicionales(sql_contrataciones_por_trimestre(_fuente)))
+    registrar_sentencia(f"contrataciones_por_departamento_{_clave}", _tipos, a_posicionales(sql_contrataciones_por_departamento(_fuente)))
+
+def trimestres_por_nombre(filas):
+    """
+    Resuelve los nombres de las contrataciones agrupadas por ids y las ordena.
+
+    Args:
+        filas (iterable): Tuplas (department_id, job_id, Q1, Q2, Q3, Q4).
+
+    Returns:
+        list: Diccionarios por departamento y trabajo, ordenados por nombre.
+    """
+    # Los ids nulos o inexistentes se suman bajo "Unknown", como hacía el LEFT JOIN
+    trimestres = {}
+    for fila in filas:
+        clave = (cache_dimensiones.nombre_departamento(fila[0]), cache_dimensiones.nombre_trabajo(fila[1]))
+        suma = trimestres.setdefault(clave, [0, 0, 0, 0])
+        for q in range(4):
+            suma[q] += int(fila[2 + q])
+    return [
+        {
+            "departamento": departamento,
+            "trabajo": trabajo,
+            "Q1": suma[0],
+            "Q2": suma[1],
+            "Q3": suma[2],
+            "Q4": suma[3]
+        }
+        for (departamento, trabajo), suma in sorted(trimestres.items())
+    ]
+
+async def asegurar_instantanea(lsn_cliente: Optional[str] = None):
+    """Refresca la copia columnar si hace falta, respondiendo 500 si no se puede leer."""
+    try:
+        await instantanea_contrataciones.asegurar_async(lsn_cliente)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def obtener_contrataciones_por_trimestre(desde: datetime, hasta: datetime, lsn_cliente: Optional[str] = None):
+    """
+    Obtiene el número de empleados contratados por cada trabajo y departamento en un rango de fechas, dividido por trimestre.
+
+    Args:
+        desde (datetime): Inicio del rango (incluido).
+        hasta (datetime): Fin del rango (excluido).
+        lsn_cliente (str): Posición de WAL que la réplica debe haber aplicado para usarla.
 
     Returns:
         list: Lista de diccionarios con las contrataciones por trimestre.
@@ -200,59 +958,98 @@ def obtener_contrataciones_por_trimestre():
     Raises:
         HTTPException: Si hay un error al conectar a la base de datos o al ejecutar la consulta.
     """
-    conexion = get_db_connection()
+    await claves_dimensiones_async()
+    if MOTOR_METRICAS == "memoria":
+        await asegurar_instantanea(lsn_cliente)
+        return trimestres_por_nombre(instantanea_contrataciones.contrataciones_por_trimestre(desde, hasta))
+
+    # Las métricas se leen de la réplica cuando está al día
+    conexion, destino = await enrutador_lecturas.obtener(lsn_cliente)
     if conexion is None:
         raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
 
-    cursor = conexion.cursor()
     try:
-        cursor.execute("""
-            SELECT 
-                COALESCE(d.department, 'Unknown') as department,
-                COALESCE(j.job, 'Unknown') as job,
-                SUM(CASE WHEN EXTRACT(MONTH FROM e.datetime) BETWEEN 1 AND 3 THEN 1 ELSE 0 END) as Q1,
-                SUM(CASE WHEN EXTRACT(MONTH FROM e.datetime) BETWEEN 4 AND 6 THEN 1 ELSE 0 END) as Q2,
-                SUM(CASE WHEN EXTRACT(MONTH FROM e.datetime) BETWEEN 7 AND 9 THEN 1 ELSE 0 END) as Q3,
-                SUM(CASE WHEN EXTRACT(MONTH FROM e.datetime) BETWEEN 10 AND 12 THEN 1 ELSE 0 END) as Q4
-            FROM hired_employees e
-            LEFT JOIN departments d ON e.department_id = d.id
-            LEFT JOIN jobs j ON e.job_id = j.id
-            WHERE EXTRACT(YEAR FROM e.datetime) = 2021
-            GROUP BY d.department, j.job
-            ORDER BY COALESCE(d.department, 'Unknown'), COALESCE(j.job, 'Unknown');
-        """)
-        filas = cursor.fetchall()
-        resultado = [
-            {
-                "departamento": fila[0],
-                "trabajo": fila[1],
-                "Q1": int(fila[2]),
-                "Q2": int(fila[3]),
-                "Q3": int(fila[4]),
-                "Q4": int(fila[5])
-            }
-            for fila in filas
-        ]
-        return resultado
+        clave, _, parametros = fuente_contrataciones(desde, hasta)
+        with medir(DURACION_CONSULTA, query="contrataciones_por_trimestre"):
+            filas = await consultar_async(conexion, f"contrataciones_por_trimestre_{clave}", *parametros)
+        return trimestres_por_nombre(filas)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conexion.close()
+        await enrutador_lecturas.devolver(conexion, destino)
+
+@app.get("/contrataciones-por-trimestre", response_model=List[ContratacionesTrimestre], responses=RESPUESTAS_METRICAS)
+async def contrataciones_por_trimestre(
+    year: Optional[int] = None,
+    desde: Optional[datetime] = Query(None, alias="from"),
+    hasta: Optional[datetime] = Query(None, alias="to"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    lsn_escritura: Optional[str] = Cookie(None)
+):
+    """
+    Endpoint para obtener las contrataciones por trimestre de un año (por defecto 2021) o de un rango [from, to).
+
+    Args:
+        year (int): Año a consultar.
+        desde (datetime): Inicio del rango (parámetro `from`, incluido).
+        hasta (datetime): Fin del rango (parámetro `to`, excluido).
+
+        if_none_match (str): ETag de una respuesta anterior; si sigue vigente se responde 304.
+        accept (str): application/json (por defecto), text/csv o application/vnd.apache.arrow.stream.
+        accept_encoding (str): Compresión aceptada (br o gzip), aplicada desde COMPRESION_MIN_BYTES.
+        lsn_escritura (str): Cookie firmada con la posición de la última escritura del cliente.
 
-@app.get("/contrataciones-por-trimestre")
-def contrataciones_por_trimestre():
+    Returns:
+        Response: Contrataciones por departamento, trabajo y trimestre en el formato negociado.
     """
-    Endpoint para obtener las contrataciones por trimestre en 2021.
+    rango = rango_fechas(year, desde, hasta)
+    lsn_cliente = lsn_de_cookie(lsn_escritura)
+    return await responder_con_cache(
+        "contrataciones-por-trimestre", rango, ContratacionesTrimestre,
+        lambda: obtener_contrataciones_por_trimestre(*rango, lsn_cliente),
+        if_none_match, accept, accept_encoding, lsn_cliente
+    )
+
+def departamentos_sobre_el_promedio(filas):
+    """
+    Filtra los departamentos con más contrataciones que el promedio y resuelve sus nombres.
+
+    Args:
+        filas (list): Tuplas (department_id, contratados) agrupadas por department_id.
 
     Returns:
-        list: Lista de diccionarios con las contrataciones por trimestre.
+        list: Diccionarios con id, departamento y contratados, de mayor a menor.
     """
-    return obtener_contrataciones_por_trimestre()
+    if not filas:
+        return []
+    # El promedio se toma sobre los ids tal como están en la tabla, igual que antes
+    promedio_contrataciones = sum(int(fila[1]) for fila in filas) / len(filas)
 
-def obtener_departamentos_sobre_promedio():
+    # Los ids nulos o inexistentes se suman en el departamento 0 ("Unknown")
+    contratados = {}
+    for fila in filas:
+        clave = fila[0] if fila[0] in cache_dimensiones.departamentos else 0
+        contratados[clave] = contratados.get(clave, 0) + int(fila[1])
+    return [
+        {
+            "id": departamento_id,
+            "departamento": cache_dimensiones.departamentos.get(departamento_id, DESCONOCIDO),
+            "contratados": cuenta
+        }
+        for departamento_id, cuenta in sorted(contratados.items(), key=lambda par: (-par[1], par[0]))
+        if cuenta > promedio_contrataciones
+    ]
+
+async def obtener_departamentos_sobre_promedio(desde: datetime, hasta: datetime, lsn_cliente: Optional[str] = None):
     """
-    Obtiene los departamentos que contrataron más empleados que el promedio en 2021.
+    Obtiene los departamentos que contrataron más empleados que el promedio en un rango de fechas.
+
+    Args:
+        desde (datetime): Inicio del rango (incluido).
+        hasta (datetime): Fin del rango (excluido).
+        lsn_cliente (str): Posición de WAL que la réplica debe haber aplicado para usarla.
 
     Returns:
         list: Lista de diccionarios con los departamentos que superan el promedio.
@@ -260,83 +1057,93 @@ def obtener_departamentos_sobre_promedio():
     Raises:
         HTTPException: Si hay un error al conectar a la base de datos o al ejecutar la consulta.
     """
-    conexion = get_db_connection()
+    await claves_dimensiones_async()
+    if MOTOR_METRICAS == "memoria":
+        await asegurar_instantanea(lsn_cliente)
+        return departamentos_sobre_el_promedio(instantanea_contrataciones.contrataciones_por_departamento(desde, hasta))
+
+    conexion, destino = await enrutador_lecturas.obtener(lsn_cliente)
     if conexion is None:
         raise HTTPException(status_code=500, detail="Fallo al conectar con la base de datos")
 
-    cursor = conexion.cursor()
+    clave, _, parametros = fuente_contrataciones(desde, hasta)
     try:
-        # Calcular el promedio de contrataciones en 2021
-        cursor.execute("""
-            SELECT AVG(cuenta_contrataciones)
-            FROM (
-                SELECT COUNT(*) as cuenta_contrataciones
-                FROM hired_employees
-                WHERE EXTRACT(YEAR FROM datetime) = 2021
-                GROUP BY department_id
-            ) as subconsulta;
-        """)
-        promedio_contrataciones = cursor.fetchone()[0]
-
-        # Obtener departamentos por encima del promedio
-        cursor.execute("""
-            SELECT 
-                COALESCE(d.id, 0) as id,
-                COALESCE(d.department, 'Unknown') as department,
-                COUNT(e.id) as contratados
-            FROM hired_employees e
-            LEFT JOIN departments d ON e.department_id = d.id
-            WHERE EXTRACT(YEAR FROM e.datetime) = 2021
-            GROUP BY d.id, d.department
-            HAVING COUNT(e.id) > %s
-            ORDER BY contratados DESC;
-        """, (promedio_contrataciones,))
-        filas = cursor.fetchall()
-        resultado = [
-            {
-                "id": fila[0],
-                "departamento": fila[1],
-                "contratados": int(fila[2])
-            }
-            for fila in filas
-        ]
-        return resultado
+        with medir(DURACION_CONSULTA, query="departamentos_sobre_promedio"):
+            # Una sola consulta por department_id; el promedio y el filtro se calculan aquí
+            filas = await consultar_async(conexion, f"contrataciones_por_departamento_{clave}", *parametros)
+        return departamentos_sobre_el_promedio(filas)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conexion.close()
+        await enrutador_lecturas.devolver(conexion, destino)
 
-@app.get("/departamentos-sobre-promedio")
-def departamentos_sobre_promedio():
+@app.get("/departamentos-sobre-promedio", response_model=List[DepartamentoSobrePromedio], responses=RESPUESTAS_METRICAS)
+async def departamentos_sobre_promedio(
+    year: Optional[int] = None,
+    desde: Optional[datetime] = Query(None, alias="from"),
+    hasta: Optional[datetime] = Query(None, alias="to"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    lsn_escritura: Optional[str] = Cookie(None)
+):
     """
-    Endpoint para obtener los departamentos con contrataciones por encima del promedio en 2021.
+    Endpoint para obtener los departamentos con contrataciones por encima del promedio en un año (por defecto 2021) o en un rango [from, to).
+
+    Args:
+        year (int): Año a consultar.
+        desde (datetime): Inicio del rango (parámetro `from`, incluido).
+        hasta (datetime): Fin del rango (parámetro `to`, excluido).
+
+        if_none_match (str): ETag de una respuesta anterior; si sigue vigente se responde 304.
+        accept (str): application/json (por defecto), text/csv o application/vnd.apache.arrow.stream.
+        accept_encoding (str): Compresión aceptada (br o gzip), aplicada desde COMPRESION_MIN_BYTES.
+        lsn_escritura (str): Cookie firmada con la posición de la última escritura del cliente.
 
     Returns:
-        list: Lista de diccionarios con los departamentos que superan el promedio.
+        Response: Departamentos que superan el promedio en el formato negociado.
     """
-    return obtener_departamentos_sobre_promedio()
-
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST", "localhost"),
-        port=os.getenv("POSTGRES_PORT", "5434"),
-        user=os.getenv("POSTGRES_USER", "postgres"),
-        password=os.getenv("POSTGRES_PASSWORD", "caballo"),
-        dbname=os.getenv("POSTGRES_DB", "globant_db")
+    rango = rango_fechas(year, desde, hasta)
+    lsn_cliente = lsn_de_cookie(lsn_escritura)
+    return await responder_con_cache(
+        "departamentos-sobre-promedio", rango, DepartamentoSobrePromedio,
+        lambda: obtener_departamentos_sobre_promedio(*rango, lsn_cliente),
+        if_none_match, accept, accept_encoding, lsn_cliente
     )
-    return conn
+
+@app.get("/metrics")
+def exportar_metricas():
+    """
+    Endpoint con las métricas en el formato de exposición de Prometheus.
+
+    Returns:
+        Response: Histogramas de latencia por ruta, de conexión, adquisición y consultas a la
+            base de datos, y contadores de ingesta, reintentos y solicitudes en curso.
+
+    Raises:
+        HTTPException: 404 si las métricas están deshabilitadas.
+    """
+    if not metricas.HABILITADAS:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    contenido, tipo = metricas.exportar()
+    return Response(content=contenido, media_type=tipo)
 
 @app.get("/")
 def read_root():
     return {"message": "¡Hola desde Docker!"}
 
 @app.get("/test-db")
-def test_db():
+async def test_db():
     try:
-        conn = get_db_connection()
-        conn.close()
-        return {"status": "Conexión a la base de datos exitosa"}
+        # Va a la réplica si está disponible; "destino" indica cuál respondió
+        conn, destino = await enrutador_lecturas.obtener()
+        if conn is None:
+            return {"status": "Error al conectar a la base de datos", "error": "Conexión no disponible"}
+        try:
+            await conn.fetchval("SELECT 1")
+        finally:
+            await enrutador_lecturas.devolver(conn, destino)
+        return {"status": "Conexión a la base de datos exitosa", "destino": destino}
     except Exception as e:
         return {"status": "Error al conectar a la base de datos", "error": str(e)}
 
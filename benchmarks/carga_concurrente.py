@@ -0,0 +1,101 @@
+"""
+Prueba de carga con muchos clientes concurrentes contra uno o más despliegues de la API.
+
+Ejemplo (comparar la versión anterior y la actual):
+    python -m benchmarks.carga_concurrente --url http://localhost:8001 --url http://localhost:8002 \\
+        --ruta /departamentos-sobre-promedio --clientes 200 --duracion 15 --rango-aleatorio
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+import httpx
+
+def percentil(valores, p):
+    """
+    Calcula el percentil p (0-100) de una lista de valores.
+
+    Args:
+        valores (list): Valores numéricos.
+        p (float): Percentil.
+
+    Returns:
+        float: Valor del percentil, o None si la lista está vacía.
+    """
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def parametros_aleatorios():
+    # Un rango distinto en cada solicitud evita el cache de respuestas
+    desde = datetime(2021, 1, 1) + timedelta(seconds=random.randint(0, 180 * 86400))
+    hasta = desde + timedelta(seconds=random.randint(3600, 180 * 86400))
+    return {"from": desde.isoformat(), "to": hasta.isoformat()}
+
+async def cliente(http, url, duracion, rango_aleatorio, latencias, errores):
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.get(url, params=parametros_aleatorios() if rango_aleatorio else None)
+            if respuesta.status_code >= 400:
+                errores.append(respuesta.status_code)
+            else:
+                latencias.append(time.perf_counter() - inicio)
+        except httpx.HTTPError as e:
+            errores.append(type(e).__name__)
+
+async def medir(base, ruta, clientes, duracion, rango_aleatorio):
+    """
+    Ejecuta la prueba contra un despliegue.
+
+    Args:
+        base (str): URL base de la API.
+        ruta (str): Ruta del endpoint a medir.
+        clientes (int): Número de clientes concurrentes.
+        duracion (float): Segundos de prueba.
+        rango_aleatorio (bool): Si se envía un rango from/to distinto en cada solicitud.
+
+    Returns:
+        dict: Solicitudes por segundo, latencias p50/p95/p99 en milisegundos y errores.
+    """
+    latencias = []
+    errores = []
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=60) as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[
+            cliente(http, ruta, duracion, rango_aleatorio, latencias, errores)
+            for _ in range(clientes)
+        ])
+        segundos = time.perf_counter() - inicio
+    return {
+        "url": base + ruta,
+        "clientes": clientes,
+        "solicitudes": len(latencias),
+        "solicitudes_por_segundo": round(len(latencias) / segundos, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 1) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1) if latencias else None,
+        "media_ms": round(statistics.mean(latencias) * 1000, 1) if latencias else None,
+        "errores": len(errores),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", required=True, help="URL base de la API (se puede repetir)")
+    parser.add_argument("--ruta", default="/test-db")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--duracion", type=float, default=10)
+    parser.add_argument("--rango-aleatorio", action="store_true")
+    args = parser.parse_args()
+    for base in args.url:
+        resultado = asyncio.run(medir(base, args.ruta, args.clientes, args.duracion, args.rango_aleatorio))
+        print(resultado)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Generador reproducible de CSV sintéticos con el formato de los archivos de data/.
+
+Ejemplo (1 millón de empleados con 2% de filas sucias):
+    python -m benchmarks.generador --directorio /tmp/bench --empleados 1000000 --sucias 0.02 --semilla 7
+"""
+import argparse
+import csv
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+NOMBRES = (
+    "Harold", "Ty", "Lyman", "Lotti", "Marti", "Jordan", "Alex", "Maria", "Juan", "Ana",
+    "Luis", "Sofia", "Carlos", "Elena", "Pedro", "Lucia", "Diego", "Valeria", "Kim", "Sam",
+)
+APELLIDOS = (
+    "Vogt", "Hofer", "Hadye", "Crislip", "Hussey", "Gomez", "Perez", "Smith", "Lee", "Garcia",
+    "Rojas", "Silva", "Brown", "Diaz", "Torres", "Nguyen", "Muller", "Rossi", "Khan", "Ito",
+)
+AREAS = (
+    "Product Management", "Sales", "Research and Development", "Business Development",
+    "Engineering", "Human Resources", "Services", "Support", "Marketing", "Training",
+    "Legal", "Accounting",
+)
+PUESTOS = ("Analyst", "Engineer", "Manager", "Assistant", "Director", "Specialist", "Coordinator")
+NIVELES = ("I", "II", "III", "IV")
+
+# Tipos de fila sucia, en el orden en que el validador las detecta
+TIPOS_SUCIOS = (
+    "columnas_faltantes",
+    "id_vacio",
+    "id_no_numerico",
+    "datetime_invalido",
+    "department_id_inexistente",
+    "job_id_inexistente",
+    "id_duplicado",
+)
+
+def _fila_sucia(aleatorio, tipo, fila, departamentos, trabajos):
+    id_, nombre, fecha, departamento, trabajo = fila
+    if tipo == "columnas_faltantes":
+        return [id_, nombre, fecha]
+    if tipo == "id_vacio":
+        return ["", nombre, fecha, departamento, trabajo]
+    if tipo == "id_no_numerico":
+        return [f"{id_}x", nombre, fecha, departamento, trabajo]
+    if tipo == "datetime_invalido":
+        return [id_, nombre, "2021-13-45T99:00:00Z", departamento, trabajo]
+    if tipo == "department_id_inexistente":
+        return [id_, nombre, fecha, departamentos + aleatorio.randint(1, 1000), trabajo]
+    if tipo == "job_id_inexistente":
+        return [id_, nombre, fecha, departamento, trabajos + aleatorio.randint(1, 1000)]
+    # id_duplicado: repite un id anterior, que la fusión descarta por ON CONFLICT
+    return [aleatorio.randint(1, max(id_ - 1, 1)), nombre, fecha, departamento, trabajo]
+
+def generar_empleados(empleados, departamentos, trabajos, proporcion_sucias=0.0, semilla=0, anios=(2021,)):
+    """
+    Genera filas de hired_employees de forma reproducible.
+
+    Args:
+        empleados (int): Número de filas.
+        departamentos (int): Número de departamentos válidos (ids 1..departamentos).
+        trabajos (int): Número de trabajos válidos (ids 1..trabajos).
+        proporcion_sucias (float): Fracción de filas con un problema (entre 0 y 1).
+        semilla (int): Semilla del generador aleatorio.
+        anios (tuple): Años entre los que se reparten las fechas de contratación.
+
+    Yields:
+        list: Valores de la fila listos para csv.writer.
+    """
+    aleatorio = random.Random(semilla)
+    inicio = datetime(min(anios), 1, 1, tzinfo=timezone.utc)
+    segundos = int((datetime(max(anios) + 1, 1, 1, tzinfo=timezone.utc) - inicio).total_seconds())
+    for id_ in range(1, empleados + 1):
+        fecha = inicio + timedelta(seconds=aleatorio.randrange(segundos))
+        fila = [
+            id_,
+            f"{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}",
+            fecha.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            aleatorio.randint(1, departamentos),
+            aleatorio.randint(1, trabajos),
+        ]
+        if proporcion_sucias and aleatorio.random() < proporcion_sucias:
+            fila = _fila_sucia(aleatorio, aleatorio.choice(TIPOS_SUCIOS), fila, departamentos, trabajos)
+        yield fila
+
+def generar_datos(directorio, empleados, departamentos=12, trabajos=183, proporcion_sucias=0.0,
+                  semilla=0, anios=(2021,)):
+    """
+    Escribe departments.csv, jobs.csv y hired_employees.csv en un directorio.
+
+    Con la misma semilla y los mismos parámetros los archivos son idénticos byte a byte.
+
+    Args:
+        directorio (str): Directorio de salida (se crea si no existe).
+        empleados (int): Filas de hired_employees.csv.
+        departamentos (int): Filas de departments.csv.
+        trabajos (int): Filas de jobs.csv.
+        proporcion_sucias (float): Fracción de filas de hired_employees con un problema.
+        semilla (int): Semilla del generador aleatorio.
+        anios (tuple): Años entre los que se reparten las fechas de contratación.
+
+    Returns:
+        dict: Ruta de cada archivo por nombre de tabla.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    rutas = {tabla: os.path.join(directorio, f"{tabla}.csv") for tabla in ("departments", "jobs", "hired_employees")}
+
+    with open(rutas["departments"], "w", newline="") as archivo:
+        csv.writer(archivo).writerows(
+            (i, AREAS[(i - 1) % len(AREAS)] + ("" if i <= len(AREAS) else f" {i}"))
+            for i in range(1, departamentos + 1)
+        )
+    with open(rutas["jobs"], "w", newline="") as archivo:
+        csv.writer(archivo).writerows(
+            (i, f"{PUESTOS[i % len(PUESTOS)]} {NIVELES[i % len(NIVELES)]}") for i in range(1, trabajos + 1)
+        )
+    with open(rutas["hired_employees"], "w", newline="") as archivo:
+        csv.writer(archivo).writerows(
+            generar_empleados(empleados, departamentos, trabajos, proporcion_sucias, semilla, anios)
+        )
+    return rutas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directorio", required=True)
+    parser.add_argument("--empleados", type=int, default=1_000_000)
+    parser.add_argument("--departamentos", type=int, default=12)
+    parser.add_argument("--trabajos", type=int, default=183)
+    parser.add_argument("--sucias", type=float, default=0.01, help="Fracción de filas sucias (0 a 1)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--anios", type=int, nargs="+", default=[2021])
+    args = parser.parse_args()
+    rutas = generar_datos(args.directorio, args.empleados, args.departamentos, args.trabajos,
+                          args.sucias, args.semilla, tuple(args.anios))
+    for tabla, ruta in rutas.items():
+        print(f"{tabla}: {ruta} ({os.path.getsize(ruta)} bytes)")
+
+if __name__ == "__main__":
+    main()
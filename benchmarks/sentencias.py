@@ -0,0 +1,162 @@
+"""
+Compara las sentencias del registro ejecutadas como texto y como sentencias preparadas.
+
+Para cada sentencia mide, en la misma conexión de psycopg2, la latencia vista por el
+cliente, el tiempo de CPU que gasta el backend del servidor (leído de /proc, así que solo
+cuando PostgreSQL corre en la misma máquina) y el tiempo de planificación que informa
+EXPLAIN (SUMMARY). Las inserciones se hacen dentro de una transacción que se deshace.
+
+Ejemplo:
+    POSTGRES_DB=bench_db python -m benchmarks.sentencias --repeticiones 2000 \\
+        --salida benchmarks/resultados/sentencias.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+import sentencias
+from app import app  # noqa: F401 (registra las sentencias)
+from benchmarks.carga_concurrente import percentil
+from db import obtener_conexion, devolver_conexion
+from sentencias import sentencias_registradas
+
+# Ids de las filas insertadas durante la prueba, fuera del rango de los datos generados
+PRIMER_ID = 900_000_000
+
+def parametros_de_prueba(nombre, azar):
+    """
+    Args:
+        nombre (str): Nombre de la sentencia registrada.
+        azar (random.Random): Generador para los rangos y los ids.
+
+    Returns:
+        tuple: Parámetros para una ejecución de la sentencia.
+    """
+    if nombre.endswith("_resumen"):
+        return (2021, 1, 2022, 1)
+    if nombre.endswith("_rango"):
+        desde = datetime(2021, 1, 1) + timedelta(days=azar.randrange(300))
+        return (desde, desde + timedelta(days=azar.randrange(1, 60)))
+    if nombre == "insertar_hired_employees":
+        return (PRIMER_ID + azar.randrange(10**8), "Prueba", datetime(2021, 6, 1), 1, 1)
+    raise ValueError(f"Sin parámetros de prueba para {nombre}")
+
+def cpu_del_backend(cursor):
+    """
+    Returns:
+        float: Segundos de CPU (usuario + sistema) del proceso del servidor de esta conexión,
+            o None si /proc no es accesible.
+    """
+    cursor.execute("SELECT pg_backend_pid();")
+    try:
+        with open(f"/proc/{cursor.fetchone()[0]}/stat") as archivo:
+            # El nombre del proceso va entre paréntesis y puede contener espacios
+            campos = archivo.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+def sql_como_texto(sentencia):
+    """Texto de la sentencia con marcadores de psycopg2 en lugar de $1, $2, ..."""
+    return re.sub(r"\$\d+", "%s", sentencia.sql_tipado)
+
+def medir_modo(cursor, sentencia, modo, repeticiones, azar):
+    """
+    Ejecuta la sentencia `repeticiones` veces en el modo indicado ("texto" o "preparada").
+
+    Returns:
+        dict: Latencias p50 y media en ms y CPU del backend por ejecución en µs.
+    """
+    texto = sql_como_texto(sentencia)
+    latencias = []
+    cpu_inicio = cpu_del_backend(cursor)
+    for _ in range(repeticiones):
+        parametros = parametros_de_prueba(sentencia.nombre, azar)
+        inicio = time.perf_counter()
+        if modo == "texto":
+            cursor.execute(texto, parametros)
+        else:
+            sentencias.ejecutar(cursor, sentencia.nombre, parametros)
+        if cursor.description is not None:
+            cursor.fetchall()
+        latencias.append(time.perf_counter() - inicio)
+    cpu_fin = cpu_del_backend(cursor)
+    cpu = None if cpu_inicio is None or cpu_fin is None else round((cpu_fin - cpu_inicio) / repeticiones * 1e6, 1)
+    return {
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "media_ms": round(statistics.mean(latencias) * 1000, 3),
+        "cpu_servidor_us": cpu,
+    }
+
+def planificacion_ms(cursor, sentencia, modo, repeticiones, azar):
+    """
+    Returns:
+        float: Mediana del tiempo de planificación en ms según EXPLAIN (SUMMARY).
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        parametros = parametros_de_prueba(sentencia.nombre, azar)
+        sql = sql_como_texto(sentencia) if modo == "texto" else sentencia.ejecutar()
+        cursor.execute("EXPLAIN (FORMAT JSON, SUMMARY) " + sql, parametros)
+        tiempos.append(sentencias._tiempo_de_planificacion(cursor.fetchone()[0]) * 1000)
+    return round(statistics.median(tiempos), 4)
+
+def ejecutar(args):
+    azar = random.Random(args.semilla)
+    nombres = args.sentencias or sorted(sentencias_registradas())
+    registradas = sentencias_registradas()
+    resultado = {"repeticiones": args.repeticiones, "sentencias": {}}
+    # El muestreo de planes agregaría un EXPLAIN a algunas ejecuciones preparadas
+    sentencias.MUESTREO_PLAN = 0
+    conexion = obtener_conexion()
+    if conexion is None:
+        sys.exit("No se pudo conectar con la base de datos")
+    try:
+        with conexion.cursor() as cursor:
+            for nombre in nombres:
+                sentencia = registradas[nombre]
+                try:
+                    parametros_de_prueba(nombre, azar)
+                except ValueError:
+                    continue
+                medidas = {}
+                for modo in ("texto", "preparada"):
+                    # Calentamiento: prepara la sentencia y llena el cache de páginas
+                    medir_modo(cursor, sentencia, modo, max(args.repeticiones // 10, 5), azar)
+                    medidas[modo] = medir_modo(cursor, sentencia, modo, args.repeticiones, azar)
+                    medidas[modo]["planificacion_ms"] = planificacion_ms(
+                        cursor, sentencia, modo, min(args.repeticiones, 200), azar
+                    )
+                texto, preparada = medidas["texto"], medidas["preparada"]
+                medidas["ahorro_p50"] = round(1 - preparada["p50_ms"] / texto["p50_ms"], 3)
+                if texto["cpu_servidor_us"] and preparada["cpu_servidor_us"] is not None:
+                    medidas["ahorro_cpu_servidor"] = round(1 - preparada["cpu_servidor_us"] / texto["cpu_servidor_us"], 3)
+                resultado["sentencias"][nombre] = medidas
+                print(f"{nombre}: {medidas}", file=sys.stderr)
+    finally:
+        conexion.rollback()
+        devolver_conexion(conexion)
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=1000, help="Ejecuciones por sentencia y modo")
+    parser.add_argument("--sentencias", nargs="+", help="Nombres de las sentencias a medir (por defecto, todas)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    texto = json.dumps(ejecutar(args), indent=2, ensure_ascii=False)
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w") as archivo:
+            archivo.write(texto + "\n")
+    print(texto)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Suite de rendimiento de la carga y de las métricas contra un PostgreSQL local.
+
+Genera los CSV con benchmarks.generador, vacía las tablas, mide la carga de cada tabla
+en los modos indicados, la inserción por /insertar-lote y las latencias de los
+endpoints de métricas, y guarda el resultado en JSON para compararlo con otras corridas.
+
+Ejemplo:
+    python -m benchmarks.suite --empleados 1000000 --sucias 0.01 --truncar \\
+        --salida benchmarks/resultados/1m.json --comparar benchmarks/resultados/base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from app import app, insertar_datos_con_copy, insertar_datos_desde_csv, insertar_datos_en_paralelo
+from benchmarks.carga_concurrente import percentil
+from benchmarks.generador import generar_datos
+from cache import cache_respuestas
+from db import obtener_conexion, devolver_conexion
+from dimensiones import cache_dimensiones
+from trabajos import Trabajo
+
+TABLAS = ("departments", "jobs", "hired_employees")
+ENDPOINTS_METRICAS = ("/contrataciones-por-trimestre", "/departamentos-sobre-promedio")
+# Métricas en las que un valor mayor es una regresión (en el resto, un valor menor)
+MAYOR_ES_PEOR = ("_ms", "rss_pico_mb", "segundos")
+
+def rss_pico_mb():
+    """
+    Returns:
+        dict: Memoria residente máxima en MB del proceso y de sus procesos hijos ya terminados.
+    """
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "proceso": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "hijos": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+def resumir_latencias(latencias):
+    """
+    Args:
+        latencias (list): Latencias en segundos.
+
+    Returns:
+        dict: Número de solicitudes y latencias p50/p95/p99 y media en milisegundos.
+    """
+    return {
+        "solicitudes": len(latencias),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "media_ms": round(statistics.mean(latencias) * 1000, 2),
+    }
+
+def vaciar_tablas():
+    """Vacía las tablas de datos; el trigger de TRUNCATE vacía también la tabla resumen."""
+    conexion = obtener_conexion()
+    if conexion is None:
+        raise RuntimeError("Fallo al conectar con la base de datos")
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("TRUNCATE hired_employees, departments, jobs;")
+        conexion.commit()
+    finally:
+        devolver_conexion(conexion)
+    cache_dimensiones.invalidar()
+
+def tablas_con_datos():
+    conexion = obtener_conexion()
+    if conexion is None:
+        raise RuntimeError("Fallo al conectar con la base de datos")
+    try:
+        with conexion.cursor() as cursor:
+            con_datos = []
+            for tabla in TABLAS:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {tabla});")
+                if cursor.fetchone()[0]:
+                    con_datos.append(tabla)
+        return con_datos
+    finally:
+        devolver_conexion(conexion)
+
+def medir_carga(rutas, modo, procesos=None):
+    """
+    Carga los tres CSV con el mismo código que ejecutan los trabajos de /cargar-csv.
+
+    Args:
+        rutas (dict): Ruta de cada CSV por tabla.
+        modo (str): "copy", "paralelo" o "fila".
+        procesos (int): Procesos del modo "paralelo".
+
+    Returns:
+        dict: Por tabla, filas del archivo, filas rechazadas, segundos y filas por segundo.
+    """
+    resultados = {}
+    for tabla in TABLAS:
+        trabajo = Trabajo(tabla, modo)
+        inicio = time.perf_counter()
+        if modo == "copy" or tabla != "hired_employees":
+            insertar_datos_con_copy(tabla, rutas[tabla], progreso=trabajo.registrar)
+        elif modo == "paralelo":
+            insertar_datos_en_paralelo(tabla, rutas[tabla], procesos, progreso=trabajo.registrar)
+        else:
+            insertar_datos_desde_csv(tabla, rutas[tabla], progreso=trabajo.registrar)
+        segundos = time.perf_counter() - inicio
+        resultados[tabla] = {
+            "filas": trabajo.filas_procesadas,
+            "rechazadas": trabajo.filas_rechazadas,
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(trabajo.filas_procesadas / segundos, 1),
+        }
+    return resultados
+
+def medir_insertar_lote(cliente, empleados, desde_id, tamano_lote=1000):
+    """
+    Inserta empleados nuevos por POST /insertar-lote en lotes de `tamano_lote`.
+
+    Args:
+        cliente: TestClient de la app.
+        empleados (int): Total de empleados a insertar.
+        desde_id (int): Primer id, fuera del rango ya cargado.
+        tamano_lote (int): Empleados por solicitud (máximo 1000).
+
+    Returns:
+        dict: Filas, filas por segundo y latencias por lote.
+    """
+    aleatorio = random.Random(desde_id)
+    latencias = []
+    inicio = time.perf_counter()
+    for primero in range(desde_id, desde_id + empleados, tamano_lote):
+        lote = [
+            {
+                "id": id_,
+                "name": "Bench Lote",
+                "datetime": f"2021-{aleatorio.randint(1, 12):02d}-15T12:00:00Z",
+                "department_id": 1,
+                "job_id": 1,
+            }
+            for id_ in range(primero, min(primero + tamano_lote, desde_id + empleados))
+        ]
+        t0 = time.perf_counter()
+        respuesta = cliente.post("/insertar-lote", json=lote)
+        latencias.append(time.perf_counter() - t0)
+        respuesta.raise_for_status()
+    segundos = time.perf_counter() - inicio
+    return {"filas": empleados, "filas_por_segundo": round(empleados / segundos, 1), **resumir_latencias(latencias)}
+
+def medir_metricas(cliente, solicitudes, semilla):
+    """
+    Mide la latencia de los endpoints de métricas en tres escenarios: la respuesta en
+    cache, un año completo sin cache (resuelto con la tabla resumen) y rangos aleatorios
+    sin cache (filtran hired_employees).
+
+    Returns:
+        dict: Latencias por endpoint y escenario.
+    """
+    aleatorio = random.Random(semilla)
+
+    def rango_aleatorio():
+        desde = datetime(2021, 1, 1) + timedelta(seconds=aleatorio.randint(0, 180 * 86400))
+        hasta = desde + timedelta(seconds=aleatorio.randint(3600, 180 * 86400))
+        return {"from": desde.isoformat(), "to": hasta.isoformat()}
+
+    escenarios = {
+        "cache": (lambda: {"year": 2021}, False),
+        "anio_sin_cache": (lambda: {"year": 2021}, True),
+        "rango_sin_cache": (rango_aleatorio, True),
+    }
+    resultados = {}
+    for endpoint in ENDPOINTS_METRICAS:
+        resultados[endpoint] = {}
+        for escenario, (parametros, invalidar) in escenarios.items():
+            cliente.get(endpoint, params=parametros()).raise_for_status()
+            latencias = []
+            for _ in range(solicitudes):
+                if invalidar:
+                    cache_respuestas.incrementar_version()
+                t0 = time.perf_counter()
+                respuesta = cliente.get(endpoint, params=parametros())
+                latencias.append(time.perf_counter() - t0)
+                respuesta.raise_for_status()
+            resultados[endpoint][escenario] = resumir_latencias(latencias)
+    return resultados
+
+def version_postgres():
+    conexion = obtener_conexion()
+    if conexion is None:
+        return None
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("SHOW server_version;")
+            return cursor.fetchone()[0]
+    finally:
+        devolver_conexion(conexion)
+
+def aplanar(datos, prefijo=""):
+    """
+    Convierte un resultado anidado en un dict plano {"ruta.de.la.metrica": valor} numérico.
+    """
+    plano = {}
+    for clave, valor in datos.items():
+        ruta = f"{prefijo}.{clave}" if prefijo else clave
+        if isinstance(valor, dict):
+            plano.update(aplanar(valor, ruta))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            plano[ruta] = valor
+    return plano
+
+def comparar(actual, anterior, tolerancia=0.10):
+    """
+    Compara dos resultados y señala las métricas que empeoraron más que la tolerancia.
+
+    Args:
+        actual (dict): Resultado de esta corrida.
+        anterior (dict): Resultado de referencia.
+        tolerancia (float): Variación relativa aceptada.
+
+    Returns:
+        list: Tuplas (métrica, valor anterior, valor actual, variación relativa) de las regresiones.
+    """
+    secciones = ("carga", "insertar_lote", "metricas", "rss_pico_mb")
+    plano_actual = aplanar({k: actual.get(k, {}) for k in secciones})
+    plano_anterior = aplanar({k: anterior.get(k, {}) for k in secciones})
+    regresiones = []
+    for metrica, valor in plano_actual.items():
+        previo = plano_anterior.get(metrica)
+        if not previo or metrica.endswith((".filas", ".rechazadas", ".solicitudes")):
+            continue
+        variacion = (valor - previo) / previo
+        peor = variacion if any(sufijo in metrica for sufijo in MAYOR_ES_PEOR) else -variacion
+        if peor > tolerancia:
+            regresiones.append((metrica, previo, valor, round(variacion, 3)))
+    return regresiones
+
+def ejecutar(args):
+    rutas = generar_datos(args.directorio, args.empleados, args.departamentos, args.trabajos,
+                          args.sucias, args.semilla)
+    resultado = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parametros": {
+            "empleados": args.empleados,
+            "departamentos": args.departamentos,
+            "trabajos": args.trabajos,
+            "sucias": args.sucias,
+            "semilla": args.semilla,
+            "modos": args.modos,
+            "procesos": args.procesos,
+            "solicitudes": args.solicitudes,
+        },
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "postgres": None,
+        },
+        "archivos_mb": {tabla: round(os.path.getsize(ruta) / 2**20, 1) for tabla, ruta in rutas.items()},
+        "carga": {},
+    }
+
+    with TestClient(app) as cliente:
+        resultado["entorno"]["postgres"] = version_postgres()
+        for modo in args.modos:
+            vaciar_tablas()
+            resultado["carga"][modo] = medir_carga(rutas, modo, args.procesos)
+            print(f"carga {modo}: {resultado['carga'][modo]['hired_employees']}", file=sys.stderr)
+        if args.lote:
+            resultado["insertar_lote"] = medir_insertar_lote(cliente, args.lote, args.empleados + 1)
+        resultado["metricas"] = medir_metricas(cliente, args.solicitudes, args.semilla)
+    resultado["rss_pico_mb"] = rss_pico_mb()
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directorio", default="/tmp/benchmark_datos", help="Directorio de los CSV generados")
+    parser.add_argument("--empleados", type=int, default=1_000_000)
+    parser.add_argument("--departamentos", type=int, default=12)
+    parser.add_argument("--trabajos", type=int, default=183)
+    parser.add_argument("--sucias", type=float, default=0.01, help="Fracción de filas sucias (0 a 1)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--modos", nargs="+", default=["copy"], choices=["copy", "paralelo", "fila"])
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del modo paralelo")
+    parser.add_argument("--lote", type=int, default=10_000, help="Empleados a insertar por /insertar-lote (0 omite la prueba)")
+    parser.add_argument("--solicitudes", type=int, default=200, help="Solicitudes por endpoint y escenario")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--comparar", help="Resultado JSON anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.10)
+    parser.add_argument("--truncar", action="store_true", help="Permite vaciar las tablas si ya tienen datos")
+    args = parser.parse_args()
+
+    con_datos = tablas_con_datos()
+    if con_datos and not args.truncar:
+        parser.error(f"Las tablas {', '.join(con_datos)} tienen datos; use una base de pruebas y --truncar")
+
+    resultado = ejecutar(args)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w") as archivo:
+            archivo.write(texto + "\n")
+    print(texto)
+
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            regresiones = comparar(resultado, json.load(archivo), args.tolerancia)
+        for metrica, previo, valor, variacion in regresiones:
+            print(f"REGRESIÓN {metrica}: {previo} -> {valor} ({variacion:+.1%})", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class CacheRespuestas:
+    """
+    Cache en memoria de resultados de los endpoints de lectura.
+
+    Las entradas expiran por TTL y se desalojan por LRU al superar el máximo. Cada escritura
+    en la base incrementa la versión de datos, que forma parte de la clave y del ETag, por lo
+    que las entradas anteriores dejan de usarse sin tener que recorrerlas. La clave y el ETag
+    también incluyen el período del TTL en curso: una escritura hecha desde otro proceso no
+    incrementa esta versión, y así un cliente no recibe 304 por más de un TTL.
+    """
+
+    def __init__(self, maximo=256, ttl=60.0):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+        self._version = 0
+        # Distingue los ETag de esta instancia de los de un proceso anterior con la misma versión
+        self._instancia = uuid.uuid4().hex[:8]
+
+    @property
+    def version(self):
+        return self._version
+
+    def incrementar_version(self):
+        """Invalida todas las entradas; se llama después de cada commit de escritura."""
+        with self._candado:
+            self._version += 1
+            self._entradas.clear()
+
+    def _periodo(self):
+        # Con TTL 0 nada se guarda y cada ETag es distinto
+        return int(time.monotonic() // self.ttl) if self.ttl > 0 else time.monotonic_ns()
+
+    def etag(self, endpoint, parametros, version):
+        """
+        Calcula el ETag de una respuesta.
+
+        Args:
+            endpoint (str): Nombre del endpoint.
+            parametros (tuple): Parámetros que determinan el resultado.
+            version (int): Versión de datos con la que se calcula el resultado.
+
+        Returns:
+            str: ETag fuerte entre comillas.
+        """
+        huella = hashlib.sha1(
+            repr((self._instancia, version, self._periodo(), endpoint, parametros)).encode()
+        ).hexdigest()
+        return f'"{huella[:20]}"'
+
+    def _buscar(self, clave):
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self._entradas.move_to_end(clave)
+                return True, entrada[1]
+        return False, None
+
+    def _guardar(self, clave, resultado):
+        with self._candado:
+            # Si hubo una escritura mientras se calculaba, el resultado no se guarda
+            if clave[0] == self._version and self.maximo > 0:
+                self._entradas[clave] = (time.monotonic() + self.ttl, resultado)
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.maximo:
+                    self._entradas.popitem(last=False)
+
+    def obtener_o_calcular(self, endpoint, parametros, version, calcular):
+        """
+        Devuelve el resultado guardado o lo calcula y lo guarda.
+
+        Args:
+            endpoint (str): Nombre del endpoint.
+            parametros (tuple): Parámetros que determinan el resultado.
+            version (int): Versión de datos vigente al iniciar la solicitud.
+            calcular (callable): Función sin argumentos que ejecuta la consulta.
+
+        Returns:
+            El resultado del endpoint.
+        """
+        clave = (version, self._periodo(), endpoint, parametros)
+        encontrado, resultado = self._buscar(clave)
+        if not encontrado:
+            resultado = calcular()
+            self._guardar(clave, resultado)
+        return resultado
+
+    async def obtener_o_calcular_async(self, endpoint, parametros, version, calcular):
+        """
+        Igual que obtener_o_calcular, pero `calcular` devuelve un awaitable.
+
+        Returns:
+            El resultado del endpoint.
+        """
+        clave = (version, self._periodo(), endpoint, parametros)
+        encontrado, resultado = self._buscar(clave)
+        if not encontrado:
+            resultado = await calcular()
+            self._guardar(clave, resultado)
+        return resultado
+
+def coincide_etag(if_none_match, etag):
+    """
+    Indica si la cabecera If-None-Match incluye el ETag dado.
+
+    Args:
+        if_none_match (str): Valor de la cabecera, puede ser None.
+        etag (str): ETag actual.
+
+    Returns:
+        bool: True si el cliente ya tiene la versión vigente.
+    """
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    return "*" in candidatos or any(
+        (candidato[2:] if candidato.startswith("W/") else candidato) == etag for candidato in candidatos
+    )
+
+cache_respuestas = CacheRespuestas(
+    maximo=int(os.getenv("CACHE_MAX_ENTRADAS", "256")),
+    ttl=float(os.getenv("CACHE_TTL_SEG", "60")),
+)
@@ -0,0 +1,206 @@
+import hashlib
+import itertools
+import os
+import time
+from carga_masiva import FilaInvalida, convertir_fila, copiar_filas, leer_registros
+from rechazos import RegistroRechazos
+
+# Filas por lote confirmado; tras una caída la carga se reanuda desde el último lote
+FILAS_POR_LOTE = int(os.getenv("CARGA_INCREMENTAL_FILAS_POR_LOTE", "100000"))
+# Bytes que se leen de una vez al calcular el checksum
+TAMANO_LECTURA = 1 << 20
+
+class CargaEnCurso(Exception):
+    """Se lanza si otra conexión ya está cargando el mismo archivo en la misma tabla."""
+
+def checksum_prefijo(ruta_archivo, hasta):
+    """
+    Calcula el SHA-256 de los primeros `hasta` bytes de un archivo.
+
+    Args:
+        ruta_archivo (str): Ruta del archivo.
+        hasta (int): Número de bytes.
+
+    Returns:
+        hashlib._Hash: Objeto hash, para poder seguir actualizándolo con el resto del archivo.
+    """
+    huella = hashlib.sha256()
+    restantes = hasta
+    with open(ruta_archivo, 'rb') as archivo:
+        while restantes > 0:
+            bloque = archivo.read(min(TAMANO_LECTURA, restantes))
+            if not bloque:
+                break
+            huella.update(bloque)
+            restantes -= len(bloque)
+    return huella
+
+def leer_manifiesto(cursor, nombre_tabla, ruta_archivo):
+    """
+    Returns:
+        tuple: (size_bytes, checksum, committed_offset, committed_rows) de la última carga del
+            archivo, o None si nunca se cargó.
+    """
+    cursor.execute(
+        """
+        SELECT size_bytes, checksum, committed_offset, committed_rows
+        FROM load_manifest
+        WHERE table_name = %s AND file_path = %s;
+        """,
+        (nombre_tabla, ruta_archivo)
+    )
+    return cursor.fetchone()
+
+def guardar_manifiesto(cursor, nombre_tabla, ruta_archivo, tamano, checksum, desplazamiento, filas):
+    """Registra el avance confirmado de la carga de un archivo, en la transacción del lote."""
+    cursor.execute(
+        """
+        INSERT INTO load_manifest (table_name, file_path, size_bytes, checksum, committed_offset, committed_rows, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, now())
+        ON CONFLICT (table_name, file_path) DO UPDATE SET
+            size_bytes = EXCLUDED.size_bytes,
+            checksum = EXCLUDED.checksum,
+            committed_offset = EXCLUDED.committed_offset,
+            committed_rows = EXCLUDED.committed_rows,
+            updated_at = EXCLUDED.updated_at;
+        """,
+        (nombre_tabla, ruta_archivo, tamano, checksum, desplazamiento, filas)
+    )
+
+def planificar_carga(cursor, nombre_tabla, ruta_archivo):
+    """
+    Decide desde dónde cargar un archivo según el manifiesto.
+
+    El manifiesto guarda el checksum de los bytes ya confirmados. Si ese prefijo del archivo
+    no cambió, solo se carga lo que sigue (nada si el archivo tampoco creció); si cambió, el
+    archivo se reescribió y se carga completo.
+
+    Returns:
+        tuple: (estado, desplazamiento inicial, filas ya confirmadas, hash del prefijo), con
+            estado "sin_cambios", "incremental" o "completa".
+    """
+    tamano = os.path.getsize(ruta_archivo)
+    manifiesto = leer_manifiesto(cursor, nombre_tabla, ruta_archivo)
+    if manifiesto is not None:
+        _, checksum, desplazamiento, filas = manifiesto
+        if desplazamiento <= tamano:
+            huella = checksum_prefijo(ruta_archivo, desplazamiento)
+            if huella.hexdigest() == checksum:
+                estado = "sin_cambios" if desplazamiento == tamano else "incremental"
+                return estado, desplazamiento, filas, huella
+    return "completa", 0, 0, hashlib.sha256()
+
+def cargar_csv_incremental(conexion, nombre_tabla, ruta_archivo, progreso=None, filas_por_lote=FILAS_POR_LOTE, claves=None):
+    """
+    Carga solo la parte de un CSV que aún no se cargó, confirmando por lotes.
+
+    Cada lote se envía por COPY a una tabla de staging, se fusiona en la tabla destino y
+    actualiza el manifiesto en la misma transacción, así que si la carga se interrumpe la
+    siguiente continúa desde el último lote confirmado. Un registro final con comillas sin
+    cerrar, o sin salto de línea en un archivo que creció durante la lectura, queda para la
+    siguiente carga. Los números de fila de los rechazos
+    son los del archivo completo.
+
+    Args:
+        conexion: Conexión de psycopg2 sin transacción abierta.
+        nombre_tabla (str): Nombre de la tabla destino.
+        ruta_archivo (str): Ruta del archivo CSV.
+        progreso (callable): Función registrar(filas, rechazadas, bytes_leidos), o None.
+        filas_por_lote (int): Filas por transacción.
+        claves (tuple): (ids de departments, ids de jobs) para validar las claves foráneas de
+            hired_employees, o None.
+
+    Returns:
+        dict: estado, desde_byte, filas_insertadas, filas_nuevas, lotes, bytes_pendientes (bytes
+            del final del archivo con un registro incompleto, que no se cargaron), rechazos y
+            segundos.
+
+    Raises:
+        CargaEnCurso: Si el archivo ya se está cargando desde otra conexión.
+    """
+    ruta_archivo = os.path.abspath(ruta_archivo)
+    # El candado de sesión evita que dos cargas del mismo archivo avancen el manifiesto a la vez
+    candado = f"load_manifest:{nombre_tabla}:{ruta_archivo}"
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s));", (candado,))
+        if not cursor.fetchone()[0]:
+            conexion.rollback()
+            raise CargaEnCurso(f"Ya hay una carga de {os.path.basename(ruta_archivo)} en {nombre_tabla} en curso")
+    try:
+        return _cargar(conexion, nombre_tabla, ruta_archivo, progreso, filas_por_lote, claves)
+    finally:
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s));", (candado,))
+        conexion.commit()
+
+def _cargar(conexion, nombre_tabla, ruta_archivo, progreso, filas_por_lote, claves):
+    inicio = time.perf_counter()
+    with conexion.cursor() as cursor:
+        estado, desplazamiento, filas_previas, huella = planificar_carga(cursor, nombre_tabla, ruta_archivo)
+    conexion.commit()
+    desde_byte = desplazamiento
+    if progreso and desplazamiento:
+        progreso(bytes_leidos=desplazamiento)
+
+    tamano = os.path.getsize(ruta_archivo)
+    filas_insertadas = 0
+    filas_nuevas = 0
+    lotes = 0
+    with RegistroRechazos() as rechazos, open(ruta_archivo, 'rb') as archivo:
+        if estado != "sin_cambios":
+            archivo.seek(desplazamiento)
+            # Los manifiestos anteriores podían terminar en una línea sin salto de línea; el
+            # salto que se agregó después al crecer el archivo no es una fila nueva
+            if desplazamiento > 0:
+                archivo.seek(desplazamiento - 1)
+                if archivo.read(1) not in (b"\n", b"\r") and archivo.peek(1)[:1] == b"\n":
+                    huella.update(archivo.read(1))
+                    desplazamiento += 1
+            numero = filas_previas
+            # La última línea de un archivo al que se le siguen agregando filas puede estar
+            # escrita a medias: sin salto de línea solo se carga si sus comillas están cerradas
+            # y el archivo no creció mientras se leía
+            registros = leer_registros(archivo, tamano - desplazamiento, tamano_final=tamano)
+            while True:
+                lote = list(itertools.islice(registros, filas_por_lote))
+                if not lote:
+                    break
+                bytes_lote = 0
+                for registro, _ in lote:
+                    bytes_lote += len(registro)
+                    huella.update(registro)
+
+                def filas_convertidas(primera=numero, registros_lote=lote):
+                    for i, (_, fila) in enumerate(registros_lote, primera + 1):
+                        try:
+                            yield i, convertir_fila(nombre_tabla, fila, claves)
+                        except FilaInvalida as e:
+                            rechazos.registrar(i, e.motivo, fila, str(e))
+
+                rechazadas_antes = rechazos.total
+                with conexion.cursor() as cursor:
+                    try:
+                        enviadas, nuevas = copiar_filas(cursor, nombre_tabla, filas_convertidas())
+                        desplazamiento += bytes_lote
+                        numero += len(lote)
+                        guardar_manifiesto(cursor, nombre_tabla, ruta_archivo, tamano, huella.hexdigest(), desplazamiento, numero)
+                        conexion.commit()
+                    except Exception:
+                        conexion.rollback()
+                        raise
+                filas_insertadas += enviadas
+                filas_nuevas += nuevas
+                lotes += 1
+                if progreso:
+                    progreso(filas=len(lote), rechazadas=rechazos.total - rechazadas_antes, bytes_leidos=bytes_lote)
+
+    return {
+        "estado": estado,
+        "desde_byte": desde_byte,
+        "filas_insertadas": filas_insertadas,
+        "filas_nuevas": filas_nuevas,
+        "lotes": lotes,
+        "bytes_pendientes": max(tamano - desplazamiento, 0),
+        "rechazos": rechazos.resumen(),
+        "segundos": time.perf_counter() - inicio,
+    }
@@ -0,0 +1,418 @@
+import csv
+import io
+import os
+import itertools
+from datetime import datetime
+from metricas import DURACION_CONSULTA, medir
+
+# Columnas de cada tabla en el orden en que aparecen en los CSV
+COLUMNAS = {
+    "hired_employees": ("id", "name", "datetime", "department_id", "job_id"),
+    "departments": ("id", "department"),
+    "jobs": ("id", "job"),
+}
+
+# Posiciones de las columnas que se convierten a entero
+COLUMNAS_ENTERAS = {
+    "hired_employees": (0, 3, 4),
+    "departments": (0,),
+    "jobs": (0,),
+}
+
+# Máximo valor de una columna INTEGER de PostgreSQL
+MAX_ENTERO = 2**31 - 1
+
+class FilaInvalida(ValueError):
+    """
+    Error de conversión de una fila, con el código del motivo para el registro de rechazos.
+
+    Los códigos son los mismos que usa validar_datos.ValidadorCsv.
+    """
+
+    def __init__(self, motivo, mensaje):
+        super().__init__(mensaje)
+        self.motivo = motivo
+
+    @property
+    def clave_inexistente(self):
+        """Si se rechazó por un department_id o job_id que la caché de dimensiones no tiene."""
+        return self.motivo.endswith("_inexistente")
+
+def verificar_claves(valores, claves):
+    """
+    Verifica que department_id y job_id de un empleado existan.
+
+    Args:
+        valores (tuple): Valores convertidos de hired_employees.
+        claves (tuple): (ids de departments, ids de jobs); los valores nulos se aceptan.
+
+    Raises:
+        FilaInvalida: Si el departamento o el trabajo no existen.
+    """
+    ids_departamentos, ids_trabajos = claves
+    if valores[3] is not None and valores[3] not in ids_departamentos:
+        raise FilaInvalida("department_id_inexistente", f"department_id {valores[3]} no existe")
+    if valores[4] is not None and valores[4] not in ids_trabajos:
+        raise FilaInvalida("job_id_inexistente", f"job_id {valores[4]} no existe")
+
+def convertir_fila(nombre_tabla, fila, claves=None):
+    """
+    Convierte una fila del CSV a los valores que se insertarán en la tabla.
+
+    Las columnas faltantes se completan y los valores vacíos se convierten en NULL,
+    igual que en la carga fila por fila. Las filas que PostgreSQL rechazaría (id vacío,
+    enteros fuera de rango o fechas inválidas) se descartan aquí para que una sola fila
+    no aborte el COPY completo.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla destino.
+        fila (list): Valores crudos leídos del CSV.
+        claves (tuple): (ids de departments, ids de jobs) para validar las claves foráneas de
+            hired_employees, o None para no validarlas.
+
+    Returns:
+        tuple: Valores convertidos, uno por columna de la tabla.
+
+    Raises:
+        FilaInvalida: Si falta el id, si una columna numérica no es un entero válido, si la
+            fecha no tiene formato ISO 8601 o si una clave foránea no existe.
+    """
+    nombres = COLUMNAS[nombre_tabla]
+    enteras = COLUMNAS_ENTERAS[nombre_tabla]
+    valores = []
+    for j, nombre in enumerate(nombres):
+        valor = fila[j].strip() if j < len(fila) else ''
+        if not valor:
+            if j == 0:
+                raise FilaInvalida("id_vacio", "id vacío")
+            valores.append(None)
+        elif j in enteras:
+            try:
+                entero = int(valor)
+            except ValueError as e:
+                raise FilaInvalida(f"{nombre}_no_numerico", str(e))
+            if abs(entero) > MAX_ENTERO:
+                raise FilaInvalida(f"{nombre}_fuera_de_rango", f"entero fuera de rango: {valor}")
+            valores.append(entero)
+        else:
+            valores.append(valor)
+    if nombre_tabla == "hired_employees" and valores[2] is not None:
+        try:
+            datetime.fromisoformat(valores[2].replace('Z', '+00:00'))
+        except ValueError as e:
+            raise FilaInvalida("datetime_invalido", str(e))
+    if claves is not None and nombre_tabla == "hired_employees":
+        verificar_claves(valores, claves)
+    return tuple(valores)
+
+class FuenteCopy:
+    """
+    Objeto tipo archivo que genera el texto CSV para COPY a medida que se lee.
+
+    Recibe un iterador de tuplas (número de fila, valores) y nunca mantiene en
+    memoria más que el bloque solicitado por psycopg2.
+    """
+
+    def __init__(self, filas):
+        self._filas = iter(filas)
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, lineterminator='\n')
+        self._pendiente = ''
+        self.filas_enviadas = 0
+
+    def extender(self, filas):
+        """Agrega más filas a continuación de las ya leídas (para fuentes que llegan por partes)."""
+        self._filas = itertools.chain(self._filas, filas)
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pendiente) + self._buffer.tell() < size:
+            try:
+                numero, valores = next(self._filas)
+            except StopIteration:
+                break
+            # None se escribe como campo vacío sin comillas, que COPY interpreta como NULL
+            self._escritor.writerow(valores + (numero,))
+            self.filas_enviadas += 1
+        datos = self._pendiente + self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if size < 0:
+            size = len(datos)
+        self._pendiente = datos[size:]
+        return datos[:size]
+
+def sentencias_staging(nombre_tabla, staging=None, temporal=True):
+    """
+    Construye las sentencias para cargar una tabla a través de una tabla de staging.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla destino.
+        staging (str): Nombre de la tabla de staging; por defecto staging_<tabla>.
+        temporal (bool): True para una tabla temporal de la sesión, False para una tabla
+            UNLOGGED compartida entre conexiones.
+
+    Returns:
+        tuple: (staging, sentencia CREATE, sentencia COPY, sentencia de fusión).
+    """
+    columnas = ", ".join(COLUMNAS[nombre_tabla])
+    staging = staging or f"staging_{nombre_tabla}"
+    if temporal:
+        crear = f"""
+            CREATE TEMP TABLE {staging}
+                (LIKE {nombre_tabla} INCLUDING DEFAULTS, fila BIGINT)
+                ON COMMIT DROP;
+        """
+    else:
+        crear = f"""
+            CREATE UNLOGGED TABLE {staging}
+                (LIKE {nombre_tabla} INCLUDING DEFAULTS, fila BIGINT);
+        """
+    copiar = f"COPY {staging} ({columnas}, fila) FROM STDIN WITH (FORMAT csv)"
+    # Sin columna de conflicto para que valga también con hired_employees particionada,
+    # donde el id único lo garantiza un trigger en lugar de la clave primaria
+    fusionar = f"""
+        INSERT INTO {nombre_tabla} ({columnas})
+        SELECT DISTINCT ON (id) {columnas}
+        FROM {staging}
+        ORDER BY id, fila
+        ON CONFLICT DO NOTHING;
+    """
+    if nombre_tabla == "hired_employees":
+        # Con hired_employees particionada, crea las particiones de los periodos nuevos y
+        # reserva los ids antes de fusionar; sin particiones estas funciones no hacen nada
+        fusionar = (
+            f"SELECT asegurar_particiones_hired_employees('{staging}');"
+            f"SELECT reservar_ids_hired_employees('{staging}');" + fusionar
+        )
+    return staging, crear, copiar, fusionar
+
+def copiar_filas(cursor, nombre_tabla, filas):
+    """
+    Carga filas ya convertidas mediante COPY a una tabla de staging y las fusiona en la tabla destino.
+
+    La tabla de staging es temporal (sin WAL) y se elimina al hacer commit. La fusión
+    es un único INSERT ... SELECT con ON CONFLICT DO NOTHING; si un id se repite
+    dentro del archivo se conserva la primera aparición, como en la carga fila por fila.
+
+    Args:
+        cursor: Cursor de psycopg2 con una transacción abierta.
+        nombre_tabla (str): Nombre de la tabla destino.
+        filas (iterable): Tuplas (número de fila, valores convertidos).
+
+    Returns:
+        tuple: (filas enviadas por COPY, filas nuevas insertadas en la tabla destino).
+    """
+    staging, crear, copiar, fusionar = sentencias_staging(nombre_tabla)
+    cursor.execute(crear)
+    fuente = FuenteCopy(filas)
+    with medir(DURACION_CONSULTA, query=f"copiar_{nombre_tabla}"):
+        cursor.copy_expert(copiar, fuente)
+    with medir(DURACION_CONSULTA, query=f"fusionar_{nombre_tabla}"):
+        cursor.execute(fusionar)
+    filas_nuevas = cursor.rowcount
+    cursor.execute(f"DROP TABLE {staging};")
+    return fuente.filas_enviadas, filas_nuevas
+
+async def copiar_filas_async(conexion, nombre_tabla, filas):
+    """
+    Versión de copiar_filas para una conexión de asyncpg.
+
+    `filas` también puede ser un iterable asíncrono de listas de filas, por ejemplo las que se
+    van convirtiendo de un cuerpo recibido en streaming: cada lista se envía por el mismo COPY
+    y la siguiente no se pide hasta que asyncpg pudo escribir la anterior en el socket.
+
+    Args:
+        conexion: Conexión de asyncpg con una transacción abierta.
+        nombre_tabla (str): Nombre de la tabla destino.
+        filas (iterable): Tuplas (número de fila, valores convertidos), o iterable asíncrono de
+            listas de esas tuplas.
+
+    Returns:
+        tuple: (filas enviadas por COPY, filas nuevas insertadas en la tabla destino).
+    """
+    staging, crear, _, fusionar = sentencias_staging(nombre_tabla)
+    await conexion.execute(crear)
+    por_partes = hasattr(filas, "__aiter__")
+    fuente = FuenteCopy(() if por_partes else filas)
+
+    async def leer_fuente():
+        while True:
+            bloque = fuente.read(65536)
+            if not bloque:
+                break
+            yield bloque.encode()
+
+    async def bloques():
+        if not por_partes:
+            async for bloque in leer_fuente():
+                yield bloque
+            return
+        async for parte in filas:
+            fuente.extender(parte)
+            async for bloque in leer_fuente():
+                yield bloque
+
+    with medir(DURACION_CONSULTA, query=f"copiar_{nombre_tabla}"):
+        await conexion.copy_to_table(
+            staging,
+            source=bloques(),
+            columns=list(COLUMNAS[nombre_tabla]) + ["fila"],
+            format="csv"
+        )
+    with medir(DURACION_CONSULTA, query=f"fusionar_{nombre_tabla}"):
+        estado = await conexion.execute(fusionar)
+    await conexion.execute(f"DROP TABLE {staging};")
+    return fuente.filas_enviadas, int(estado.split()[-1])
+
+def convertir_registro(registro, claves=None):
+    """
+    Convierte un empleado recibido como JSON a los valores de hired_employees.
+
+    Args:
+        registro (dict): Empleado con las claves id, name, datetime, department_id y job_id.
+        claves (tuple): (ids de departments, ids de jobs) para validar las claves foráneas, o None.
+
+    Returns:
+        tuple: Valores convertidos en el orden de las columnas de hired_employees.
+
+    Raises:
+        FilaInvalida: Si faltan claves, algún valor no se puede convertir, falta el id, la
+            fecha no tiene formato ISO 8601 o una clave foránea no existe.
+    """
+    columnas = COLUMNAS["hired_employees"]
+    if not isinstance(registro, dict) or not all(columna in registro for columna in columnas):
+        raise FilaInvalida("claves_faltantes", "Faltan claves")
+    try:
+        id_empleado = int(registro["id"]) if registro["id"] else None
+        departamento_id = int(registro["department_id"]) if registro["department_id"] else None
+        trabajo_id = int(registro["job_id"]) if registro["job_id"] else None
+        name = registro["name"].strip() if registro["name"] and registro["name"].strip() else None
+        datetime_valor = registro["datetime"].strip() if registro["datetime"] and registro["datetime"].strip() else None
+    except (ValueError, TypeError, AttributeError):
+        raise FilaInvalida("error_de_conversion", "Error de conversión")
+    if id_empleado is None:
+        raise FilaInvalida("id_vacio", "id vacío")
+    if any(abs(valor) > MAX_ENTERO for valor in (id_empleado, departamento_id, trabajo_id) if valor is not None):
+        raise FilaInvalida("entero_fuera_de_rango", "Entero fuera de rango")
+    if datetime_valor is not None:
+        try:
+            datetime.fromisoformat(datetime_valor.replace('Z', '+00:00'))
+        except ValueError:
+            raise FilaInvalida("datetime_invalido", "Fecha inválida")
+    valores = (id_empleado, name, datetime_valor, departamento_id, trabajo_id)
+    if claves is not None:
+        verificar_claves(valores, claves)
+    return valores
+
+def fin_de_registros(texto):
+    """
+    Busca el final del último registro completo con las reglas del dialecto por defecto de
+    csv: una comilla al inicio de un campo abre un campo entre comillas, "" dentro de él es
+    una comilla y los saltos de línea dentro de las comillas no terminan el registro.
+
+    Args:
+        texto (str): Texto que empieza al inicio de un registro.
+
+    Returns:
+        int: Posición después del último salto de línea que termina un registro, o 0.
+    """
+    corte = 0
+    i = 0
+    largo = len(texto)
+    while True:
+        comilla = texto.find('"', i)
+        # Fuera de comillas, cualquier salto de línea antes de la próxima comilla termina un registro
+        salto = texto.rfind("\n", i, largo if comilla < 0 else comilla)
+        if salto >= 0:
+            corte = salto + 1
+        if comilla < 0:
+            return corte
+        i = comilla + 1
+        if comilla and texto[comilla - 1] not in ",\r\n":
+            # Comilla en medio de un campo sin comillas: es un carácter más
+            continue
+        while True:
+            cierre = texto.find('"', i)
+            if cierre < 0 or cierre + 1 == largo:
+                # Campo entre comillas sin cerrar (o sin saber aún si la comilla está duplicada)
+                return corte
+            i = cierre + 1
+            if texto[i] != '"':
+                break
+            i += 1
+
+def _ultimo_registro_cerrado(archivo, texto, tamano_final):
+    # Con un salto de línea agregado, un registro con las comillas cerradas termina justo ahí
+    return (
+        not texto.endswith("\n")
+        and fin_de_registros(texto + "\n") == len(texto) + 1
+        and archivo.tell() == tamano_final == os.fstat(archivo.fileno()).st_size
+    )
+
+def leer_registros(archivo, limite=None, tamano_final=None):
+    """
+    Lee registros CSV de un archivo abierto en modo binario, desde su posición actual.
+
+    Un campo entre comillas puede contener saltos de línea, así que un registro puede ocupar
+    varias líneas físicas: se siguen leyendo líneas hasta que las comillas quedan cerradas
+    (ver fin_de_registros()).
+
+    Args:
+        archivo: Archivo en modo binario, posicionado al inicio de un registro.
+        limite (int): Bytes desde la posición inicial a partir de los que no se empieza otro
+            registro, o None para leer hasta el final.
+        tamano_final (int): Si se indica, se detiene ante un registro con comillas sin cerrar,
+            o sin salto de línea final salvo que sea el último del archivo y el archivo siga
+            midiendo `tamano_final` bytes al terminar de leerlo. En un archivo al que se le
+            siguen agregando filas esos registros pueden estar escritos a medias.
+
+    Yields:
+        tuple: (bytes del registro, campos).
+    """
+    leidos = 0
+    while limite is None or leidos < limite:
+        crudo = archivo.readline()
+        if not crudo:
+            return
+        while True:
+            texto = crudo.decode()
+            completo = crudo.endswith(b"\n") and fin_de_registros(texto) == len(texto)
+            if completo:
+                break
+            linea = archivo.readline()
+            if not linea:
+                break
+            crudo += linea
+        if tamano_final is not None and not completo and not _ultimo_registro_cerrado(archivo, texto, tamano_final):
+            return
+        leidos += len(crudo)
+        yield crudo, next(csv.reader([texto]), [])
+
+def leer_con_progreso(lector, progreso=None, cada=1000):
+    """
+    Recorre un lector CSV informando periódicamente las filas y bytes leídos.
+
+    Los bytes se estiman a partir de los campos de cada fila, ya que un archivo en modo
+    texto no permite consultar su posición mientras se itera.
+
+    Args:
+        lector (iterable): Filas crudas, por ejemplo un csv.reader.
+        progreso (callable): Función registrar(filas, rechazadas, bytes_leidos), o None.
+        cada (int): Filas entre cada llamada a `progreso`.
+
+    Yields:
+        list: Las mismas filas del lector.
+    """
+    if progreso is None:
+        yield from lector
+        return
+    filas = 0
+    bytes_leidos = 0
+    for fila in lector:
+        filas += 1
+        bytes_leidos += sum(map(len, fila)) + len(fila)
+        if filas == cada:
+            progreso(filas=filas, bytes_leidos=bytes_leidos)
+            filas = bytes_leidos = 0
+        yield fila
+    progreso(filas=filas, bytes_leidos=bytes_leidos)
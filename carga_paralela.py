@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import psycopg2
+from carga_masiva import FilaInvalida, FuenteCopy, convertir_fila, fin_de_registros, leer_registros, sentencias_staging
+from db import parametros_conexion, obtener_conexion, devolver_conexion
+from rechazos import RegistroRechazos, linea_rechazo
+
+# Particiones por proceso, para repartir mejor la carga si algunas son más lentas
+PARTICIONES_POR_PROCESO = 4
+# Bytes que se leen de una vez al buscar los límites de las particiones
+TAMANO_LECTURA = 1 << 20
+
+# Conexión de cada proceso trabajador, abierta una vez y reutilizada en todas sus particiones
+_conexion_trabajador = None
+
+def particionar_archivo(ruta_archivo, partes):
+    """
+    Divide un archivo en rangos de bytes que empiezan y terminan en un límite de registro.
+
+    Un salto de línea dentro de un campo entre comillas no termina el registro, así que no
+    alcanza con buscar el siguiente salto de línea desde una posición cualquiera: el archivo
+    se recorre una vez en bloques de TAMANO_LECTURA y cada límite se ubica en el final del
+    último registro anterior a la posición deseada. Como las comillas y los saltos de línea
+    son ASCII, el texto se decodifica como latin-1 para que cada carácter sea un byte.
+
+    Args:
+        ruta_archivo (str): Ruta del archivo CSV.
+        partes (int): Número de rangos deseado.
+
+    Returns:
+        list: Tuplas (inicio, fin) en bytes; puede haber menos de `partes` si el archivo es pequeño.
+    """
+    tamano = os.path.getsize(ruta_archivo)
+    objetivos = [tamano * k // partes for k in range(1, partes)]
+    limites = [0]
+    # Texto desde `base`, que siempre es el inicio de un registro
+    base = 0
+    texto = ""
+    with open(ruta_archivo, 'rb') as archivo:
+        while objetivos:
+            bloque = archivo.read(TAMANO_LECTURA)
+            if not bloque:
+                break
+            texto += bloque.decode("latin-1")
+            while objetivos and objetivos[0] < base + len(texto):
+                corte = fin_de_registros(texto[:objetivos.pop(0) - base])
+                if base + corte > limites[-1]:
+                    limites.append(base + corte)
+            corte = fin_de_registros(texto)
+            base += corte
+            texto = texto[corte:]
+    limites.append(tamano)
+    return [(inicio, fin) for inicio, fin in zip(limites, limites[1:]) if fin > inicio]
+
+def _iniciar_trabajador():
+    global _conexion_trabajador
+    _conexion_trabajador = psycopg2.connect(**parametros_conexion())
+
+def _cargar_particion(nombre_tabla, ruta_archivo, inicio, fin, staging, ruta_rechazos, claves=None):
+    """
+    Lee, valida y envía por COPY una partición del archivo a la tabla de staging compartida.
+
+    Cada fila se etiqueta con su posición en bytes dentro del archivo, de modo que la
+    fusión final conserva la primera aparición de cada id como en la carga secuencial.
+    Las filas rechazadas se escriben en `ruta_rechazos` con su número de registro local.
+
+    Returns:
+        tuple: (registros leídos, filas enviadas, rechazos por motivo, ruta del archivo de
+            rechazos o None si no hubo).
+    """
+    _, _, copiar, _ = sentencias_staging(nombre_tabla, staging, temporal=False)
+    por_motivo = Counter()
+    archivo_rechazos = None
+    registros = 0
+
+    def filas_convertidas(archivo):
+        nonlocal registros, archivo_rechazos
+        posicion = inicio
+        for registro, fila in leer_registros(archivo, fin - inicio):
+            registros += 1
+            desplazamiento = posicion
+            posicion += len(registro)
+            try:
+                yield desplazamiento, convertir_fila(nombre_tabla, fila, claves)
+            except FilaInvalida as e:
+                if archivo_rechazos is None:
+                    archivo_rechazos = open(ruta_rechazos, "w", encoding="utf-8")
+                archivo_rechazos.write(linea_rechazo(registros, e.motivo, fila, str(e)))
+                por_motivo[e.motivo] += 1
+
+    try:
+        with open(ruta_archivo, 'rb') as archivo:
+            archivo.seek(inicio)
+            fuente = FuenteCopy(filas_convertidas(archivo))
+            with _conexion_trabajador.cursor() as cursor:
+                try:
+                    cursor.copy_expert(copiar, fuente)
+                    _conexion_trabajador.commit()
+                except Exception:
+                    _conexion_trabajador.rollback()
+                    raise
+    finally:
+        if archivo_rechazos is not None:
+            archivo_rechazos.close()
+    return registros, fuente.filas_enviadas, por_motivo, ruta_rechazos if archivo_rechazos else None
+
+def cargar_csv_paralelo(nombre_tabla, ruta_archivo, procesos=None, progreso=None, claves=None):
+    """
+    Carga un CSV grande repartiendo el parseo, la validación y el COPY entre varios procesos.
+
+    El archivo se divide en rangos de bytes alineados a registros; cada proceso trabajador
+    los envía por su propia conexión a una tabla UNLOGGED compartida y al final se
+    fusiona todo en la tabla destino con un único INSERT ... ON CONFLICT DO NOTHING.
+
+    Args:
+        nombre_tabla (str): Nombre de la tabla destino.
+        ruta_archivo (str): Ruta del archivo CSV.
+        procesos (int): Número de procesos trabajadores; por defecto, los núcleos disponibles.
+        progreso (callable): Función registrar(filas, rechazadas, bytes_leidos) que se llama al
+            terminar cada partición, o None.
+        claves (tuple): (ids de departments, ids de jobs) para validar las claves foráneas de
+            hired_employees, o None.
+
+    Returns:
+        dict: filas_insertadas, filas_nuevas, rechazos (resumen del registro de rechazos, con
+            los números de fila del archivo completo), segundos y procesos usados.
+
+    Raises:
+        RuntimeError: Si no hay conexión con la base de datos.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if claves is not None:
+        # Los procesos trabajadores reciben una copia serializable de las claves
+        claves = tuple(frozenset(ids) for ids in claves)
+    particiones = particionar_archivo(ruta_archivo, procesos * PARTICIONES_POR_PROCESO)
+    staging, crear, _, fusionar = sentencias_staging(
+        nombre_tabla, f"staging_{nombre_tabla}_{uuid.uuid4().hex[:12]}", temporal=False
+    )
+
+    conexion = obtener_conexion()
+    if conexion is None:
+        raise RuntimeError("Fallo al conectar con la base de datos")
+
+    rechazos = RegistroRechazos()
+    os.makedirs(rechazos.directorio, exist_ok=True)
+    cursor = conexion.cursor()
+    inicio = time.perf_counter()
+    try:
+        cursor.execute(crear)
+        conexion.commit()
+
+        # spawn evita heredar en los hijos las conexiones abiertas del pool del proceso principal
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_iniciar_trabajador) as ejecutor:
+            futuros = {
+                ejecutor.submit(
+                    _cargar_particion, nombre_tabla, ruta_archivo, desde, hasta, staging, f"{rechazos.ruta}.{k}", claves
+                ): k
+                for k, (desde, hasta) in enumerate(particiones)
+            }
+            resultados = [None] * len(particiones)
+            for futuro in as_completed(futuros):
+                k = futuros[futuro]
+                resultados[k] = futuro.result()
+                if progreso:
+                    registros, _, por_motivo, _ = resultados[k]
+                    desde, hasta = particiones[k]
+                    progreso(filas=registros, rechazadas=sum(por_motivo.values()), bytes_leidos=hasta - desde)
+
+        cursor.execute(fusionar)
+        filas_nuevas = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging};")
+        conexion.commit()
+    except Exception:
+        conexion.rollback()
+        cursor.execute(f"DROP TABLE IF EXISTS {staging};")
+        conexion.commit()
+        for k in range(len(particiones)):
+            if os.path.exists(f"{rechazos.ruta}.{k}"):
+                os.remove(f"{rechazos.ruta}.{k}")
+        raise
+    finally:
+        cursor.close()
+        devolver_conexion(conexion)
+
+    # Unir los rechazos de cada partición traduciendo sus números de registro locales a números de fila del archivo
+    filas_insertadas = 0
+    registros_previos = 0
+    with rechazos:
+        for registros, enviadas, por_motivo, ruta_parte in resultados:
+            filas_insertadas += enviadas
+            if ruta_parte:
+                rechazos.agregar_parte(ruta_parte, registros_previos, por_motivo)
+            registros_previos += registros
+
+    return {
+        "filas_insertadas": filas_insertadas,
+        "filas_nuevas": filas_nuevas,
+        "rechazos": rechazos.resumen(),
+        "segundos": time.perf_counter() - inicio,
+        "procesos": procesos,
+    }
@@ -1,26 +1,233 @@
 # db.py
 import os
-import psycopg2
+import queue
+import threading
 import time
+import psycopg2
+from psycopg2 import extensions
+from metricas import DURACION_ADQUISICION, DURACION_CONEXION, FALLOS_CONEXION, REINTENTOS_CONEXION, incrementar, medir, observar
+
+def parametros_conexion(replica=False):
+    """
+    Lee los parámetros de conexión desde las variables de entorno.
+
+    Args:
+        replica (bool): Si se leen los de la réplica de lectura (variables POSTGRES_REPLICA_*);
+            las que no estén definidas se toman de la primaria.
+
+    Returns:
+        dict: Argumentos para psycopg2.connect.
+    """
+    def variable(nombre, defecto):
+        valor = os.getenv(f"POSTGRES_{nombre}", defecto)
+        return os.getenv(f"POSTGRES_REPLICA_{nombre}", valor) if replica else valor
+
+    return {
+        "dbname": variable("DB", "globant_db"),
+        "user": variable("USER", "postgres"),
+        "password": variable("PASSWORD", "JuCarSua/1808"),
+        "host": variable("HOST", "globantdbserver.postgres.database.azure.com"),
+        "port": variable("PORT", "5432"),
+        "sslmode": variable("SSLMODE", "require"),
+        "connect_timeout": int(variable("CONNECT_TIMEOUT", "5")),
+    }
+
+def replica_configurada():
+    """
+    Returns:
+        bool: Si hay una réplica de lectura configurada con POSTGRES_REPLICA_HOST.
+    """
+    return bool(os.getenv("POSTGRES_REPLICA_HOST"))
+
+class PoolConexiones:
+    """
+    Pool de conexiones compartido por todos los endpoints.
+
+    Las conexiones ociosas se verifican al entregarse, las esperas por un cupo libre
+    están acotadas por un timeout, y los fallos de conexión activan un backoff
+    exponencial durante el cual se falla de inmediato en lugar de dormir el hilo.
+    """
 
-def get_db_connection():
-    retries = 5
-    while retries > 0:
+    def __init__(self, minimo=1, maximo=10, timeout_adquisicion=5.0, segundos_ping=30.0,
+                 backoff_inicial=0.5, backoff_maximo=30.0):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout_adquisicion = timeout_adquisicion
+        self.segundos_ping = segundos_ping
+        self._backoff_inicial = backoff_inicial
+        self._backoff_maximo = backoff_maximo
+        self._backoff = backoff_inicial
+        self._no_antes_de = 0.0
+        self._fallos_seguidos = 0
+        self._ociosas = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self._candado = threading.Lock()
+        self._cerrado = False
+
+    def precalentar(self):
+        """
+        Abre las conexiones mínimas del pool.
+
+        Returns:
+            int: Número de conexiones abiertas.
+        """
+        abiertas = 0
+        for _ in range(self.minimo - self._ociosas.qsize()):
+            conexion = self._conectar()
+            if conexion is None:
+                break
+            self._ociosas.put((conexion, time.monotonic()))
+            abiertas += 1
+        return abiertas
+
+    def _conectar(self):
+        with self._candado:
+            if time.monotonic() < self._no_antes_de:
+                return None
+            if self._fallos_seguidos:
+                incrementar(REINTENTOS_CONEXION, pool="psycopg2")
         try:
-            conn = psycopg2.connect(
-                dbname=os.getenv("POSTGRES_DB", "globant_db"),
-                user=os.getenv("POSTGRES_USER", "postgres"),
-                password=os.getenv("POSTGRES_PASSWORD", "JuCarSua/1808"), 
-                host=os.getenv("POSTGRES_HOST", "globantdbserver.postgres.database.azure.com"),
-                port=os.getenv("POSTGRES_PORT", "5432"),
-                sslmode="require"
-            )
-            return conn
+            with medir(DURACION_CONEXION, pool="psycopg2"):
+                conexion = psycopg2.connect(**parametros_conexion())
         except Exception as e:
-            print(f"Error conexión al database: {e}")
-            retries -= 1
-            if retries == 0:
-                return None
-            print(f"Reintentando conexión... ({5 - retries}/5)")
-            time.sleep(2)
-    return None
\ No newline at end of file
+            incrementar(FALLOS_CONEXION, pool="psycopg2")
+            with self._candado:
+                print(f"Error conexión al database: {e} (próximo intento en {self._backoff:.1f}s)")
+                self._fallos_seguidos += 1
+                self._no_antes_de = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, self._backoff_maximo)
+            return None
+        with self._candado:
+            self._fallos_seguidos = 0
+            self._backoff = self._backoff_inicial
+            self._no_antes_de = 0.0
+        return conexion
+
+    def _saludable(self, conexion, ociosa_desde):
+        if conexion.closed:
+            return False
+        if conexion.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - ociosa_desde < self.segundos_ping:
+            return True
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conexion.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obtener(self):
+        """
+        Entrega una conexión del pool.
+
+        Returns:
+            connection: Conexión saludable, o None si no hay cupo dentro del timeout o la base no responde.
+        """
+        inicio = time.perf_counter()
+        if self._cerrado or not self._cupos.acquire(timeout=self.timeout_adquisicion):
+            return None
+        observar(DURACION_ADQUISICION, time.perf_counter() - inicio, pool="psycopg2")
+        try:
+            while True:
+                try:
+                    conexion, ociosa_desde = self._ociosas.get_nowait()
+                except queue.Empty:
+                    break
+                if self._saludable(conexion, ociosa_desde):
+                    return conexion
+                self._descartar(conexion)
+            conexion = self._conectar()
+        except Exception:
+            self._cupos.release()
+            raise
+        if conexion is None:
+            self._cupos.release()
+        return conexion
+
+    def devolver(self, conexion):
+        """
+        Devuelve una conexión al pool, descartándola si quedó rota.
+
+        Args:
+            conexion: Conexión obtenida con obtener().
+        """
+        try:
+            if not conexion.closed and conexion.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conexion.rollback()
+            if self._cerrado or conexion.closed:
+                self._descartar(conexion)
+            else:
+                self._ociosas.put((conexion, time.monotonic()))
+        except Exception:
+            self._descartar(conexion)
+        finally:
+            self._cupos.release()
+
+    def _descartar(self, conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+    def cerrar(self):
+        """Cierra todas las conexiones ociosas; las prestadas se cierran al devolverse."""
+        self._cerrado = True
+        while True:
+            try:
+                conexion, _ = self._ociosas.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conexion)
+
+_pool = None
+_pool_candado = threading.Lock()
+
+def iniciar_pool():
+    """
+    Crea el pool compartido con la configuración de las variables de entorno.
+
+    Returns:
+        PoolConexiones: El pool creado.
+    """
+    global _pool
+    with _pool_candado:
+        if _pool is None:
+            _pool = PoolConexiones(
+                minimo=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+                maximo=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+                timeout_adquisicion=float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")),
+                segundos_ping=float(os.getenv("POSTGRES_POOL_PING_SEG", "30")),
+            )
+            _pool.precalentar()
+        return _pool
+
+def cerrar_pool():
+    """Cierra el pool compartido si existe."""
+    global _pool
+    with _pool_candado:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+def obtener_conexion():
+    """
+    Obtiene una conexión del pool compartido, creándolo si aún no existe.
+
+    Returns:
+        connection: Conexión a la base de datos, o None si no está disponible.
+    """
+    return iniciar_pool().obtener()
+
+def devolver_conexion(conexion):
+    """
+    Devuelve al pool una conexión obtenida con obtener_conexion().
+
+    Args:
+        conexion: Conexión a devolver.
+    """
+    if _pool is None:
+        conexion.close()
+    else:
+        _pool.devolver(conexion)
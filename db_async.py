@@ -0,0 +1,142 @@
+# db_async.py
+import asyncio
+import os
+import re
+import time
+import asyncpg
+from db import parametros_conexion
+from metricas import DURACION_ADQUISICION, FALLOS_CONEXION, REINTENTOS_CONEXION, incrementar, medir
+
+# Un pool por destino: "primaria" para todo y "replica" para las lecturas enrutadas por replica.py
+_pools = {}
+_pool_loop = None
+_pool_candado = None
+
+# Backoff por destino tras un fallo al crear el pool, como en db.PoolConexiones:
+# mientras dura, las peticiones fallan de inmediato en lugar de esperar el connect_timeout
+BACKOFF_INICIAL = 0.5
+BACKOFF_MAXIMO = 30.0
+_no_antes_de = {}
+_backoff = {}
+
+def a_posicionales(sql):
+    """
+    Convierte los marcadores %s de psycopg2 en los marcadores $1, $2... de asyncpg.
+
+    Args:
+        sql (str): Consulta con marcadores %s.
+
+    Returns:
+        str: Consulta con marcadores posicionales.
+    """
+    contador = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(contador)}", sql)
+
+def _etiqueta(destino):
+    return "asyncpg" if destino == "primaria" else f"asyncpg_{destino}"
+
+def en_backoff(destino="primaria"):
+    """
+    Indica si el destino sigue dentro del backoff de su último fallo de conexión.
+
+    Args:
+        destino (str): "primaria" o "replica".
+
+    Returns:
+        bool: True si todavía no se debe reintentar crear su pool.
+    """
+    return time.monotonic() < _no_antes_de.get(destino, 0.0)
+
+async def iniciar_pool_async(destino="primaria"):
+    """
+    Crea el pool asíncrono de un destino con la configuración de las variables de entorno.
+
+    Si los pools se crearon en otro event loop (por ejemplo, entre clientes de prueba) se crean nuevos.
+    Si la creación falla, el destino entra en un backoff exponencial durante el cual
+    se lanza ConnectionError sin volver a intentar la conexión.
+
+    Args:
+        destino (str): "primaria" o "replica".
+
+    Returns:
+        asyncpg.Pool: El pool del destino en el event loop actual.
+    """
+    global _pool_loop, _pool_candado
+    loop = asyncio.get_running_loop()
+    if _pool_loop is loop and destino in _pools:
+        return _pools[destino]
+    if _pool_candado is None or _pool_loop is not loop:
+        _pool_candado = asyncio.Lock()
+        _pool_loop = loop
+        _pools.clear()
+    async with _pool_candado:
+        if destino not in _pools:
+            # Las peticiones que esperaban el candado durante el fallo tampoco reintentan
+            if en_backoff(destino):
+                raise ConnectionError(f"{destino} en backoff tras un fallo de conexión")
+            if destino in _backoff:
+                incrementar(REINTENTOS_CONEXION, pool=_etiqueta(destino))
+            parametros = parametros_conexion(replica=destino == "replica")
+            try:
+                _pools[destino] = await asyncpg.create_pool(
+                    host=parametros["host"],
+                    port=int(parametros["port"]),
+                    user=parametros["user"],
+                    password=parametros["password"],
+                    database=parametros["dbname"],
+                    ssl=parametros["sslmode"],
+                    timeout=parametros["connect_timeout"],
+                    min_size=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+                    max_size=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+                )
+            except Exception:
+                espera = _backoff.get(destino, BACKOFF_INICIAL)
+                _no_antes_de[destino] = time.monotonic() + espera
+                _backoff[destino] = min(espera * 2, BACKOFF_MAXIMO)
+                raise
+            _backoff.pop(destino, None)
+            _no_antes_de.pop(destino, None)
+    return _pools[destino]
+
+async def cerrar_pool_async():
+    """Cierra los pools asíncronos que existan."""
+    if _pool_loop is asyncio.get_running_loop():
+        for pool in _pools.values():
+            await pool.close()
+    _pools.clear()
+
+async def obtener_conexion_async(destino="primaria"):
+    """
+    Obtiene una conexión del pool asíncrono sin bloquear el event loop.
+
+    Args:
+        destino (str): "primaria" o "replica".
+
+    Returns:
+        asyncpg.Connection: Conexión a la base de datos, o None si no está disponible.
+    """
+    if en_backoff(destino):
+        return None
+    try:
+        # Incluye la apertura de conexiones nuevas, que asyncpg hace dentro de acquire()
+        with medir(DURACION_ADQUISICION, pool=_etiqueta(destino)):
+            pool = await iniciar_pool_async(destino)
+            return await pool.acquire(timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")))
+    except Exception as e:
+        incrementar(FALLOS_CONEXION, pool=_etiqueta(destino))
+        print(f"Error conexión al database ({destino}): {e}")
+        return None
+
+async def devolver_conexion_async(conexion, destino="primaria"):
+    """
+    Devuelve al pool una conexión obtenida con obtener_conexion_async().
+
+    Args:
+        conexion: Conexión a devolver.
+        destino (str): Destino con el que se obtuvo.
+    """
+    pool = _pools.get(destino)
+    if pool is None or _pool_loop is not asyncio.get_running_loop():
+        await conexion.close()
+    else:
+        await pool.release(conexion)
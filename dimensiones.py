@@ -0,0 +1,181 @@
+import os
+import time
+from db import obtener_conexion, devolver_conexion
+from db_async import obtener_conexion_async, devolver_conexion_async
+
+# Nombre con el que se muestran los ids nulos o inexistentes, como el COALESCE de las consultas
+DESCONOCIDO = "Unknown"
+
+class IdsDimension:
+    """
+    Ids vigentes de departments o jobs para validar claves foráneas.
+
+    Siempre consulta los diccionarios actuales de la caché; ante un id desconocido pide una
+    recarga (limitada por CacheDimensiones.recargar_por_falta) antes de darlo por inexistente,
+    así que una fila creada desde otro proceso no se rechaza hasta que venza el TTL. Con
+    `recargar=False` no recarga: las rutas async lo usan para no bloquear el event loop y
+    hacen ellas mismas una sola recarga asíncrona por lote.
+    """
+
+    def __init__(self, cache, atributo, recargar=True):
+        self._cache = cache
+        self._atributo = atributo
+        self._recargar = recargar
+
+    def _ids(self):
+        return getattr(self._cache, self._atributo)
+
+    def __contains__(self, id_):
+        if id_ in self._ids():
+            return True
+        return self._recargar and self._cache.recargar_por_falta() and id_ in self._ids()
+
+    def __iter__(self):
+        return iter(self._ids())
+
+    def __len__(self):
+        return len(self._ids())
+
+class CacheDimensiones:
+    """
+    Copia en memoria de departments y jobs, compartida por todo el proceso.
+
+    Se carga al iniciar la API y se recarga después de cada carga en esas tablas; el TTL
+    acota cuánto tarda en verse una escritura hecha desde otro proceso. Cada recarga
+    reemplaza los diccionarios completos, así que los lectores nunca ven una copia a medias
+    y no necesitan candado.
+    """
+
+    def __init__(self, ttl=300.0, espera_falta=5.0):
+        self.ttl = ttl
+        self.espera_falta = espera_falta
+        self.departamentos = {}
+        self.trabajos = {}
+        self._cargado_en = None
+        self._recarga_por_falta_en = None
+
+    def _vigente(self):
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def _reemplazar(self, departamentos, trabajos):
+        self.departamentos = {fila[0]: fila[1] for fila in departamentos}
+        self.trabajos = {fila[0]: fila[1] for fila in trabajos}
+        self._cargado_en = time.monotonic()
+
+    def recargar(self):
+        """
+        Vuelve a leer ambas tablas con una conexión del pool sincrónico.
+
+        Raises:
+            RuntimeError: Si no hay conexión con la base de datos.
+        """
+        conexion = obtener_conexion()
+        if conexion is None:
+            raise RuntimeError("Fallo al conectar con la base de datos")
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT id, department FROM departments;")
+                departamentos = cursor.fetchall()
+                cursor.execute("SELECT id, job FROM jobs;")
+                trabajos = cursor.fetchall()
+            conexion.rollback()
+        finally:
+            devolver_conexion(conexion)
+        self._reemplazar(departamentos, trabajos)
+
+    async def recargar_async(self):
+        """
+        Igual que recargar(), con una conexión del pool asíncrono.
+
+        Raises:
+            RuntimeError: Si no hay conexión con la base de datos.
+        """
+        conexion = await obtener_conexion_async()
+        if conexion is None:
+            raise RuntimeError("Fallo al conectar con la base de datos")
+        try:
+            departamentos = await conexion.fetch("SELECT id, department FROM departments;")
+            trabajos = await conexion.fetch("SELECT id, job FROM jobs;")
+        finally:
+            await devolver_conexion_async(conexion)
+        self._reemplazar(departamentos, trabajos)
+
+    def asegurar(self):
+        """Recarga las tablas si nunca se cargaron o si venció el TTL."""
+        if not self._vigente():
+            self.recargar()
+
+    async def asegurar_async(self):
+        """Versión de asegurar() para el event loop."""
+        if not self._vigente():
+            await self.recargar_async()
+
+    def _toca_recargar_por_falta(self):
+        ahora = time.monotonic()
+        for momento in (self._cargado_en, self._recarga_por_falta_en):
+            if momento is not None and ahora - momento < self.espera_falta:
+                return False
+        self._recarga_por_falta_en = ahora
+        return True
+
+    def recargar_por_falta(self):
+        """
+        Recarga las tablas porque se buscó un id que no está, como máximo una vez cada
+        `espera_falta` segundos para que un CSV con muchos ids inexistentes no consulte la
+        base de datos por cada fila. Usa el pool sincrónico: desde el event loop se usa
+        recargar_por_falta_async().
+
+        Returns:
+            bool: Si se recargó.
+        """
+        if not self._toca_recargar_por_falta():
+            return False
+        try:
+            self.recargar()
+        except Exception as e:
+            print(f"No se pudo recargar la caché de dimensiones: {e}")
+            return False
+        return True
+
+    async def recargar_por_falta_async(self):
+        """
+        Versión de recargar_por_falta() para el event loop, con el mismo límite.
+
+        Returns:
+            bool: Si se recargó.
+        """
+        if not self._toca_recargar_por_falta():
+            return False
+        try:
+            await self.recargar_async()
+        except Exception as e:
+            print(f"No se pudo recargar la caché de dimensiones: {e}")
+            return False
+        return True
+
+    def invalidar(self):
+        """Fuerza la recarga en el siguiente acceso."""
+        self._cargado_en = None
+
+    def claves(self, recargar=True):
+        """
+        Args:
+            recargar (bool): Si un id desconocido provoca una recarga sincrónica antes de
+                rechazarse; las rutas async pasan False y usan recargar_por_falta_async().
+
+        Returns:
+            tuple: (ids de departments, ids de jobs) como IdsDimension, para validar las claves
+                foráneas al cargar.
+        """
+        return IdsDimension(self, "departamentos", recargar), IdsDimension(self, "trabajos", recargar)
+
+    def nombre_departamento(self, departamento_id):
+        return self.departamentos.get(departamento_id, DESCONOCIDO)
+
+    def nombre_trabajo(self, trabajo_id):
+        return self.trabajos.get(trabajo_id, DESCONOCIDO)
+
+cache_dimensiones = CacheDimensiones(
+    ttl=float(os.getenv("DIMENSIONES_TTL_SEG", "300")),
+    espera_falta=float(os.getenv("DIMENSIONES_RECARGA_FALTA_SEG", "5")),
+)
@@ -0,0 +1,253 @@
+import csv
+import io
+import os
+import zlib
+import brotli
+import orjson
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import pyarrow as pa
+except ImportError:
+    # Sin pyarrow las métricas se siguen sirviendo en JSON y CSV
+    pa = None
+
+# Tamaño a partir del cual se comprime la respuesta si el cliente lo acepta
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+# Filas por bloque al transmitir CSV y Arrow
+FILAS_POR_BLOQUE = int(os.getenv("FORMATOS_FILAS_POR_BLOQUE", "1000"))
+
+TIPO_JSON = "application/json"
+TIPO_CSV = "text/csv"
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+FORMATOS = {TIPO_JSON: "json", TIPO_CSV: "csv", TIPO_ARROW: "arrow"}
+# Codificaciones en orden de preferencia del servidor cuando el cliente acepta varias con el mismo peso
+CODIFICACIONES = ("br", "gzip")
+
+class ContratacionesTrimestre(BaseModel):
+    """Fila de /contrataciones-por-trimestre."""
+    departamento: str
+    trabajo: str
+    Q1: int
+    Q2: int
+    Q3: int
+    Q4: int
+
+class DepartamentoSobrePromedio(BaseModel):
+    """Fila de /departamentos-sobre-promedio."""
+    id: int
+    departamento: str
+    contratados: int
+
+def _preferencias(cabecera):
+    """
+    Interpreta una cabecera Accept o Accept-Encoding.
+
+    Returns:
+        list: Tuplas (valor, peso) con peso mayor que 0, de mayor a menor peso y en el orden
+            de la cabecera a igual peso.
+    """
+    valores = []
+    for orden, parte in enumerate((cabecera or "").split(",")):
+        valor, *parametros = [trozo.strip() for trozo in parte.split(";")]
+        peso = 1.0
+        for parametro in parametros:
+            nombre, _, dato = parametro.partition("=")
+            if nombre.strip().lower() == "q":
+                try:
+                    peso = float(dato)
+                except ValueError:
+                    peso = 0.0
+        if valor and peso > 0:
+            valores.append((-peso, orden, valor.lower()))
+    return [(valor, -peso) for peso, _, valor in sorted(valores)]
+
+def negociar_formato(accept):
+    """
+    Elige el formato de la respuesta según la cabecera Accept.
+
+    Args:
+        accept (str): Valor de la cabecera, o None (equivale a JSON).
+
+    Returns:
+        str: "json", "csv" o "arrow", o None si el cliente no acepta ninguno disponible.
+    """
+    if not accept:
+        return "json"
+    for tipo, _ in _preferencias(accept):
+        if tipo in ("*/*", "application/*"):
+            return "json"
+        if tipo == "text/*":
+            return "csv"
+        formato = FORMATOS.get(tipo)
+        if formato == "arrow" and pa is None:
+            continue
+        if formato is not None:
+            return formato
+    return None
+
+def negociar_codificacion(accept_encoding):
+    """
+    Elige la compresión según la cabecera Accept-Encoding; a igual peso se prefiere br.
+
+    Returns:
+        str: "br", "gzip" o None para enviar sin comprimir.
+    """
+    pesos = {}
+    for codificacion, peso in _preferencias(accept_encoding):
+        for candidata in (CODIFICACIONES if codificacion == "*" else (codificacion,)):
+            pesos.setdefault(candidata, peso)
+    aceptadas = [codificacion for codificacion in CODIFICACIONES if codificacion in pesos]
+    if not aceptadas:
+        return None
+    return max(aceptadas, key=lambda codificacion: pesos[codificacion])
+
+class Compresor:
+    """Comprime un cuerpo por partes; cada parte se puede enviar sin esperar al resto."""
+
+    def __init__(self, codificacion):
+        if codificacion == "br":
+            self._brotli = brotli.Compressor(quality=5)
+        else:
+            self._brotli = None
+            # wbits=31 produce el formato gzip (cabecera y CRC) en lugar de zlib
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        if self._brotli is not None:
+            return self._brotli.process(datos) + self._brotli.flush()
+        return self._zlib.compress(datos) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+def comprimir(datos, codificacion):
+    """Comprime un cuerpo completo con la codificación indicada."""
+    compresor = Compresor(codificacion)
+    return compresor.comprimir(datos) + compresor.terminar()
+
+class ResultadoMetrica:
+    """
+    Filas de un endpoint de métricas tal como se guardan en el cache de respuestas.
+
+    El JSON y sus versiones comprimidas se calculan la primera vez que se piden y se
+    reutilizan mientras la entrada siga en el cache, así que las respuestas servidas desde
+    el cache no vuelven a serializar ni a comprimir.
+
+    Args:
+        filas (list): Diccionarios con los campos del modelo.
+        modelo (type): Modelo de pydantic que describe cada fila.
+    """
+
+    def __init__(self, filas, modelo):
+        self.filas = filas
+        self.modelo = modelo
+        self._cuerpos = {}
+
+    @property
+    def columnas(self):
+        return list(self.modelo.__fields__)
+
+    def json(self, codificacion=None):
+        """
+        Returns:
+            tuple: (cuerpo en bytes, codificación aplicada o None si quedó bajo el umbral).
+        """
+        clave = codificacion
+        if clave not in self._cuerpos:
+            if codificacion is None:
+                self._cuerpos[None] = (orjson.dumps(self.filas), None)
+            else:
+                cuerpo, _ = self.json()
+                if len(cuerpo) < COMPRESION_MIN_BYTES:
+                    self._cuerpos[clave] = (cuerpo, None)
+                else:
+                    self._cuerpos[clave] = (comprimir(cuerpo, codificacion), codificacion)
+        return self._cuerpos[clave]
+
+    def _bloques(self):
+        for inicio in range(0, len(self.filas), FILAS_POR_BLOQUE):
+            yield self.filas[inicio:inicio + FILAS_POR_BLOQUE]
+
+    def bloques_csv(self):
+        """Genera el CSV con encabezado en bloques de FILAS_POR_BLOQUE filas."""
+        columnas = self.columnas
+        salida = io.StringIO()
+        escritor = csv.writer(salida, lineterminator="\n")
+        escritor.writerow(columnas)
+        for bloque in self._bloques():
+            escritor.writerows([fila[columna] for columna in columnas] for fila in bloque)
+            yield salida.getvalue().encode()
+            salida.seek(0)
+            salida.truncate()
+        if salida.tell():
+            yield salida.getvalue().encode()
+
+    def esquema_arrow(self):
+        tipos = {int: pa.int64(), str: pa.string()}
+        return pa.schema([(nombre, tipos[campo.outer_type_]) for nombre, campo in self.modelo.__fields__.items()])
+
+    def bloques_arrow(self):
+        """Genera un stream IPC de Arrow con un record batch por bloque de FILAS_POR_BLOQUE filas."""
+        esquema = self.esquema_arrow()
+        salida = io.BytesIO()
+        with pa.ipc.new_stream(salida, esquema) as escritor:
+            for bloque in self._bloques():
+                escritor.write_batch(pa.RecordBatch.from_pydict(
+                    {nombre: [fila[nombre] for fila in bloque] for nombre in esquema.names}, schema=esquema
+                ))
+                yield salida.getvalue()
+                salida.seek(0)
+                salida.truncate()
+        # Marca de fin del stream (y el esquema si no hubo filas)
+        yield salida.getvalue()
+
+def _encadenar(primero, resto):
+    yield primero
+    yield from resto
+
+def _transmitir(primero, resto, compresor):
+    yield compresor.comprimir(primero)
+    for bloque in resto:
+        yield compresor.comprimir(bloque)
+    yield compresor.terminar()
+
+def responder(resultado, formato, codificacion, cabeceras):
+    """
+    Arma la respuesta de un endpoint de métricas en el formato y la compresión negociados.
+
+    JSON se envía de una vez desde el cuerpo ya serializado. CSV y Arrow se transmiten por
+    bloques; si el primer bloque es el único y no llega a COMPRESION_MIN_BYTES, se envía
+    entero y sin comprimir.
+
+    Args:
+        resultado (ResultadoMetrica): Filas a enviar.
+        formato (str): "json", "csv" o "arrow".
+        codificacion (str): "br", "gzip" o None.
+        cabeceras (dict): Cabeceras adicionales (ETag, Cache-Control, Vary).
+
+    Returns:
+        Response: Respuesta completa o StreamingResponse.
+    """
+    cabeceras = dict(cabeceras)
+    if formato == "json":
+        cuerpo, aplicada = resultado.json(codificacion)
+        if aplicada:
+            cabeceras["Content-Encoding"] = aplicada
+        return Response(content=cuerpo, media_type=TIPO_JSON, headers=cabeceras)
+
+    tipo = TIPO_CSV if formato == "csv" else TIPO_ARROW
+    bloques = resultado.bloques_csv() if formato == "csv" else resultado.bloques_arrow()
+    primero = next(bloques)
+    siguiente = next(bloques, None)
+    if siguiente is None and (codificacion is None or len(primero) < COMPRESION_MIN_BYTES):
+        return Response(content=primero, media_type=tipo, headers=cabeceras)
+    resto = bloques if siguiente is None else _encadenar(siguiente, bloques)
+    if codificacion is None:
+        return StreamingResponse(_encadenar(primero, resto), media_type=tipo, headers=cabeceras)
+    cabeceras["Content-Encoding"] = codificacion
+    return StreamingResponse(_transmitir(primero, resto, Compresor(codificacion)), media_type=tipo, headers=cabeceras)
@@ -1,23 +1,299 @@
-from db import get_db_connection
+import argparse
+from db import obtener_conexion, devolver_conexion, cerrar_pool
 
-def init_db():
-    conn = get_db_connection()
-    if conn is None:
-        return
+# Unidades de partición de hired_employees que acepta --particionar
+UNIDADES_PARTICION = {"anio": "year", "trimestre": "quarter"}
+# Solo se crean particiones para fechas en este rango de años; las demás y las nulas
+# quedan en la partición por defecto
+ANIO_MINIMO_PARTICION = 1900
+ANIO_MAXIMO_PARTICION = 2200
 
-    cursor = conn.cursor()
+def reconstruir_rollup(cursor):
+    """
+    Recalcula hired_employees_rollup a partir de todo hired_employees.
 
-    # Crear tabla hired_employees
+    Bloquea las escrituras en hired_employees mientras dura la transacción para que
+    el resumen quede consistente con la tabla.
+
+    Args:
+        cursor: Cursor de psycopg2 con una transacción abierta.
+    """
+    cursor.execute("LOCK TABLE hired_employees IN SHARE MODE;")
+    cursor.execute("TRUNCATE hired_employees_rollup;")
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS hired_employees (
-            id INTEGER PRIMARY KEY,
+        INSERT INTO hired_employees_rollup (year, quarter, department_id, job_id, hires)
+        SELECT
+            EXTRACT(YEAR FROM datetime)::INTEGER,
+            EXTRACT(QUARTER FROM datetime)::INTEGER,
+            department_id,
+            job_id,
+            COUNT(*)
+        FROM hired_employees
+        WHERE datetime IS NOT NULL
+        GROUP BY 1, 2, 3, 4;
+    """)
+
+def tipo_hired_employees(cursor):
+    """
+    Returns:
+        str: "particionada", "simple" o None si la tabla no existe.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('hired_employees');")
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    return "particionada" if fila[0] == "p" else "simple"
+
+def crear_funcion_particiones(cursor, unidad="year"):
+    """
+    Crea asegurar_particiones_hired_employees(origen), que los cargadores llaman antes de
+    fusionar una tabla de staging (o con 'hired_employees_default' después de insertar
+    fila por fila).
+
+    La función crea las particiones que faltan para los periodos presentes en `origen`,
+    moviendo a cada una las filas de ese periodo que hubieran quedado en la partición por
+    defecto. Si hired_employees no está particionada no hace nada.
+
+    Args:
+        cursor: Cursor de psycopg2.
+        unidad (str): "year" o "quarter".
+    """
+    sufijo = "'YYYY'" if unidad == "year" else "'YYYY\"_q\"Q'"
+    intervalo = "1 year" if unidad == "year" else "3 months"
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION asegurar_particiones_hired_employees(origen TEXT) RETURNS VOID AS $$
+        DECLARE
+            inicio TIMESTAMP;
+            fin TIMESTAMP;
+            particion TEXT;
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('hired_employees')) IS DISTINCT FROM 'p' THEN
+                RETURN;
+            END IF;
+            FOR inicio IN EXECUTE format(
+                'SELECT DISTINCT date_trunc(%L, datetime) FROM %s WHERE datetime >= %L AND datetime < %L',
+                '{unidad}', origen, '{ANIO_MINIMO_PARTICION}-01-01', '{ANIO_MAXIMO_PARTICION}-01-01'
+            ) LOOP
+                particion := 'hired_employees_' || to_char(inicio, {sufijo});
+                CONTINUE WHEN to_regclass(particion) IS NOT NULL;
+                -- Dos cargas que ven el mismo periodo nuevo crean la partición una sola vez
+                PERFORM pg_advisory_xact_lock(hashtext('particiones_hired_employees'));
+                CONTINUE WHEN to_regclass(particion) IS NOT NULL;
+                fin := inicio + INTERVAL '{intervalo}';
+                EXECUTE format('CREATE TABLE %I (LIKE hired_employees INCLUDING DEFAULTS)', particion);
+                EXECUTE format(
+                    'WITH movidas AS (DELETE FROM hired_employees_default WHERE datetime >= %L AND datetime < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM movidas', inicio, fin, particion
+                );
+                EXECUTE format(
+                    'ALTER TABLE hired_employees ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    particion, inicio, fin
+                );
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    # Reserva de una vez los ids de una tabla de staging y le quita las filas cuyo id ya
+    # existía, para que el siguiente INSERT no pase fila por fila por hired_employees_ids
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION reservar_ids_hired_employees(origen TEXT) RETURNS VOID AS $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('hired_employees')) IS DISTINCT FROM 'p' THEN
+                RETURN;
+            END IF;
+            EXECUTE format(
+                'WITH reservados AS ('
+                '    INSERT INTO hired_employees_ids (id) SELECT DISTINCT id FROM %1$s'
+                '    ON CONFLICT DO NOTHING RETURNING id'
+                ') DELETE FROM %1$s s WHERE NOT EXISTS (SELECT 1 FROM reservados r WHERE r.id = s.id)',
+                origen
+            );
+            PERFORM set_config('hired_employees.ids_reservados', 'on', true);
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+def crear_hired_employees_particionada(cursor):
+    """
+    Crea hired_employees particionada por rango de datetime, con su partición por defecto.
+
+    Una tabla particionada no admite una clave primaria que no incluya la columna de
+    partición, así que la unicidad de id la mantiene hired_employees_ids: un trigger
+    registra cada id antes de insertar la fila y la descarta si ya existía, igual que
+    ON CONFLICT DO NOTHING en la tabla sin particionar. Las fusiones desde staging
+    reservan antes todos sus ids con reservar_ids_hired_employees y el trigger solo
+    vuelve a comprobarlos en los INSERT sueltos.
+    """
+    cursor.execute("""
+        CREATE TABLE hired_employees (
+            id INTEGER NOT NULL,
             name VARCHAR(255),
             datetime TIMESTAMP,
             department_id INTEGER,
             job_id INTEGER
-        );
+        ) PARTITION BY RANGE (datetime);
+    """)
+    cursor.execute("CREATE TABLE hired_employees_default PARTITION OF hired_employees DEFAULT;")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hired_employees_id ON hired_employees (id);")
+    cursor.execute("CREATE TABLE IF NOT EXISTS hired_employees_ids (id INTEGER PRIMARY KEY);")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION registrar_id_hired_employees() RETURNS TRIGGER AS $$
+        BEGIN
+            IF current_setting('hired_employees.ids_reservados', true) = 'on' THEN
+                RETURN NEW;
+            END IF;
+            INSERT INTO hired_employees_ids (id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_id_unico
+        BEFORE INSERT ON hired_employees
+        FOR EACH ROW EXECUTE FUNCTION registrar_id_hired_employees();
+    """)
+    # La reserva vale solo para el INSERT que sigue a reservar_ids_hired_employees
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION terminar_reserva_hired_employees() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM set_config('hired_employees.ids_reservados', '', true);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_terminar_reserva
+        AFTER INSERT ON hired_employees
+        FOR EACH STATEMENT EXECUTE FUNCTION terminar_reserva_hired_employees();
+    """)
+    # Los ids borrados se pueden volver a cargar
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION liberar_ids_hired_employees() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE hired_employees_ids;
+            ELSE
+                DELETE FROM hired_employees_ids WHERE id IN (SELECT id FROM borrados);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_liberar_ids
+        AFTER DELETE ON hired_employees
+        REFERENCING OLD TABLE AS borrados
+        FOR EACH STATEMENT EXECUTE FUNCTION liberar_ids_hired_employees();
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_truncar_ids
+        AFTER TRUNCATE ON hired_employees
+        FOR EACH STATEMENT EXECUTE FUNCTION liberar_ids_hired_employees();
     """)
 
+def particionar_hired_employees(cursor, unidad):
+    """
+    Migra una hired_employees sin particionar a la versión particionada.
+
+    La tabla anterior se renombra, se crea la particionada con las particiones de los
+    periodos que ya tiene, se copian las filas y se borra la anterior, todo en la
+    transacción del cursor; si algo falla no queda nada a medias. Las escrituras quedan
+    bloqueadas mientras dura la copia.
+
+    Args:
+        cursor: Cursor de psycopg2 con una transacción abierta.
+        unidad (str): "year" o "quarter".
+    """
+    cursor.execute("LOCK TABLE hired_employees IN ACCESS EXCLUSIVE MODE;")
+    cursor.execute("ALTER TABLE hired_employees RENAME TO hired_employees_anterior;")
+    for evento in ("insert", "update", "delete", "truncate"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS hired_employees_rollup_{evento} ON hired_employees_anterior;")
+    for indice in ("datetime", "department_id", "job_id"):
+        cursor.execute(f"ALTER INDEX IF EXISTS idx_hired_employees_{indice} RENAME TO idx_hired_employees_anterior_{indice};")
+    crear_hired_employees_particionada(cursor)
+    crear_funcion_particiones(cursor, unidad)
+    cursor.execute("SELECT asegurar_particiones_hired_employees('hired_employees_anterior');")
+    cursor.execute("SELECT reservar_ids_hired_employees('hired_employees_anterior');")
+    cursor.execute("""
+        INSERT INTO hired_employees (id, name, datetime, department_id, job_id)
+        SELECT id, name, datetime, department_id, job_id FROM hired_employees_anterior;
+    """)
+    cursor.execute("DROP TABLE hired_employees_anterior;")
+
+def archivar_anio(cursor, anio):
+    """
+    Separa de hired_employees las particiones de un año sin borrar fila por fila.
+
+    Cada partición se desvincula y se renombra a archivo_<partición>, que queda como tabla
+    independiente para respaldarla o borrarla; sus ids se liberan y el resumen pierde ese año.
+
+    Args:
+        cursor: Cursor de psycopg2 con una transacción abierta.
+        anio (int): Año a archivar.
+
+    Returns:
+        list: Nombres de las tablas archivadas.
+    """
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('hired_employees')
+          AND (c.relname = %s OR c.relname LIKE %s)
+        ORDER BY c.relname;
+    """, (f"hired_employees_{anio}", f"hired_employees_{anio}\\_q_"))
+    archivadas = []
+    for (particion,) in cursor.fetchall():
+        archivo = f"archivo_{particion}"
+        cursor.execute(f"ALTER TABLE hired_employees DETACH PARTITION {particion};")
+        cursor.execute(f"DELETE FROM hired_employees_ids WHERE id IN (SELECT id FROM {particion});")
+        cursor.execute(f"ALTER TABLE {particion} RENAME TO {archivo};")
+        archivadas.append(archivo)
+    cursor.execute("DELETE FROM hired_employees_rollup WHERE year = %s;", (anio,))
+    return archivadas
+
+def crear_tablas(cursor, particion=None):
+    """
+    Crea las tablas, índices, funciones y triggers que faltan.
+
+    Args:
+        cursor: Cursor de psycopg2 con una transacción abierta.
+        particion (str): "anio" o "trimestre" para particionar hired_employees (migrándola si
+            ya existe sin particionar), o None para crearla como una sola tabla.
+    """
+    # Crear tabla hired_employees
+    tipo = tipo_hired_employees(cursor)
+    if particion and tipo == "particionada":
+        print("hired_employees ya está particionada; se conserva su unidad de partición")
+    elif particion:
+        unidad = UNIDADES_PARTICION[particion]
+        if tipo == "simple":
+            particionar_hired_employees(cursor, unidad)
+        else:
+            crear_hired_employees_particionada(cursor)
+            crear_funcion_particiones(cursor, unidad)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS hired_employees (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR(255),
+                datetime TIMESTAMP,
+                department_id INTEGER,
+                job_id INTEGER
+            );
+        """)
+        if tipo != "particionada":
+            # Los cargadores la llaman siempre; sin particiones no hace nada
+            crear_funcion_particiones(cursor)
+
+    # Índices para los filtros por rango de fechas y los joins con las dimensiones
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hired_employees_datetime ON hired_employees (datetime);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hired_employees_department_id ON hired_employees (department_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hired_employees_job_id ON hired_employees (job_id);")
+
     # Crear tabla departments
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS departments (
@@ -34,10 +310,159 @@ def init_db():
         );
     """)
 
+    # Crear tabla con el avance de las cargas incrementales de cada archivo
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS load_manifest (
+            table_name VARCHAR(63) NOT NULL,
+            file_path TEXT NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            committed_offset BIGINT NOT NULL,
+            committed_rows BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, file_path)
+        );
+    """)
+
+    # Crear tabla resumen de contrataciones por año, trimestre, departamento y trabajo
+    cursor.execute("SELECT to_regclass('hired_employees_rollup') IS NULL;")
+    rollup_nuevo = cursor.fetchone()[0]
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hired_employees_rollup (
+            year INTEGER NOT NULL,
+            quarter INTEGER NOT NULL,
+            department_id INTEGER,
+            job_id INTEGER,
+            hires BIGINT NOT NULL,
+            UNIQUE NULLS NOT DISTINCT (year, quarter, department_id, job_id)
+        );
+    """)
+
+    # Mantener el resumen con cada INSERT, UPDATE, DELETE y TRUNCATE sobre hired_employees;
+    # las tablas de transición solo contienen las filas realmente afectadas (no las
+    # descartadas por ON CONFLICT). PostgreSQL no admite tablas de transición en un trigger
+    # de varios eventos, así que la misma función se usa en un trigger por evento
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION acumular_hired_employees_rollup() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE hired_employees_rollup;
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE hired_employees_rollup AS r
+                SET hires = r.hires - q.hires
+                FROM (
+                    SELECT
+                        EXTRACT(YEAR FROM datetime)::INTEGER AS year,
+                        EXTRACT(QUARTER FROM datetime)::INTEGER AS quarter,
+                        department_id,
+                        job_id,
+                        COUNT(*) AS hires
+                    FROM anteriores
+                    WHERE datetime IS NOT NULL
+                    GROUP BY 1, 2, 3, 4
+                ) AS q
+                WHERE r.year = q.year AND r.quarter = q.quarter
+                  AND r.department_id IS NOT DISTINCT FROM q.department_id
+                  AND r.job_id IS NOT DISTINCT FROM q.job_id;
+                DELETE FROM hired_employees_rollup WHERE hires <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO hired_employees_rollup AS r (year, quarter, department_id, job_id, hires)
+                SELECT
+                    EXTRACT(YEAR FROM datetime)::INTEGER,
+                    EXTRACT(QUARTER FROM datetime)::INTEGER,
+                    department_id,
+                    job_id,
+                    COUNT(*)
+                FROM nuevos
+                WHERE datetime IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT (year, quarter, department_id, job_id)
+                DO UPDATE SET hires = r.hires + EXCLUDED.hires;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_rollup_insert
+        AFTER INSERT ON hired_employees
+        REFERENCING NEW TABLE AS nuevos
+        FOR EACH STATEMENT EXECUTE FUNCTION acumular_hired_employees_rollup();
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_rollup_update
+        AFTER UPDATE ON hired_employees
+        REFERENCING OLD TABLE AS anteriores NEW TABLE AS nuevos
+        FOR EACH STATEMENT EXECUTE FUNCTION acumular_hired_employees_rollup();
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_rollup_delete
+        AFTER DELETE ON hired_employees
+        REFERENCING OLD TABLE AS anteriores
+        FOR EACH STATEMENT EXECUTE FUNCTION acumular_hired_employees_rollup();
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE TRIGGER hired_employees_rollup_truncate
+        AFTER TRUNCATE ON hired_employees
+        FOR EACH STATEMENT EXECUTE FUNCTION acumular_hired_employees_rollup();
+    """)
+    if rollup_nuevo:
+        reconstruir_rollup(cursor)
+
+def init_db(particion=None):
+    conn = obtener_conexion()
+    if conn is None:
+        return
+
+    cursor = conn.cursor()
+    crear_tablas(cursor, particion)
     conn.commit()
     cursor.close()
-    conn.close()
+    devolver_conexion(conn)
     print("Tablas creadas correctamente")
 
+def reconstruir():
+    """Reconstruye la tabla resumen desde cero."""
+    conn = obtener_conexion()
+    if conn is None:
+        return
+
+    cursor = conn.cursor()
+    reconstruir_rollup(cursor)
+    conn.commit()
+    cursor.close()
+    devolver_conexion(conn)
+    print("Resumen de contrataciones reconstruido")
+
+def archivar(anio):
+    """Archiva las particiones de un año de hired_employees."""
+    conn = obtener_conexion()
+    if conn is None:
+        return
+
+    cursor = conn.cursor()
+    archivadas = archivar_anio(cursor, anio)
+    conn.commit()
+    cursor.close()
+    devolver_conexion(conn)
+    print(f"Particiones archivadas: {', '.join(archivadas) or 'ninguna'}")
+
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inicializa las tablas de la base de datos")
+    parser.add_argument("--reconstruir-rollup", action="store_true", help="Recalcula hired_employees_rollup")
+    parser.add_argument(
+        "--particionar", choices=sorted(UNIDADES_PARTICION),
+        help="Particiona hired_employees por año o trimestre (migra la tabla si ya existe)"
+    )
+    parser.add_argument("--archivar-anio", type=int, help="Desvincula las particiones de un año")
+    args = parser.parse_args()
+    if args.reconstruir_rollup:
+        reconstruir()
+    elif args.archivar_anio is not None:
+        archivar(args.archivar_anio)
+    else:
+        init_db(args.particionar)
+    cerrar_pool()
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from cache import cache_respuestas
+from replica import enrutador_lecturas
+
+# Segundos tras los cuales se buscan filas nuevas aunque este proceso no haya escrito
+TTL_SEG = float(os.getenv("INSTANTANEA_TTL_SEG", "60"))
+# Valor con el que viajan los department_id y job_id nulos (fuera del rango de MAX_ENTERO)
+NULO = np.iinfo(np.int32).min
+# Bytes de COPY que se acumulan antes de convertirlos a arreglos
+TAMANO_BLOQUE = 8 << 20
+
+# Una fila de COPY binario con tres campos no nulos: cantidad de campos y, por campo, largo y valor
+FILA_COPY = np.dtype([
+    ("campos", ">i2"),
+    ("largo_fecha", ">i4"), ("fecha", ">i8"),
+    ("largo_departamento", ">i4"), ("departamento", ">i4"),
+    ("largo_trabajo", ">i4"), ("trabajo", ">i4"),
+])
+ENCABEZADO_COPY = 19
+EPOCA = datetime(1970, 1, 1)
+
+CONSULTA = f"""
+    SELECT
+        (EXTRACT(EPOCH FROM datetime) * 1000000)::BIGINT,
+        COALESCE(department_id, {NULO}),
+        COALESCE(job_id, {NULO})
+    FROM hired_employees
+    WHERE datetime IS NOT NULL
+"""
+# Filas cuyo xmin no era visible en la instantánea anterior, es decir, confirmadas después.
+# xmin es un xid de 32 bits; se completa con la época del xmax actual para compararlo como xid8.
+CONSULTA_NUEVAS = CONSULTA + """
+    AND NOT pg_visible_in_snapshot(
+        (((SELECT pg_snapshot_xmax(pg_current_snapshot())::TEXT::BIGINT >> 32)
+          - CASE WHEN xmin::TEXT::BIGINT > (SELECT pg_snapshot_xmax(pg_current_snapshot())::TEXT::BIGINT & 4294967295)
+                 THEN 1 ELSE 0 END) << 32 | xmin::TEXT::BIGINT)::TEXT::xid8,
+        $1::TEXT::pg_snapshot
+    )
+"""
+
+def microsegundos(fecha):
+    """Convierte un datetime sin zona horaria a microsegundos desde 1970."""
+    return (fecha - EPOCA) // timedelta(microseconds=1)
+
+class LectorCopyBinario:
+    """
+    Recibe los bloques de un COPY ... TO STDOUT (FORMAT binary) y los convierte a arreglos.
+
+    Todas las filas miden lo mismo, así que cada tramo completo se interpreta de una vez con
+    np.frombuffer en lugar de decodificar fila por fila.
+    """
+
+    def __init__(self):
+        self._pendiente = bytearray()
+        self._encabezado = False
+        self.partes = []
+
+    def _convertir(self, final=False):
+        if not self._encabezado:
+            if len(self._pendiente) < ENCABEZADO_COPY:
+                return
+            del self._pendiente[:ENCABEZADO_COPY]
+            self._encabezado = True
+        # El COPY termina con un campo -1 de dos bytes
+        disponibles = len(self._pendiente) - (2 if final else 0)
+        filas = disponibles // FILA_COPY.itemsize
+        if filas:
+            largo = filas * FILA_COPY.itemsize
+            tramo = np.frombuffer(bytes(self._pendiente[:largo]), dtype=FILA_COPY)
+            self.partes.append((
+                tramo["fecha"].astype(np.int64),
+                tramo["departamento"].astype(np.int32),
+                tramo["trabajo"].astype(np.int32),
+            ))
+            del self._pendiente[:largo]
+
+    async def __call__(self, bloque):
+        self._pendiente += bloque
+        if len(self._pendiente) >= TAMANO_BLOQUE:
+            self._convertir()
+
+    def arreglos(self):
+        """
+        Returns:
+            tuple: (fechas int64, department_id int32, job_id int32) con todas las filas recibidas.
+        """
+        self._convertir(final=True)
+        if not self.partes:
+            return np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int32)
+        return tuple(np.concatenate(columna) for columna in zip(*self.partes))
+
+class InstantaneaContrataciones:
+    """
+    Copia columnar en memoria de hired_employees para calcular las métricas con NumPy.
+
+    Guarda por cada empleado con fecha su timestamp (int64, microsegundos), el trimestre
+    (int8) y el par (department_id, job_id) codificado como índice int32 en la tabla de pares
+    distintos, ordenados por fecha para que un rango se resuelva con una búsqueda binaria y
+    las agrupaciones sean un np.bincount sobre ese índice, sin ordenar por consulta. Después
+    de una escritura en este proceso, o al vencer el TTL, solo se leen las filas confirmadas
+    desde la última lectura; si el total no coincide con la tabla resumen (por ejemplo,
+    porque se borraron filas) se vuelve a cargar completa.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._columnas = None
+        self._instantanea = None
+        self._version = None
+        self._leida_en = 0.0
+        # El candado se crea dentro del loop que lo usa (en Python 3.9 asyncio.Lock queda
+        # atado al loop actual al crearlo, y la instancia se crea al importar el módulo)
+        self._candado = None
+        self._candado_loop = None
+
+    @property
+    def filas(self):
+        return 0 if self._columnas is None else len(self._columnas[0])
+
+    def _vigente(self):
+        return (
+            self._columnas is not None
+            and self._version == cache_respuestas.version
+            and time.monotonic() - self._leida_en < self.ttl
+        )
+
+    async def _leer(self, conexion, consulta, *argumentos):
+        lector = LectorCopyBinario()
+        await conexion.copy_from_query(consulta, *argumentos, output=lector, format="binary")
+        return lector.arreglos()
+
+    @staticmethod
+    def _ordenar(fechas, departamentos, trabajos):
+        """Ordena por fecha y devuelve (fechas, trimestres de 0 a 3, pares departamento-trabajo en int64)."""
+        orden = np.argsort(fechas, kind="stable")
+        fechas = fechas[orden]
+        meses = fechas.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)
+        trimestres = (meses % 12 // 3).astype(np.int8)
+        pares = (departamentos[orden].astype(np.int64) << 32) | trabajos[orden].astype(np.int64) & 0xFFFFFFFF
+        return fechas, trimestres, pares
+
+    def _reemplazar(self, columnas):
+        fechas, trimestres, pares = self._ordenar(*columnas)
+        distintos, codigos = np.unique(pares, return_inverse=True)
+        # Se asignan juntas para que una consulta concurrente nunca vea columnas de lecturas distintas
+        self._columnas = (fechas, trimestres, codigos.astype(np.int32), distintos)
+
+    def _agregar(self, nuevas):
+        # Las filas nuevas se intercalan en su posición en lugar de reordenar toda la copia
+        fechas, trimestres, codigos, distintos = self._columnas
+        nuevas_fechas, nuevos_trimestres, nuevos_pares = self._ordenar(*nuevas)
+        todos = np.union1d(distintos, nuevos_pares)
+        if len(todos) != len(distintos):
+            codigos = np.searchsorted(todos, distintos).astype(np.int32)[codigos]
+        nuevos_codigos = np.searchsorted(todos, nuevos_pares).astype(np.int32)
+        posiciones = np.searchsorted(fechas, nuevas_fechas, side="right")
+        self._columnas = (
+            np.insert(fechas, posiciones, nuevas_fechas),
+            np.insert(trimestres, posiciones, nuevos_trimestres),
+            np.insert(codigos, posiciones, nuevos_codigos),
+            todos,
+        )
+
+    async def refrescar(self, lsn_cliente=None):
+        """
+        Lee las filas nuevas (o todas, la primera vez) y actualiza la copia.
+
+        Args:
+            lsn_cliente (str): Posición de WAL que la réplica debe haber aplicado para usarla.
+
+        Raises:
+            RuntimeError: Si no hay conexión con la base de datos.
+        """
+        version = cache_respuestas.version
+        # La réplica solo se usa si ya aplicó las escrituras de este proceso
+        conexion, destino = await enrutador_lecturas.obtener(lsn_cliente)
+        if conexion is None:
+            raise RuntimeError("Fallo al conectar con la base de datos")
+        try:
+            async with conexion.transaction(isolation="repeatable_read", readonly=True):
+                instantanea = await conexion.fetchval("SELECT pg_current_snapshot()::TEXT;")
+                total = await conexion.fetchval("SELECT COALESCE(SUM(hires), 0) FROM hired_employees_rollup;")
+                nuevas = None
+                if self._columnas is not None:
+                    nuevas = await self._leer(conexion, CONSULTA_NUEVAS, self._instantanea)
+                    if self.filas + len(nuevas[0]) != total:
+                        nuevas = None
+                columnas = await self._leer(conexion, CONSULTA) if nuevas is None else None
+        finally:
+            await enrutador_lecturas.devolver(conexion, destino)
+        if nuevas is not None:
+            self._agregar(nuevas)
+        else:
+            self._reemplazar(columnas)
+        self._instantanea = instantanea
+        self._version = version
+        self._leida_en = time.monotonic()
+
+    async def asegurar_async(self, lsn_cliente=None):
+        """
+        Refresca la copia si hubo escrituras en este proceso, venció el TTL o el cliente
+        escribió en otro proceso después de la última escritura conocida.
+
+        Args:
+            lsn_cliente (str): Posición de WAL de la última escritura del cliente, o None.
+        """
+        if self._vigente() and not enrutador_lecturas.cliente_adelantado(lsn_cliente):
+            return
+        loop = asyncio.get_running_loop()
+        if self._candado is None or self._candado_loop is not loop:
+            self._candado = asyncio.Lock()
+            self._candado_loop = loop
+        async with self._candado:
+            if not self._vigente() or enrutador_lecturas.cliente_adelantado(lsn_cliente):
+                await self.refrescar(lsn_cliente)
+
+    def _rango(self, desde, hasta):
+        fechas = self._columnas[0]
+        inicio = np.searchsorted(fechas, microsegundos(desde), side="left")
+        fin = np.searchsorted(fechas, microsegundos(hasta), side="left")
+        return self._columnas[1][inicio:fin], self._columnas[2][inicio:fin]
+
+    @staticmethod
+    def _ids(valores):
+        # tolist() convierte a int de Python de una vez; comparar escalares de NumPy es mucho más lento
+        return [None if valor == NULO else valor for valor in valores.tolist()]
+
+    def contrataciones_por_trimestre(self, desde, hasta):
+        """
+        Cuenta las contrataciones del rango [desde, hasta) por departamento, trabajo y trimestre.
+
+        Returns:
+            list: Tuplas (department_id, job_id, Q1, Q2, Q3, Q4) con None para los ids nulos,
+                como las filas de la consulta SQL.
+        """
+        trimestres, codigos = self._rango(desde, hasta)
+        distintos = self._columnas[3]
+        cuentas = np.bincount(codigos.astype(np.int64) * 4 + trimestres, minlength=len(distintos) * 4).reshape(-1, 4)
+        presentes = np.flatnonzero(cuentas.any(axis=1))
+        pares = distintos[presentes]
+        ids_departamento = self._ids((pares >> 32).astype(np.int32))
+        ids_trabajo = self._ids((pares & 0xFFFFFFFF).astype(np.uint32).astype(np.int32))
+        return [
+            (departamento, trabajo, *cuenta)
+            for departamento, trabajo, cuenta in zip(ids_departamento, ids_trabajo, cuentas[presentes].tolist())
+        ]
+
+    def contrataciones_por_departamento(self, desde, hasta):
+        """
+        Cuenta las contrataciones del rango [desde, hasta) por departamento.
+
+        Returns:
+            list: Tuplas (department_id, contratados) con None para los ids nulos.
+        """
+        _, codigos = self._rango(desde, hasta)
+        distintos = self._columnas[3]
+        por_par = np.bincount(codigos, minlength=len(distintos))
+        ids, grupo = np.unique((distintos >> 32).astype(np.int32), return_inverse=True)
+        cuentas = np.zeros(len(ids), dtype=np.int64)
+        np.add.at(cuentas, grupo, por_par)
+        presentes = np.flatnonzero(cuentas)
+        return list(zip(self._ids(ids[presentes]), cuentas[presentes].tolist()))
+
+instantanea_contrataciones = InstantaneaContrataciones(ttl=TTL_SEG)
@@ -0,0 +1,162 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+# Con METRICAS_HABILITADAS=false no se instala el middleware y las funciones de este módulo no hacen nada
+HABILITADAS = os.getenv("METRICAS_HABILITADAS", "true").lower() in ("1", "true", "si", "yes")
+
+# Buckets en segundos: de 1 ms a 10 s para solicitudes y consultas
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets en segundos para preparar y planificar sentencias: de 50 µs a 100 ms
+BUCKETS_PLANIFICACION = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+registro = CollectorRegistry(auto_describe=True)
+
+DURACION_SOLICITUDES = Histogram(
+    "http_request_duration_seconds", "Duración de las solicitudes HTTP por ruta",
+    ("method", "route", "status"), buckets=BUCKETS_LATENCIA, registry=registro,
+)
+# La ruta solo se conoce después del enrutamiento, así que las solicitudes en curso se cuentan por método
+SOLICITUDES_EN_CURSO = Gauge(
+    "http_requests_in_progress", "Solicitudes HTTP en curso",
+    ("method",), registry=registro,
+)
+DURACION_CONEXION = Histogram(
+    "db_connect_duration_seconds", "Tiempo de apertura de conexiones nuevas a PostgreSQL",
+    ("pool",), buckets=BUCKETS_LATENCIA, registry=registro,
+)
+DURACION_ADQUISICION = Histogram(
+    "db_pool_acquire_duration_seconds", "Espera para obtener una conexión del pool",
+    ("pool",), buckets=BUCKETS_LATENCIA, registry=registro,
+)
+DURACION_CONSULTA = Histogram(
+    "db_query_duration_seconds", "Duración de las consultas y COPY por nombre",
+    ("query",), buckets=BUCKETS_LATENCIA, registry=registro,
+)
+DURACION_PREPARACION = Histogram(
+    "db_statement_prepare_duration_seconds", "Tiempo de PREPARE de las sentencias registradas, una vez por conexión",
+    ("query",), buckets=BUCKETS_PLANIFICACION, registry=registro,
+)
+DURACION_PLANIFICACION = Histogram(
+    "db_query_planning_seconds", "Tiempo de planificación por ejecución de las sentencias registradas (muestreado)",
+    ("query",), buckets=BUCKETS_PLANIFICACION, registry=registro,
+)
+REINTENTOS_CONEXION = Counter(
+    "db_connect_retries", "Intentos de conexión después de un fallo",
+    ("pool",), registry=registro,
+)
+FALLOS_CONEXION = Counter(
+    "db_connect_failures", "Intentos de conexión fallidos",
+    ("pool",), registry=registro,
+)
+FILAS_INSERTADAS = Counter(
+    "ingest_rows_inserted", "Filas enviadas a la base de datos por tabla",
+    ("table",), registry=registro,
+)
+FILAS_RECHAZADAS = Counter(
+    "ingest_rows_rejected", "Filas rechazadas por tabla y motivo",
+    ("table", "reason"), registry=registro,
+)
+LECTURAS = Counter(
+    "db_reads", "Lecturas de los endpoints de consulta por destino y motivo",
+    ("target", "reason"), registry=registro,
+)
+
+def observar(histograma, segundos, **etiquetas):
+    """Registra una duración en un histograma si las métricas están habilitadas."""
+    if HABILITADAS:
+        histograma.labels(**etiquetas).observe(segundos)
+
+def incrementar(contador, cantidad=1, **etiquetas):
+    """Incrementa un contador si las métricas están habilitadas."""
+    if HABILITADAS and cantidad:
+        contador.labels(**etiquetas).inc(cantidad)
+
+@contextmanager
+def medir(histograma, **etiquetas):
+    """
+    Mide la duración del bloque y la registra en el histograma.
+
+    Args:
+        histograma (Histogram): Histograma destino.
+        **etiquetas: Valores de las etiquetas del histograma.
+    """
+    if not HABILITADAS:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.labels(**etiquetas).observe(time.perf_counter() - inicio)
+
+def registrar_carga(tabla, filas_insertadas, rechazos_por_motivo):
+    """
+    Suma a los contadores de ingesta el resultado de una carga.
+
+    Args:
+        tabla (str): Tabla destino.
+        filas_insertadas (int): Filas enviadas a la base de datos.
+        rechazos_por_motivo (dict): Filas rechazadas por código de motivo.
+    """
+    if not HABILITADAS:
+        return
+    incrementar(FILAS_INSERTADAS, filas_insertadas, table=tabla)
+    for motivo, cantidad in rechazos_por_motivo.items():
+        incrementar(FILAS_RECHAZADAS, cantidad, table=tabla, reason=motivo)
+
+def exportar():
+    """
+    Returns:
+        tuple: (texto en formato de exposición de Prometheus, tipo de contenido).
+    """
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que mide la duración y las solicitudes en curso de cada ruta.
+
+    La etiqueta de ruta es la plantilla declarada (por ejemplo /jobs/{trabajo_id}) y no la
+    URL recibida, para que el número de series no crezca con los ids; las solicitudes que
+    no coinciden con ninguna ruta se agrupan en "sin_ruta".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._rutas = None
+
+    def _ruta(self, scope):
+        if self._rutas is None:
+            # El router deja en el scope el endpoint que atendió la solicitud
+            self._rutas = {
+                ruta.endpoint: ruta.path
+                for ruta in scope["app"].routes
+                if hasattr(ruta, "endpoint")
+            }
+        return self._rutas.get(scope.get("endpoint"), "sin_ruta")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        en_curso = SOLICITUDES_EN_CURSO.labels(method=metodo)
+        en_curso.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            en_curso.dec()
+            DURACION_SOLICITUDES.labels(
+                method=metodo, route=self._ruta(scope), status=str(estado)
+            ).observe(time.perf_counter() - inicio)
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+# Directorio donde se guardan los archivos de filas rechazadas
+DIRECTORIO_RECHAZOS = os.getenv("RECHAZOS_DIRECTORIO", os.path.join(tempfile.gettempdir(), "rechazos"))
+# Antigüedad a partir de la cual se borran los archivos al crear uno nuevo
+RETENCION_SEG = float(os.getenv("RECHAZOS_RETENCION_HORAS", "168")) * 3600
+# Caracteres máximos que se guardan de un registro crudo
+MAX_LARGO_DATOS = 2000
+
+def linea_rechazo(fila, motivo, datos, detalle=None):
+    """
+    Serializa un rechazo como una línea NDJSON.
+
+    Args:
+        fila (int): Número de fila o registro (desde 1) dentro de la carga.
+        motivo (str): Código del motivo, por ejemplo "id_vacio" o "datetime_invalido".
+        datos: Fila cruda (lista de valores del CSV o texto del registro).
+        detalle (str): Mensaje de error original, si lo hay.
+
+    Returns:
+        str: Línea JSON terminada en salto de línea.
+    """
+    if isinstance(datos, (bytes, str)):
+        if isinstance(datos, bytes):
+            datos = datos.decode(errors="replace")
+        datos = datos[:MAX_LARGO_DATOS]
+    return json.dumps({"fila": fila, "motivo": motivo, "detalle": detalle, "datos": datos}, ensure_ascii=False) + "\n"
+
+def _ruta(rechazos_id, directorio=None):
+    # El id se valida para que no pueda usarse para leer otros archivos
+    if not re.fullmatch(r"[0-9a-f]{32}", rechazos_id):
+        return None
+    return os.path.join(directorio or DIRECTORIO_RECHAZOS, f"{rechazos_id}.ndjson")
+
+def _borrar_antiguos(directorio):
+    limite = time.time() - RETENCION_SEG
+    for nombre in os.listdir(directorio):
+        ruta = os.path.join(directorio, nombre)
+        try:
+            if nombre.endswith(".ndjson") and os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+class RegistroRechazos:
+    """
+    Registro de las filas rechazadas de una carga, escrito en disco a medida que ocurren.
+
+    Cada rechazo es una línea NDJSON con el número de fila, el código del motivo y la fila
+    cruda; en memoria solo se guardan los conteos por motivo. El archivo se crea con el
+    primer rechazo, así que una carga limpia no deja archivos.
+    """
+
+    def __init__(self, directorio=None):
+        self.id = uuid.uuid4().hex
+        self.directorio = directorio or DIRECTORIO_RECHAZOS
+        self.ruta = _ruta(self.id, self.directorio)
+        self.por_motivo = Counter()
+        self._archivo = None
+
+    def _abrir(self):
+        if self._archivo is None:
+            os.makedirs(self.directorio, exist_ok=True)
+            _borrar_antiguos(self.directorio)
+            self._archivo = open(self.ruta, "w", encoding="utf-8")
+        return self._archivo
+
+    @property
+    def total(self):
+        return sum(self.por_motivo.values())
+
+    def registrar(self, fila, motivo, datos, detalle=None):
+        """
+        Agrega un rechazo al archivo.
+
+        Args:
+            fila (int): Número de fila o registro (desde 1) dentro de la carga.
+            motivo (str): Código del motivo.
+            datos: Fila cruda.
+            detalle (str): Mensaje de error original, si lo hay.
+        """
+        self._abrir().write(linea_rechazo(fila, motivo, datos, detalle))
+        self.por_motivo[motivo] += 1
+
+    def agregar_parte(self, ruta_parte, filas_previas, por_motivo):
+        """
+        Copia al registro los rechazos de una parte escrita por otro proceso y borra la parte.
+
+        Args:
+            ruta_parte (str): Archivo NDJSON con números de fila locales a la parte.
+            filas_previas (int): Filas del archivo anteriores a la parte, para obtener los números globales.
+            por_motivo (dict): Conteos por motivo de la parte.
+        """
+        archivo = self._abrir()
+        with open(ruta_parte, encoding="utf-8") as parte:
+            for linea in parte:
+                rechazo = json.loads(linea)
+                rechazo["fila"] += filas_previas
+                archivo.write(json.dumps(rechazo, ensure_ascii=False) + "\n")
+        os.remove(ruta_parte)
+        self.por_motivo.update(por_motivo)
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Id del registro, total y conteos por motivo, y la URL para consultar las
+                filas rechazadas (None si no hubo rechazos).
+        """
+        return {
+            "id": self.id,
+            "total": self.total,
+            "por_motivo": dict(self.por_motivo),
+            "url": f"/rechazos/{self.id}" if self.total else None,
+        }
+
+def leer_rechazos(rechazos_id, cursor=0, limite=100, directorio=None):
+    """
+    Lee una página de rechazos guardados.
+
+    Args:
+        rechazos_id (str): Id del registro.
+        cursor (int): Posición en bytes desde la que leer (0 o el `siguiente` de la página anterior).
+        limite (int): Máximo de rechazos de la página.
+        directorio (str): Directorio de los archivos; por defecto RECHAZOS_DIRECTORIO.
+
+    Returns:
+        tuple: (lista de rechazos, cursor de la página siguiente o None si no hay más),
+            o None si el registro no existe.
+    """
+    ruta = _ruta(rechazos_id, directorio)
+    if ruta is None or not os.path.exists(ruta):
+        return None
+    rechazos = []
+    with open(ruta, "rb") as archivo:
+        archivo.seek(cursor)
+        # Un cursor que no cae al inicio de una línea se alinea a la siguiente
+        if cursor > 0:
+            archivo.seek(cursor - 1)
+            if archivo.read(1) != b"\n":
+                archivo.readline()
+        while len(rechazos) < limite:
+            linea = archivo.readline()
+            if not linea.endswith(b"\n"):
+                # Fin del archivo o línea aún en escritura
+                return rechazos, None
+            rechazos.append(json.loads(linea))
+        siguiente = archivo.tell()
+        return rechazos, siguiente if archivo.readline() else None
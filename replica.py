@@ -0,0 +1,241 @@
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from cache import cache_respuestas
+from db import obtener_conexion, devolver_conexion, replica_configurada
+from db_async import obtener_conexion_async, devolver_conexion_async
+from metricas import LECTURAS, incrementar
+
+# Retraso de replicación a partir del cual las lecturas vuelven a la primaria
+RETRASO_MAX_SEG = float(os.getenv("REPLICA_RETRASO_MAX_SEG", "5"))
+# Antigüedad máxima del retraso y la posición de la réplica antes de volver a consultarlos
+VERIFICAR_SEG = float(os.getenv("REPLICA_VERIFICAR_SEG", "1"))
+# Segundos sin intentar la réplica después de un fallo de conexión
+REINTENTO_SEG = float(os.getenv("REPLICA_REINTENTO_SEG", "10"))
+# Cookie con la posición de WAL de la última escritura del cliente
+COOKIE_LSN = "lsn_escritura"
+# Clave con la que se firma la cookie; con varios workers tiene que ser la misma en todos, o
+# cada uno ignora las cookies firmadas por los demás
+SECRETO_COOKIE = os.getenv("REPLICA_SECRETO_COOKIE") or secrets.token_hex(32)
+
+# Posición de inserción: incluye el commit recién hecho aunque synchronous_commit esté desactivado
+CONSULTA_POSICION = "SELECT pg_current_wal_insert_lsn()::TEXT;"
+# Posición de WAL aplicada y segundos de retraso. Sin WAL pendiente y con el receptor conectado
+# el retraso es 0 aunque la primaria lleve tiempo sin escribir; si el receptor está caído se
+# mide desde la última transacción aplicada. Apuntar la réplica a una primaria también funciona.
+CONSULTA_ESTADO = """
+    SELECT
+        CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END::TEXT,
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                 AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+        END::FLOAT8;
+"""
+
+def lsn_a_entero(lsn):
+    """
+    Convierte una posición de WAL ("16/B374D848") a entero para compararla. Acepta el valor
+    entre comillas, como queda en la cookie por contener "/".
+
+    Returns:
+        int: La posición, o 0 si el texto no es una posición válida.
+    """
+    try:
+        alto, bajo = lsn.strip('"').split("/")
+        return int(alto, 16) << 32 | int(bajo, 16)
+    except (AttributeError, ValueError):
+        return 0
+
+def _firma(lsn):
+    return hmac.new(SECRETO_COOKIE.encode(), lsn.encode(), hashlib.sha256).hexdigest()[:32]
+
+def cookie_lsn(lsn):
+    """
+    Firma una posición de WAL para enviarla en la cookie COOKIE_LSN.
+
+    Returns:
+        str: "posición.firma".
+    """
+    return f"{lsn}.{_firma(lsn)}"
+
+def lsn_de_cookie(valor):
+    """
+    Obtiene la posición de WAL de la cookie COOKIE_LSN si la firmó este servicio. Sin la
+    firma un cliente podría enviar una posición inventada para saltarse el cache de
+    respuestas y forzar recargas en cada lectura.
+
+    Args:
+        valor (str): Valor de la cookie, o None.
+
+    Returns:
+        str: La posición, o None si no hay cookie o la firma no es válida.
+    """
+    if not valor:
+        return None
+    lsn, _, firma = valor.strip('"').rpartition(".")
+    if not lsn or not hmac.compare_digest(firma, _firma(lsn)):
+        return None
+    return lsn
+
+class EnrutadorLecturas:
+    """
+    Reparte las lecturas de los endpoints de consulta entre la réplica y la primaria.
+
+    Una lectura va a la réplica si está configurada, respondió en el último intento, su
+    retraso no supera `retraso_max` y ya aplicó la posición de WAL pedida; en cualquier otro
+    caso va a la primaria. La posición pedida es la mayor entre la última escritura de este
+    proceso y la que envía el cliente, de modo que quien acaba de insertar lee sus datos.
+    El estado de la réplica se consulta como mucho cada `verificar_seg`, salvo que se pida
+    una posición más nueva que la última vista.
+    """
+
+    def __init__(self, retraso_max=5.0, verificar_seg=1.0, reintento_seg=10.0):
+        self.retraso_max = retraso_max
+        self.verificar_seg = verificar_seg
+        self.reintento_seg = reintento_seg
+        self._lsn_escrito = 0
+        self._lsn_escrito_texto = None
+        self._lsn_replica = 0
+        self._retraso = 0.0
+        self._verificada_en = None
+        self._no_antes_de = 0.0
+
+    @property
+    def lsn_escrito(self):
+        """Posición de WAL de la última escritura de este proceso, o None si no hubo."""
+        return self._lsn_escrito_texto
+
+    def _registrar(self, lsn):
+        if lsn_a_entero(lsn) > self._lsn_escrito:
+            self._lsn_escrito = lsn_a_entero(lsn)
+            self._lsn_escrito_texto = lsn
+        return lsn
+
+    def registrar_escritura(self, conexion=None):
+        """
+        Guarda la posición de WAL de la primaria después de un commit.
+
+        Se llama antes de invalidar el cache de respuestas para que ninguna lectura
+        posterior a la invalidación se resuelva con una réplica atrasada.
+
+        Args:
+            conexion: Conexión de psycopg2 con la que se escribió, o None para tomar una del pool.
+
+        Returns:
+            str: La posición registrada, o None si no hay réplica configurada.
+        """
+        if not replica_configurada():
+            return None
+        propia = conexion is None
+        if propia:
+            conexion = obtener_conexion()
+            if conexion is None:
+                # Sin la posición no se puede esperar a la réplica: se lee de la primaria un tiempo
+                self._no_antes_de = time.monotonic() + self.reintento_seg
+                return None
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(CONSULTA_POSICION)
+                lsn = cursor.fetchone()[0]
+            conexion.rollback()
+        except Exception as e:
+            # La escritura ya está confirmada; solo se pierde la posición
+            print(f"No se pudo leer la posición de WAL: {e}")
+            self._no_antes_de = time.monotonic() + self.reintento_seg
+            return None
+        finally:
+            if propia:
+                devolver_conexion(conexion)
+        return self._registrar(lsn)
+
+    async def registrar_escritura_async(self, conexion):
+        """
+        Versión de registrar_escritura() para una conexión de asyncpg.
+
+        Returns:
+            str: La posición registrada, o None si no hay réplica configurada.
+        """
+        if not replica_configurada():
+            return None
+        try:
+            lsn = await conexion.fetchval(CONSULTA_POSICION)
+        except Exception as e:
+            print(f"No se pudo leer la posición de WAL: {e}")
+            self._no_antes_de = time.monotonic() + self.reintento_seg
+            return None
+        return self._registrar(lsn)
+
+    def _reciente(self):
+        return self._verificada_en is not None and time.monotonic() - self._verificada_en < self.verificar_seg
+
+    async def _conexion_replica(self, lsn_minimo):
+        """Devuelve (conexión a la réplica o None, motivo para usar la primaria)."""
+        if self._reciente() and self._retraso > self.retraso_max:
+            return None, "retraso"
+        conexion = await obtener_conexion_async("replica")
+        if conexion is None:
+            self._no_antes_de = time.monotonic() + self.reintento_seg
+            return None, "replica_caida"
+        try:
+            if not self._reciente() or self._lsn_replica < lsn_minimo:
+                lsn, retraso = await conexion.fetchrow(CONSULTA_ESTADO)
+                self._lsn_replica = lsn_a_entero(lsn)
+                self._retraso = retraso
+                self._verificada_en = time.monotonic()
+        except Exception as e:
+            print(f"Error al consultar la réplica: {e}")
+            await devolver_conexion_async(conexion, "replica")
+            self._no_antes_de = time.monotonic() + self.reintento_seg
+            return None, "replica_caida"
+        if self._retraso > self.retraso_max:
+            motivo = "retraso"
+        elif self._lsn_replica < lsn_minimo:
+            motivo = "lectura_propia"
+        else:
+            return conexion, None
+        await devolver_conexion_async(conexion, "replica")
+        return None, motivo
+
+    async def obtener(self, lsn_cliente=None):
+        """
+        Obtiene una conexión para una lectura.
+
+        Args:
+            lsn_cliente (str): Posición de WAL de la última escritura del cliente (cookie), o None.
+
+        Returns:
+            tuple: (conexión o None si no hay base disponible, destino "replica" o "primaria").
+        """
+        motivo = "sin_replica"
+        if replica_configurada():
+            motivo = "replica_caida"
+            if time.monotonic() >= self._no_antes_de:
+                conexion, motivo = await self._conexion_replica(max(self._lsn_escrito, lsn_a_entero(lsn_cliente)))
+                if conexion is not None:
+                    if self.cliente_adelantado(lsn_cliente):
+                        # La réplica ya aplicó una escritura de otro proceso, así que la posición es
+                        # real: se adopta y se invalida el cache para el resto de los clientes
+                        self._registrar(lsn_cliente)
+                        cache_respuestas.incrementar_version()
+                    incrementar(LECTURAS, target="replica", reason="replica")
+                    return conexion, "replica"
+        incrementar(LECTURAS, target="primaria", reason=motivo)
+        return await obtener_conexion_async(), "primaria"
+
+    async def devolver(self, conexion, destino):
+        """Devuelve una conexión obtenida con obtener() a su pool."""
+        await devolver_conexion_async(conexion, destino)
+
+    def cliente_adelantado(self, lsn_cliente):
+        """
+        Returns:
+            bool: Si el cliente escribió después de la última escritura que conoce este proceso
+                (por ejemplo, en otro worker), en cuyo caso el cache de respuestas puede estar viejo.
+        """
+        return replica_configurada() and lsn_a_entero(lsn_cliente) > self._lsn_escrito
+
+enrutador_lecturas = EnrutadorLecturas(RETRASO_MAX_SEG, VERIFICAR_SEG, REINTENTO_SEG)
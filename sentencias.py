@@ -0,0 +1,154 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from metricas import DURACION_PLANIFICACION, DURACION_PREPARACION, HABILITADAS, observar
+
+# Fracción de las ejecuciones en las que además se mide la planificación con EXPLAIN
+MUESTREO_PLAN = float(os.getenv("SENTENCIAS_MUESTREO_PLAN", "0.01"))
+
+class Sentencia:
+    """
+    Sentencia SQL con nombre y parámetros tipados ($1, $2, ...).
+
+    Args:
+        nombre (str): Nombre con el que se prepara en el servidor.
+        tipos (tuple): Tipos de PostgreSQL de los parámetros, en orden.
+        sql (str): Texto de la sentencia con marcadores posicionales.
+    """
+
+    def __init__(self, nombre, tipos, sql):
+        self.nombre = nombre
+        self.tipos = tuple(tipos)
+        self.sql = sql
+        # Cada marcador convertido a su tipo, para preparar con asyncpg
+        self.sql_tipado = re.sub(r"\$(\d+)", lambda m: f"{m.group(0)}::{self.tipos[int(m.group(1)) - 1]}", sql)
+
+    def preparar(self):
+        """SQL de PREPARE para psycopg2, con los tipos declarados."""
+        return f"PREPARE {self.nombre} ({', '.join(self.tipos)}) AS {self.sql}"
+
+    def ejecutar(self):
+        """SQL de EXECUTE para psycopg2, con un marcador %s por parámetro."""
+        return f"EXECUTE {self.nombre} ({', '.join(['%s'] * len(self.tipos))})"
+
+    def ejecutar_con_literales(self, parametros):
+        """
+        SQL de EXECUTE con los valores como literales, para EXPLAIN desde asyncpg, que no
+        admite parámetros en EXPLAIN EXECUTE. PostgreSQL convierte cada literal al tipo declarado.
+        """
+        return f"EXECUTE {self.nombre} ({', '.join(map(_literal, parametros))})"
+
+def _literal(valor):
+    if valor is None:
+        return "NULL"
+    return "'" + str(valor).replace("'", "''") + "'"
+
+_registro = {}
+
+def registrar_sentencia(nombre, tipos, sql):
+    """
+    Agrega una sentencia al registro central.
+
+    Args:
+        nombre (str): Nombre único de la sentencia.
+        tipos (tuple): Tipos de los parámetros.
+        sql (str): Texto con marcadores $1, $2, ...
+
+    Returns:
+        Sentencia: La sentencia registrada.
+
+    Raises:
+        ValueError: Si el nombre ya está registrado con otro texto o tipos.
+    """
+    sentencia = Sentencia(nombre, tipos, sql)
+    existente = _registro.get(nombre)
+    if existente is not None:
+        if (existente.tipos, existente.sql) != (sentencia.tipos, sentencia.sql):
+            raise ValueError(f"La sentencia {nombre} ya está registrada con otro SQL")
+        return existente
+    _registro[nombre] = sentencia
+    return sentencia
+
+def sentencias_registradas():
+    """
+    Returns:
+        dict: Sentencias del registro por nombre.
+    """
+    return dict(_registro)
+
+def _muestrear():
+    return HABILITADAS and MUESTREO_PLAN > 0 and random.random() < MUESTREO_PLAN
+
+def _tiempo_de_planificacion(plan):
+    # EXPLAIN (FORMAT JSON, SUMMARY) devuelve una lista con un objeto; el tiempo está en ms
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Planning Time"] / 1000
+
+# Sentencias ya preparadas en cada conexión de psycopg2; PREPARE dura lo que la sesión
+_preparadas = weakref.WeakKeyDictionary()
+_candado = threading.Lock()
+
+def ejecutar(cursor, nombre, parametros):
+    """
+    Ejecuta una sentencia registrada con psycopg2, preparándola la primera vez en esa conexión.
+
+    Args:
+        cursor: Cursor de psycopg2.
+        nombre (str): Nombre de la sentencia.
+        parametros (tuple): Valores de los parámetros.
+
+    Raises:
+        KeyError: Si la sentencia no está registrada.
+    """
+    sentencia = _registro[nombre]
+    with _candado:
+        preparadas = _preparadas.setdefault(cursor.connection, set())
+    if nombre not in preparadas:
+        inicio = time.perf_counter()
+        cursor.execute(sentencia.preparar())
+        observar(DURACION_PREPARACION, time.perf_counter() - inicio, query=nombre)
+        # Las sentencias preparadas no se deshacen con un rollback
+        preparadas.add(nombre)
+    if _muestrear():
+        cursor.execute("EXPLAIN (FORMAT JSON, SUMMARY) " + sentencia.ejecutar(), parametros)
+        observar(DURACION_PLANIFICACION, _tiempo_de_planificacion(cursor.fetchone()[0]), query=nombre)
+    cursor.execute(sentencia.ejecutar(), parametros)
+
+CONSULTA_PREPARADA = "SELECT EXISTS (SELECT 1 FROM pg_prepared_statements WHERE name = $1)"
+
+async def consultar_async(conexion, nombre, *parametros):
+    """
+    Ejecuta una sentencia registrada con asyncpg y devuelve sus filas.
+
+    asyncpg prepara cada texto distinto la primera vez que lo ve una conexión y lo guarda en
+    su cache de sentencias (statement_cache_size, 100 por defecto), que sobrevive a las
+    devoluciones al pool; como el registro siempre envía el mismo sql_tipado, cada conexión
+    prepara la sentencia una vez y después solo envía los parámetros.
+
+    Las sentencias del cache de asyncpg tienen nombres internos, así que en las ejecuciones
+    muestreadas la planificación se mide como en ejecutar(): con EXPLAIN EXECUTE de la
+    sentencia preparada con su nombre del registro en esa conexión.
+
+    Args:
+        conexion: Conexión del pool asíncrono.
+        nombre (str): Nombre de la sentencia.
+        *parametros: Valores de los parámetros.
+
+    Returns:
+        list: Filas de la consulta.
+    """
+    sentencia = _registro[nombre]
+    if _muestrear():
+        # Solo las ejecuciones muestreadas consultan si ya se preparó en esta conexión
+        if not await conexion.fetchval(CONSULTA_PREPARADA, nombre):
+            inicio = time.perf_counter()
+            await conexion.execute(sentencia.preparar())
+            observar(DURACION_PREPARACION, time.perf_counter() - inicio, query=nombre)
+        plan = await conexion.fetchval("EXPLAIN (FORMAT JSON, SUMMARY) " + sentencia.ejecutar_con_literales(parametros))
+        observar(DURACION_PLANIFICACION, _tiempo_de_planificacion(plan), query=nombre)
+    return await conexion.fetch(sentencia.sql_tipado, *parametros)
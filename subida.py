@@ -0,0 +1,243 @@
+import codecs
+import os
+import re
+import zlib
+from carga_masiva import fin_de_registros
+
+# Tamaño máximo de un CSV subido, antes y después de descomprimirlo
+SUBIDA_MAX_BYTES = int(float(os.getenv("SUBIDA_MAX_MB", "1024")) * 2**20)
+# Campo del formulario multipart con el archivo
+CAMPO_ARCHIVO = "archivo"
+# Bytes máximos que produce cada paso de la descompresión, para que un bloque muy comprimido
+# no se expanda de una vez en memoria
+BLOQUE_DESCOMPRESION = 1 << 20
+# Tamaño máximo de los encabezados de una parte
+MAX_ENCABEZADOS = 16 << 10
+# Texto máximo sin un fin de registro; más que eso es una comilla sin cerrar
+MAX_REGISTRO = 1 << 20
+MAGIA_GZIP = b"\x1f\x8b"
+
+class SubidaInvalida(ValueError):
+    """El cuerpo no es un formulario multipart válido o el archivo no se puede leer."""
+
+class SubidaDemasiadoGrande(ValueError):
+    """El cuerpo o el CSV descomprimido superan el tamaño máximo."""
+
+def boundary_de(content_type):
+    """
+    Obtiene el delimitador de una cabecera Content-Type multipart/form-data.
+
+    Returns:
+        bytes: El delimitador, o None si el tipo no es multipart/form-data o no lo indica.
+    """
+    if not content_type or content_type.split(";")[0].strip().lower() != "multipart/form-data":
+        return None
+    coincidencia = re.search(r'boundary="?([^";]+)"?', content_type, re.IGNORECASE)
+    return coincidencia.group(1).encode("latin-1") if coincidencia else None
+
+def _parametros_disposicion(encabezados):
+    # Content-Disposition: form-data; name="archivo"; filename="datos.csv"
+    return dict(re.findall(r'(\w+)="([^"]*)"', encabezados.get("content-disposition", "")))
+
+class LectorMultipart:
+    """
+    Separa un cuerpo multipart/form-data a medida que llega y entrega el contenido del
+    campo CAMPO_ARCHIVO; el resto de las partes se descarta.
+
+    Solo se retiene lo necesario para reconocer un delimitador partido entre dos bloques,
+    así que la memoria no depende del tamaño del archivo.
+
+    Args:
+        boundary (bytes): Delimitador de la cabecera Content-Type.
+    """
+
+    def __init__(self, boundary):
+        self._delimitador = b"\r\n--" + boundary
+        self._pendiente = bytearray(b"\r\n")  # el primer delimitador no lleva salto de línea antes
+        self._estado = "preambulo"
+        self._en_archivo = False
+        self.encontrado = False
+        self.nombre_archivo = None
+
+    def alimentar(self, bloque):
+        """
+        Args:
+            bloque (bytes): Siguiente bloque del cuerpo.
+
+        Returns:
+            list: Bloques de bytes del archivo contenidos en lo recibido hasta ahora.
+
+        Raises:
+            SubidaInvalida: Si los encabezados de una parte son inválidos o demasiado largos.
+        """
+        self._pendiente += bloque
+        datos = []
+        while True:
+            if self._estado in ("preambulo", "cuerpo"):
+                posicion = self._pendiente.find(self._delimitador)
+                if posicion < 0:
+                    # Se guarda la cola por si el delimitador quedó partido entre bloques
+                    seguros = len(self._pendiente) - len(self._delimitador) + 1
+                    if seguros > 0:
+                        if self._en_archivo:
+                            datos.append(bytes(self._pendiente[:seguros]))
+                        del self._pendiente[:seguros]
+                    return datos
+                if self._en_archivo and posicion:
+                    datos.append(bytes(self._pendiente[:posicion]))
+                del self._pendiente[:posicion + len(self._delimitador)]
+                self._en_archivo = False
+                self._estado = "delimitador"
+            elif self._estado == "delimitador":
+                if len(self._pendiente) < 2:
+                    return datos
+                if self._pendiente[:2] == b"--":
+                    self._estado = "fin"
+                    continue
+                fin_linea = self._pendiente.find(b"\r\n")
+                if fin_linea < 0:
+                    return datos
+                # Después del delimitador solo puede haber espacios antes del salto de línea
+                del self._pendiente[:fin_linea + 2]
+                self._estado = "encabezados"
+            elif self._estado == "encabezados":
+                fin = self._pendiente.find(b"\r\n\r\n")
+                if fin < 0:
+                    if len(self._pendiente) > MAX_ENCABEZADOS:
+                        raise SubidaInvalida("Encabezados de la parte demasiado largos")
+                    return datos
+                self._abrir_parte(bytes(self._pendiente[:fin]))
+                del self._pendiente[:fin + 4]
+                self._estado = "cuerpo"
+            else:
+                # Epílogo después del delimitador final
+                self._pendiente.clear()
+                return datos
+
+    def _abrir_parte(self, crudos):
+        encabezados = {}
+        for linea in crudos.decode("latin-1").split("\r\n"):
+            nombre, separador, valor = linea.partition(":")
+            if not separador:
+                raise SubidaInvalida(f"Encabezado de parte inválido: {linea[:100]}")
+            encabezados[nombre.strip().lower()] = valor.strip()
+        parametros = _parametros_disposicion(encabezados)
+        if parametros.get("name") == CAMPO_ARCHIVO and not self.encontrado:
+            self._en_archivo = True
+            self.encontrado = True
+            self.nombre_archivo = parametros.get("filename")
+
+    def terminar(self):
+        """
+        Raises:
+            SubidaInvalida: Si el cuerpo terminó antes del delimitador final o sin el campo del archivo.
+        """
+        if self._estado != "fin":
+            raise SubidaInvalida("El cuerpo multipart terminó antes del delimitador final")
+        if not self.encontrado:
+            raise SubidaInvalida(f"Falta el campo '{CAMPO_ARCHIVO}' con el CSV")
+
+class LectorCsvSubido:
+    """
+    Convierte los bytes del archivo subido en texto CSV con registros completos.
+
+    Si el archivo empieza con la firma de gzip se descomprime por pasos (admite varios
+    miembros concatenados, como los que produce pigz). El texto se decodifica como UTF-8 y
+    solo se entrega hasta el final del último registro completo, para que csv.reader nunca
+    vea un registro partido entre dos bloques.
+
+    Args:
+        max_bytes (int): Tamaño máximo del CSV descomprimido.
+    """
+
+    def __init__(self, max_bytes=SUBIDA_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.comprimido = None
+        self.bytes_csv = 0
+        self._inicio = b""
+        self._gzip = None
+        self._decodificador = codecs.getincrementaldecoder("utf-8")()
+        self._texto = ""
+
+    def _descomprimir(self, datos):
+        while True:
+            if self._gzip is None or self._gzip.eof:
+                if not datos:
+                    return
+                self._gzip = zlib.decompressobj(wbits=31)
+            try:
+                salida = self._gzip.decompress(datos, BLOQUE_DESCOMPRESION)
+            except zlib.error as e:
+                raise SubidaInvalida(f"Archivo gzip inválido: {e}")
+            # Al terminar un miembro, lo que sigue puede ser otro miembro concatenado
+            datos = self._gzip.unused_data if self._gzip.eof else self._gzip.unconsumed_tail
+            if salida:
+                yield salida
+            # Con la salida llena puede quedar texto pendiente dentro de zlib aunque no haya más entrada
+            if not datos and len(salida) < BLOQUE_DESCOMPRESION:
+                return
+
+    def _texto_completo(self, crudos):
+        self.bytes_csv += len(crudos)
+        if self.bytes_csv > self.max_bytes:
+            raise SubidaDemasiadoGrande(f"El CSV supera el máximo de {self.max_bytes} bytes")
+        try:
+            self._texto += self._decodificador.decode(crudos)
+        except UnicodeDecodeError as e:
+            raise SubidaInvalida(f"El CSV no está en UTF-8: {e}")
+        corte = fin_de_registros(self._texto)
+        completo, self._texto = self._texto[:corte], self._texto[corte:]
+        if len(self._texto) > MAX_REGISTRO:
+            raise SubidaInvalida(f"Registro de más de {MAX_REGISTRO} caracteres o comillas sin cerrar")
+        return completo
+
+    def alimentar(self, datos):
+        """
+        Genera el texto de un bloque por pasos: con gzip, un texto por cada paso de
+        descompresión (a lo sumo BLOQUE_DESCOMPRESION bytes), así que quien consume cada texto
+        antes de pedir el siguiente nunca tiene en memoria más que un paso.
+
+        Args:
+            datos (bytes): Siguiente bloque del archivo.
+
+        Yields:
+            str: Textos con registros CSV completos.
+
+        Raises:
+            SubidaDemasiadoGrande: Si el CSV descomprimido supera `max_bytes`.
+            SubidaInvalida: Si el gzip está dañado o el texto no es UTF-8.
+        """
+        if self.comprimido is None:
+            # Se espera a tener los dos bytes de la firma antes de decidir
+            self._inicio += datos
+            if len(self._inicio) < len(MAGIA_GZIP):
+                return
+            datos, self._inicio = self._inicio, b""
+            self.comprimido = datos.startswith(MAGIA_GZIP)
+        if not self.comprimido:
+            yield self._texto_completo(datos)
+            return
+        for salida in self._descomprimir(datos):
+            yield self._texto_completo(salida)
+
+    def terminar(self):
+        """
+        Returns:
+            str: El texto restante después del último bloque.
+
+        Raises:
+            SubidaInvalida: Si el gzip está truncado o el texto termina a mitad de un carácter.
+        """
+        textos = []
+        if self.comprimido is None and self._inicio:
+            self.comprimido = False
+            textos.append(self._texto_completo(self._inicio))
+        if self.comprimido and (self._gzip is None or not self._gzip.eof):
+            raise SubidaInvalida("El archivo gzip está incompleto")
+        try:
+            self._texto += self._decodificador.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            raise SubidaInvalida(f"El CSV no está en UTF-8: {e}")
+        textos.append(self._texto)
+        self._texto = ""
+        return "".join(textos)
@@ -3,15 +3,71 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import time
+import psycopg2
+import pytest
 from fastapi.testclient import TestClient
+import app as modulo_app
 from app import app
+from cache import cache_respuestas
+from db import parametros_conexion
+from dimensiones import cache_dimensiones
 
 cliente = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def ciclo_de_vida():
+    # Ejecuta el lifespan de la app para que los pools se creen una sola vez
+    with cliente:
+        yield
+
+def esperar_trabajo(respuesta, limite=60):
+    # Consulta el trabajo encolado por /cargar-csv hasta que termina
+    assert respuesta.status_code == 202
+    url = respuesta.json()["url"]
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        estado = cliente.get(url).json()
+        if estado["estado"] in ("completado", "fallido"):
+            return estado
+        time.sleep(0.05)
+    raise AssertionError(f"El trabajo {url} no terminó a tiempo")
+
 def test_cargar_csv():
-    respuesta = cliente.post("/cargar-csv/departments")
-    assert respuesta.status_code == 200
-    assert respuesta.json()["mensaje"].startswith("Datos de departments.csv cargados")
+    estado = esperar_trabajo(cliente.post("/cargar-csv/departments"))
+    assert estado["estado"] == "completado"
+    assert estado["resultado"]["mensaje"].startswith("Datos de departments.csv cargados")
+    assert "filas_por_segundo" in estado["resultado"]
+    assert estado["filas_procesadas"] > 0
+
+def test_cargar_csv_modo_fila():
+    estado = esperar_trabajo(cliente.post("/cargar-csv/jobs", params={"modo": "fila"}))
+    assert estado["resultado"]["mensaje"].startswith("Datos de jobs.csv cargados")
+
+def test_cargar_csv_con_validacion():
+    estado = esperar_trabajo(cliente.post("/cargar-csv/hired_employees", params={"validar": True}))
+    assert "validacion" in estado["resultado"]
+    assert estado["filas_rechazadas"] == sum(estado["resultado"]["validacion"]["problemas"].values())
+
+def test_cargar_csv_modo_paralelo():
+    estado = esperar_trabajo(cliente.post("/cargar-csv/hired_employees", params={"modo": "paralelo", "procesos": 2}))
+    assert estado["resultado"]["mensaje"].startswith("Datos de hired_employees.csv cargados: 1999 filas insertadas")
+    assert estado["resultado"]["procesos"] == 2
+    assert estado["progreso"] == 1
+
+def test_cargar_csv_modo_incremental():
+    esperar_trabajo(cliente.post("/cargar-csv/jobs", params={"modo": "incremental"}))
+    estado = esperar_trabajo(cliente.post("/cargar-csv/jobs", params={"modo": "incremental"}))
+    assert estado["resultado"]["estado"] == "sin_cambios"
+    assert estado["resultado"]["lotes"] == 0 and estado["resultado"]["bytes_pendientes"] == 0
+
+def test_cargar_csv_sin_archivo(monkeypatch, tmp_path):
+    # Las rutas de los CSV son relativas al directorio de trabajo
+    monkeypatch.chdir(tmp_path)
+    assert cliente.post("/cargar-csv/jobs").status_code == 404
+
+def test_trabajo_inexistente():
+    assert cliente.get("/jobs/no-existe").status_code == 404
 
 def test_insertar_lote():
     datos = [
@@ -28,18 +84,145 @@ def test_insertar_lote():
             "datetime": "",
             "department_id": "",
             "job_id": ""
+        },
+        {
+            "id": 5006,
+            "name": "Departamento Inexistente",
+            "datetime": "2021-08-01T10:00:00Z",
+            "department_id": 999999,
+            "job_id": 1
         }
     ]
     respuesta = cliente.post("/insertar-lote", json=datos)
     assert respuesta.status_code == 200
     assert respuesta.json()["mensaje"].startswith("2 empleados insertados")
+    assert respuesta.json()["rechazos"]["por_motivo"] == {"department_id_inexistente": 1}
+
+def test_departamento_nuevo_recarga_la_cache(monkeypatch):
+    # Un departamento creado fuera de la API se acepta sin esperar al TTL de la caché
+    monkeypatch.setattr(cache_dimensiones, "espera_falta", 0)
+
+    def recarga_sincronica():
+        raise AssertionError("La ruta async no debe recargar con el pool sincrónico")
+
+    monkeypatch.setattr(cache_dimensiones, "recargar", recarga_sincronica)
+    conexion = psycopg2.connect(**parametros_conexion())
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("INSERT INTO departments (id, department) VALUES (990001, 'Creado aparte') ON CONFLICT DO NOTHING;")
+        conexion.commit()
+        respuesta = cliente.post("/insertar-lote", json=[{
+            "id": 5007, "name": "Recarga", "datetime": "2021-08-01T10:00:00Z", "department_id": 990001, "job_id": 1,
+        }])
+        assert respuesta.status_code == 200
+        assert respuesta.json()["rechazos"]["por_motivo"] == {}
+    finally:
+        with conexion.cursor() as cursor:
+            cursor.execute("DELETE FROM hired_employees WHERE id = 5007;")
+            cursor.execute("DELETE FROM departments WHERE id = 990001;")
+        conexion.commit()
+        conexion.close()
+        cache_dimensiones.invalidar()
+        cache_respuestas.incrementar_version()
 
 def test_contrataciones_por_trimestre():
     respuesta = cliente.get("/contrataciones-por-trimestre")
     assert respuesta.status_code == 200
     assert isinstance(respuesta.json(), list)
 
+def test_contrataciones_por_trimestre_rango():
+    por_anio = cliente.get("/contrataciones-por-trimestre", params={"year": 2021})
+    por_rango = cliente.get(
+        "/contrataciones-por-trimestre",
+        params={"from": "2021-01-01T00:00:00", "to": "2022-01-01T00:00:00"}
+    )
+    assert por_anio.status_code == 200
+    assert por_anio.json() == por_rango.json()
+    assert cliente.get("/contrataciones-por-trimestre", params={"year": 2021, "from": "2021-01-01T00:00:00"}).status_code == 400
+
+def test_contrataciones_por_trimestre_etag():
+    respuesta = cliente.get("/contrataciones-por-trimestre")
+    etag = respuesta.headers["ETag"]
+    no_modificada = cliente.get("/contrataciones-por-trimestre", headers={"If-None-Match": etag})
+    assert no_modificada.status_code == 304
+    assert no_modificada.content == b""
+
+    # Una escritura invalida el cache y cambia el ETag
+    cliente.post("/insertar-lote", json=[{"id": 5001, "name": "", "datetime": "", "department_id": "", "job_id": ""}])
+    respuesta = cliente.get("/contrataciones-por-trimestre", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["ETag"] != etag
+
+def test_contrataciones_por_trimestre_igual_al_join():
+    # Los nombres resueltos con la caché de dimensiones deben coincidir con un LEFT JOIN en SQL
+    from db import obtener_conexion, devolver_conexion
+    conexion = obtener_conexion()
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute("""
+                SELECT COALESCE(d.department, 'Unknown'), COALESCE(j.job, 'Unknown'),
+                    COUNT(*) FILTER (WHERE EXTRACT(QUARTER FROM e.datetime) = 1),
+                    COUNT(*) FILTER (WHERE EXTRACT(QUARTER FROM e.datetime) = 2),
+                    COUNT(*) FILTER (WHERE EXTRACT(QUARTER FROM e.datetime) = 3),
+                    COUNT(*) FILTER (WHERE EXTRACT(QUARTER FROM e.datetime) = 4)
+                FROM hired_employees e
+                LEFT JOIN departments d ON e.department_id = d.id
+                LEFT JOIN jobs j ON e.job_id = j.id
+                WHERE e.datetime >= '2021-01-01' AND e.datetime < '2022-01-01'
+                GROUP BY 1, 2
+                ORDER BY 1, 2;
+            """)
+            esperado = [
+                {"departamento": d, "trabajo": j, "Q1": q1, "Q2": q2, "Q3": q3, "Q4": q4}
+                for d, j, q1, q2, q3, q4 in cursor.fetchall()
+            ]
+        conexion.rollback()
+    finally:
+        devolver_conexion(conexion)
+    respuesta = cliente.get("/contrataciones-por-trimestre", params={"from": "2021-01-01T00:00:00", "to": "2022-01-01T00:00:00"})
+    assert respuesta.json() == esperado
+
 def test_departamentos_sobre_promedio():
     respuesta = cliente.get("/departamentos-sobre-promedio")
     assert respuesta.status_code == 200
-    assert isinstance(respuesta.json(), list)
\ No newline at end of file
+    assert isinstance(respuesta.json(), list)
+
+
+def test_insertar_lote_stream():
+    lineas = [
+        '{"id": 5003, "name": "Stream Uno", "datetime": "2021-02-01T10:00:00Z", "department_id": 1, "job_id": 1}\n',
+        '{"id": 5004, "name": "Stream Dos", "datetime": "2021-03-01T10:00:00Z", "department_id": 2, "job_id": 2}\n',
+        '{"id": "x"}\n',
+        '{"id": 5005, "name": "", "datetime": "", "department_id": "", "job_id": ""}',
+    ]
+    respuesta = cliente.post(
+        "/insertar-lote/stream",
+        params={"tamano_lote": 2},
+        content=(linea.encode() for linea in lineas)
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.json()["mensaje"].startswith("3 empleados insertados exitosamente en 2 lotes")
+    rechazos = respuesta.json()["rechazos"]
+    assert rechazos["por_motivo"] == {"claves_faltantes": 1}
+
+    pagina = cliente.get(rechazos["url"]).json()
+    assert pagina["siguiente"] is None
+    assert [(r["fila"], r["motivo"]) for r in pagina["rechazos"]] == [(3, "claves_faltantes")]
+
+def test_insertar_lote_stream_linea_demasiado_larga(monkeypatch):
+    monkeypatch.setattr(modulo_app, "MAX_LINEA_STREAM", 100)
+    # La línea sin salto de línea se rechaza antes de terminar de recibirla
+    respuesta = cliente.post("/insertar-lote/stream", content=(b'{"name": "' + b"x" * 60 for _ in range(3)))
+    assert respuesta.status_code == 413
+
+def test_rechazos_inexistentes():
+    assert cliente.get("/rechazos/" + "0" * 32).status_code == 404
+    assert cliente.get("/rechazos/../app.py").status_code == 404
+
+def test_metricas():
+    cliente.get("/jobs/no-existe")
+    cliente.get("/contrataciones-por-trimestre", params={"from": "2021-02-03T00:00:00", "to": "2021-02-04T00:00:00"})
+    texto = cliente.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/jobs/{trabajo_id}",status="404"}' in texto
+    assert 'db_pool_acquire_duration_seconds_count{pool="asyncpg"}' in texto
+    assert 'db_query_duration_seconds_count{query="contrataciones_por_trimestre"}' in texto
@@ -0,0 +1,35 @@
+import sys
+import os
+import csv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.generador import generar_datos
+from benchmarks.suite import comparar
+from validar_datos import validar_csv
+
+def test_generador_reproducible(tmp_path):
+    primera = generar_datos(tmp_path / "a", 2000, proporcion_sucias=0.1, semilla=3)
+    segunda = generar_datos(tmp_path / "b", 2000, proporcion_sucias=0.1, semilla=3)
+    for tabla in primera:
+        with open(primera[tabla], "rb") as a, open(segunda[tabla], "rb") as b:
+            assert a.read() == b.read()
+
+def test_generador_proporcion_de_filas_sucias(tmp_path):
+    rutas = generar_datos(tmp_path, 5000, departamentos=5, trabajos=7, proporcion_sucias=0.2, semilla=1)
+    with open(rutas["departments"]) as archivo:
+        assert len(list(csv.reader(archivo))) == 5
+    resumen = validar_csv(rutas["hired_employees"], 5, "hired_employees",
+                          ids_departamentos=range(1, 6), ids_trabajos=range(1, 8))
+    assert resumen["total_filas"] == 5000
+    # Los ids duplicados y las columnas faltantes (que se completan con NULL) son válidos para
+    # el validador; el resto de filas sucias se rechaza
+    rechazadas = 5000 - resumen["filas_validas"]
+    assert 5000 * 0.2 * 5 / 7 * 0.8 < rechazadas < 5000 * 0.2 * 5 / 7 * 1.2
+
+def test_comparar_detecta_regresiones():
+    anterior = {"carga": {"copy": {"hired_employees": {"filas_por_segundo": 1000.0}}},
+                "metricas": {"/m": {"cache": {"p95_ms": 2.0, "solicitudes": 10}}}}
+    actual = {"carga": {"copy": {"hired_employees": {"filas_por_segundo": 800.0}}},
+              "metricas": {"/m": {"cache": {"p95_ms": 2.1, "solicitudes": 20}}}}
+    assert comparar(actual, anterior) == [("carga.copy.hired_employees.filas_por_segundo", 1000.0, 800.0, -0.2)]
@@ -0,0 +1,48 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cache import CacheRespuestas, coincide_etag
+
+def test_cache_lru_y_version():
+    cache = CacheRespuestas(maximo=2, ttl=60)
+    llamadas = []
+
+    def calcular(valor):
+        llamadas.append(valor)
+        return valor
+
+    for parametros in [("a",), ("b",), ("a",), ("c",), ("b",)]:
+        cache.obtener_o_calcular("e", parametros, cache.version, lambda: calcular(parametros))
+    # ("a",) se reutiliza; ("b",) se desaloja al entrar ("c",) y se vuelve a calcular
+    assert llamadas == [("a",), ("b",), ("c",), ("b",)]
+
+    cache.incrementar_version()
+    cache.obtener_o_calcular("e", ("a",), cache.version, lambda: calcular(("a",)))
+    assert llamadas[-1] == ("a",) and len(llamadas) == 5
+
+def test_cache_ttl():
+    cache = CacheRespuestas(maximo=10, ttl=0)
+    llamadas = []
+    for _ in range(2):
+        cache.obtener_o_calcular("e", (), cache.version, lambda: llamadas.append(1))
+    assert len(llamadas) == 2
+
+def test_etag_cambia_con_el_periodo_del_ttl(monkeypatch):
+    # Sin escrituras en este proceso el ETag sigue vigente solo durante el período del TTL
+    ahora = [960.0]
+    monkeypatch.setattr(time, "monotonic", lambda: ahora[0])
+    cache = CacheRespuestas(maximo=10, ttl=60)
+    etag = cache.etag("e", (), cache.version)
+    ahora[0] += 30
+    assert cache.etag("e", (), cache.version) == etag
+    ahora[0] += 30
+    assert cache.etag("e", (), cache.version) != etag
+
+def test_coincide_etag():
+    assert coincide_etag('W/"abc", "def"', '"abc"')
+    assert coincide_etag("*", '"abc"')
+    assert not coincide_etag(None, '"abc"')
+    assert not coincide_etag('"def"', '"abc"')
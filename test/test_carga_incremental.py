@@ -0,0 +1,98 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from db import obtener_conexion, devolver_conexion
+from carga_incremental import cargar_csv_incremental
+
+# Ids fuera del rango de data/departments.csv
+PRIMER_ID = 900001
+
+def filas(desde, hasta, nombre="Depto"):
+    return "".join(f"{i},{nombre} {i}\n" for i in range(PRIMER_ID + desde, PRIMER_ID + hasta))
+
+@pytest.fixture
+def conexion(tmp_path):
+    conexion = obtener_conexion()
+    yield conexion
+    with conexion.cursor() as cursor:
+        cursor.execute("DELETE FROM departments WHERE id >= %s;", (PRIMER_ID,))
+        cursor.execute("DELETE FROM load_manifest WHERE file_path LIKE %s;", (f"{tmp_path}%",))
+    conexion.commit()
+    devolver_conexion(conexion)
+
+def contar(conexion):
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM departments WHERE id >= %s;", (PRIMER_ID,))
+        return cursor.fetchone()[0]
+
+def test_omite_sin_cambios_y_carga_solo_la_cola(conexion, tmp_path):
+    ruta = tmp_path / "departments.csv"
+    ruta.write_text(filas(0, 5))
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta), filas_por_lote=2)
+    assert (resultado["estado"], resultado["filas_insertadas"], resultado["lotes"]) == ("completa", 5, 3)
+
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["estado"], resultado["filas_insertadas"]) == ("sin_cambios", 0)
+
+    tamano = ruta.stat().st_size
+    with open(ruta, "a") as archivo:
+        archivo.write(filas(5, 8) + "x,Fila mala\n")
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["estado"], resultado["desde_byte"], resultado["filas_insertadas"]) == ("incremental", tamano, 3)
+    assert resultado["rechazos"]["total"] == 1
+    assert contar(conexion) == 8
+
+def test_reanuda_tras_una_caida(conexion, tmp_path):
+    ruta = tmp_path / "departments.csv"
+    ruta.write_text(filas(0, 6))
+    lotes = []
+
+    def caer(**avance):
+        lotes.append(avance)
+        if len(lotes) == 2:
+            raise RuntimeError("caída simulada")
+
+    with pytest.raises(RuntimeError):
+        cargar_csv_incremental(conexion, "departments", str(ruta), progreso=caer, filas_por_lote=2)
+    # El lote que falló ya estaba confirmado; el siguiente nunca se envió
+    assert contar(conexion) == 4
+
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta), filas_por_lote=2)
+    assert (resultado["estado"], resultado["filas_insertadas"]) == ("incremental", 2)
+    assert contar(conexion) == 6
+
+def test_archivo_reescrito_se_carga_completo(conexion, tmp_path):
+    ruta = tmp_path / "departments.csv"
+    # Sin salto de línea final, como data/jobs.csv
+    ruta.write_text(filas(0, 3).rstrip("\n"))
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["filas_insertadas"], resultado["bytes_pendientes"]) == (3, 0)
+    assert cargar_csv_incremental(conexion, "departments", str(ruta))["estado"] == "sin_cambios"
+
+    with open(ruta, "a") as archivo:
+        archivo.write("\n" + filas(3, 4))
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["estado"], resultado["filas_insertadas"], resultado["rechazos"]["total"]) == ("incremental", 1, 0)
+
+    ruta.write_text(filas(0, 4, nombre="Renombrado"))
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["estado"], resultado["filas_insertadas"]) == ("completa", 4)
+
+def test_campo_con_salto_de_linea(conexion, tmp_path):
+    ruta = tmp_path / "departments.csv"
+    ruta.write_text(f'{PRIMER_ID},"Dos\nlíneas"\n{PRIMER_ID + 1},"Sin cerrar\n')
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["filas_insertadas"], resultado["rechazos"]["total"]) == (1, 0)
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT department FROM departments WHERE id = %s;", (PRIMER_ID,))
+        assert cursor.fetchone()[0] == "Dos\nlíneas"
+    conexion.rollback()
+
+    # El registro con la comilla sin cerrar se carga cuando se completa
+    with open(ruta, "a") as archivo:
+        archivo.write('fin"\n')
+    resultado = cargar_csv_incremental(conexion, "departments", str(ruta))
+    assert (resultado["estado"], resultado["filas_insertadas"], resultado["bytes_pendientes"]) == ("incremental", 1, 0)
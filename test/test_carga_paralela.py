@@ -0,0 +1,38 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import csv
+import io
+from carga_masiva import leer_registros
+from carga_paralela import particionar_archivo
+
+def test_particiones_alineadas_a_lineas(tmp_path):
+    ruta = tmp_path / "empleados.csv"
+    ruta.write_bytes(b"".join(f"{i},Nombre {i},2021-01-01T00:00:00Z,1,1\n".encode() for i in range(1, 1001)))
+    particiones = particionar_archivo(str(ruta), 7)
+    contenido = ruta.read_bytes()
+
+    assert particiones[0][0] == 0 and particiones[-1][1] == len(contenido)
+    for (_, fin), (inicio, _) in zip(particiones, particiones[1:]):
+        assert fin == inicio and contenido[inicio - 1:inicio] == b"\n"
+    assert sum(contenido[inicio:fin].count(b"\n") for inicio, fin in particiones) == 1000
+
+def test_particiones_con_saltos_de_linea_entre_comillas(tmp_path):
+    ruta = tmp_path / "empleados.csv"
+    # Cada registro ocupa varias líneas; un corte por líneas caería dentro de las comillas
+    ruta.write_bytes(b"".join(
+        f'{i},"Nombre\n{i}\n""apodo""",2021-01-01T00:00:00Z,1,1\n'.encode() for i in range(1, 301)
+    ))
+    contenido = ruta.read_bytes()
+    particiones = particionar_archivo(str(ruta), 7)
+    assert len(particiones) > 1
+    ids = []
+    for inicio, fin in particiones:
+        parte = contenido[inicio:fin]
+        assert [fila[0] for fila in csv.reader(io.StringIO(parte.decode()))] == [
+            fila[0] for _, fila in leer_registros(io.BytesIO(parte))
+        ]
+        ids += [fila[0] for _, fila in leer_registros(io.BytesIO(parte))]
+    assert ids == [str(i) for i in range(1, 301)]
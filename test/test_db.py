@@ -0,0 +1,127 @@
+import sys
+import os
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import db_async
+from db import PoolConexiones, obtener_conexion, devolver_conexion
+from app import consulta_contrataciones_por_trimestre
+
+def test_pool_reutiliza_conexiones():
+    pool = PoolConexiones(minimo=1, maximo=2)
+    pool.precalentar()
+    conexion = pool.obtener()
+    assert conexion is not None
+    pool.devolver(conexion)
+    assert pool.obtener() is conexion
+    pool.devolver(conexion)
+    pool.cerrar()
+
+def test_pool_falla_rapido_durante_backoff(monkeypatch):
+    monkeypatch.setenv("POSTGRES_HOST", "127.0.0.1")
+    monkeypatch.setenv("POSTGRES_PORT", "1")
+    pool = PoolConexiones(minimo=0, maximo=1, backoff_inicial=60)
+    assert pool.obtener() is None
+    inicio = time.monotonic()
+    assert pool.obtener() is None
+    assert time.monotonic() - inicio < 0.1
+
+def test_pool_async_falla_rapido_durante_backoff(monkeypatch):
+    monkeypatch.setenv("POSTGRES_REPLICA_HOST", "127.0.0.1")
+    monkeypatch.setenv("POSTGRES_REPLICA_PORT", "1")
+    monkeypatch.setattr(db_async, "_no_antes_de", {})
+    monkeypatch.setattr(db_async, "_backoff", {"replica": 60})
+
+    async def obtener_dos_veces():
+        assert await db_async.obtener_conexion_async("replica") is None
+        inicio = time.monotonic()
+        assert await db_async.obtener_conexion_async("replica") is None
+        return time.monotonic() - inicio
+
+    assert asyncio.run(obtener_dos_veces()) < 0.1
+    assert db_async._backoff["replica"] == db_async.BACKOFF_MAXIMO
+
+def test_pool_timeout_sin_cupo():
+    pool = PoolConexiones(minimo=0, maximo=1, timeout_adquisicion=0.2)
+    conexion = pool.obtener()
+    assert conexion is not None
+    assert pool.obtener() is None
+    pool.devolver(conexion)
+    pool.cerrar()
+
+# Diferencias en ambos sentidos entre el resumen y lo que resulta de agrupar hired_employees
+DIFERENCIAS_ROLLUP = """
+    WITH esperado AS (
+        SELECT EXTRACT(YEAR FROM datetime)::INTEGER, EXTRACT(QUARTER FROM datetime)::INTEGER,
+               department_id, job_id, COUNT(*)
+        FROM hired_employees
+        WHERE datetime IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ), guardado AS (
+        SELECT year, quarter, department_id, job_id, hires FROM hired_employees_rollup
+    )
+    (SELECT * FROM esperado EXCEPT ALL SELECT * FROM guardado)
+    UNION ALL
+    (SELECT * FROM guardado EXCEPT ALL SELECT * FROM esperado);
+"""
+
+def test_rollup_coincide_con_hired_employees():
+    conexion = obtener_conexion()
+    cursor = conexion.cursor()
+    cursor.execute(DIFERENCIAS_ROLLUP)
+    assert cursor.fetchall() == []
+    cursor.close()
+    devolver_conexion(conexion)
+
+def test_rollup_sigue_update_delete_y_truncate():
+    conexion = obtener_conexion()
+    cursor = conexion.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO hired_employees (id, name, datetime, department_id, job_id) VALUES
+                (990101, 'Rollup', '2021-02-01', 1, 1),
+                (990102, 'Rollup', '2021-02-01', NULL, 1);
+        """)
+        cursor.execute("UPDATE hired_employees SET datetime = '2021-11-01', department_id = 2 WHERE id = 990101;")
+        cursor.execute(DIFERENCIAS_ROLLUP)
+        assert cursor.fetchall() == []
+        cursor.execute("DELETE FROM hired_employees WHERE id IN (990101, 990102);")
+        cursor.execute(DIFERENCIAS_ROLLUP)
+        assert cursor.fetchall() == []
+        cursor.execute("TRUNCATE hired_employees;")
+        cursor.execute("SELECT COUNT(*) FROM hired_employees_rollup;")
+        assert cursor.fetchone()[0] == 0
+    finally:
+        conexion.rollback()
+        cursor.close()
+        devolver_conexion(conexion)
+
+def nodos_del_plan(nodo):
+    yield nodo
+    for hijo in nodo.get("Plans", []):
+        yield from nodos_del_plan(hijo)
+
+def test_rango_de_fechas_usa_indice_en_tabla_grande():
+    conexion = obtener_conexion()
+    cursor = conexion.cursor()
+    try:
+        # Tabla sintética grande dentro de una transacción que se descarta al final
+        cursor.execute("""
+            INSERT INTO hired_employees (id, name, datetime, department_id, job_id)
+            SELECT 10000000 + n, 'Sintético', TIMESTAMP '2000-01-01' + n * INTERVAL '1 minute', n % 12 + 1, n % 183 + 1
+            FROM generate_series(1, 200000) n;
+        """)
+        cursor.execute("ANALYZE hired_employees;")
+        sql, parametros = consulta_contrataciones_por_trimestre(datetime(2000, 2, 1, 12), datetime(2000, 2, 2))
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, parametros)
+        # Con particiones cada una tiene su propio índice y nombre, así que se verifica el tipo de nodo
+        nodos = list(nodos_del_plan(cursor.fetchone()[0][0]["Plan"]))
+        assert any(nodo["Node Type"] in ("Index Scan", "Index Only Scan", "Bitmap Index Scan") for nodo in nodos)
+        assert not any(nodo["Node Type"] == "Seq Scan" for nodo in nodos)
+    finally:
+        conexion.rollback()
+        cursor.close()
+        devolver_conexion(conexion)
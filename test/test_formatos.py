@@ -0,0 +1,81 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import csv
+import io
+import gzip
+import pytest
+from fastapi.testclient import TestClient
+import formatos
+from app import app
+from formatos import TIPO_ARROW, ContratacionesTrimestre, ResultadoMetrica, negociar_codificacion, negociar_formato
+
+cliente = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def ciclo_de_vida():
+    with cliente:
+        yield
+
+def test_negociar_formato():
+    assert negociar_formato(None) == "json"
+    assert negociar_formato("*/*") == "json"
+    assert negociar_formato("text/csv, application/json;q=0.5") == "csv"
+    assert negociar_formato("text/csv;q=0.2, application/json;q=0.5") == "json"
+    assert negociar_formato("image/png, text/csv;q=0") is None
+    assert negociar_codificacion("gzip, deflate, br") == "br"
+    assert negociar_codificacion("br;q=0.5, gzip") == "gzip"
+    assert negociar_codificacion("identity") is None and negociar_codificacion(None) is None
+
+def test_json_se_comprime_desde_el_umbral(monkeypatch):
+    filas = [{"departamento": "A", "trabajo": "B", "Q1": 1, "Q2": 2, "Q3": 3, "Q4": 4}] * 50
+    monkeypatch.setattr(formatos, "COMPRESION_MIN_BYTES", 10**6)
+    assert ResultadoMetrica(filas, ContratacionesTrimestre).json("gzip")[1] is None
+    monkeypatch.setattr(formatos, "COMPRESION_MIN_BYTES", 100)
+    resultado = ResultadoMetrica(filas, ContratacionesTrimestre)
+    cuerpo, codificacion = resultado.json("gzip")
+    assert codificacion == "gzip" and gzip.decompress(cuerpo) == resultado.json()[0]
+    # El cuerpo comprimido se reutiliza
+    assert resultado.json("gzip")[0] is cuerpo
+
+def test_csv_por_bloques(monkeypatch):
+    monkeypatch.setattr(formatos, "FILAS_POR_BLOQUE", 2)
+    filas = [{"id": i, "departamento": f"D,{i}", "contratados": i * 10} for i in range(5)]
+    bloques = list(ResultadoMetrica(filas, formatos.DepartamentoSobrePromedio).bloques_csv())
+    assert len(bloques) == 3
+    lineas = list(csv.reader(io.StringIO(b"".join(bloques).decode())))
+    assert lineas[0] == ["id", "departamento", "contratados"]
+    assert lineas[2] == ["1", "D,1", "10"]
+
+def test_endpoint_en_csv_y_json_con_etag_distinto():
+    json_ = cliente.get("/departamentos-sobre-promedio", params={"year": 2021})
+    csv_ = cliente.get("/departamentos-sobre-promedio", params={"year": 2021}, headers={"Accept": "text/csv"})
+    assert json_.status_code == csv_.status_code == 200
+    assert csv_.headers["content-type"].startswith("text/csv")
+    filas = list(csv.DictReader(io.StringIO(csv_.text)))
+    assert [int(fila["contratados"]) for fila in filas] == [fila["contratados"] for fila in json_.json()]
+    assert json_.headers["etag"] != csv_.headers["etag"]
+    assert "Accept" in csv_.headers["vary"]
+
+def test_formato_no_disponible():
+    respuesta = cliente.get("/contrataciones-por-trimestre", headers={"Accept": "image/png"})
+    assert respuesta.status_code == 406
+
+def test_endpoint_en_arrow():
+    pa = pytest.importorskip("pyarrow")
+    respuesta = cliente.get("/contrataciones-por-trimestre", params={"year": 2021}, headers={
+        "Accept": TIPO_ARROW, "Accept-Encoding": "gzip",
+    })
+    assert respuesta.status_code == 200
+    tabla = pa.ipc.open_stream(respuesta.content).read_all()
+    assert tabla.schema.names == ["departamento", "trabajo", "Q1", "Q2", "Q3", "Q4"]
+    assert tabla.to_pylist() == cliente.get("/contrataciones-por-trimestre", params={"year": 2021}).json()
+
+def test_arrow_sin_pyarrow(monkeypatch):
+    monkeypatch.setattr(formatos, "pa", None)
+    assert negociar_formato(TIPO_ARROW) is None
+    assert negociar_formato(TIPO_ARROW + ", text/csv;q=0.5") == "csv"
+    respuesta = cliente.get("/contrataciones-por-trimestre", headers={"Accept": TIPO_ARROW})
+    assert respuesta.status_code == 406
@@ -0,0 +1,57 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from fastapi.testclient import TestClient
+import app as modulo_app
+from app import app
+from cache import cache_respuestas
+from instantanea import instantanea_contrataciones
+
+cliente = TestClient(app)
+
+RANGOS = [
+    {"year": 2021},
+    {"from": "2021-01-01T00:00:00", "to": "2021-07-01T00:00:00"},
+    {"from": "2021-02-03T12:30:00", "to": "2021-11-17T08:00:00"},
+    {"from": "1990-01-01T00:00:00", "to": "1990-02-01T00:00:00"},
+]
+
+@pytest.fixture(scope="module", autouse=True)
+def ciclo_de_vida():
+    with cliente:
+        yield
+
+def consultar(monkeypatch, motor, endpoint, parametros):
+    monkeypatch.setattr(modulo_app, "MOTOR_METRICAS", motor)
+    # Cambia la versión para que la respuesta no salga del cache del otro motor
+    cache_respuestas.incrementar_version()
+    respuesta = cliente.get(endpoint, params=parametros)
+    assert respuesta.status_code == 200
+    return respuesta.json()
+
+@pytest.mark.parametrize("endpoint", ["/contrataciones-por-trimestre", "/departamentos-sobre-promedio"])
+@pytest.mark.parametrize("parametros", RANGOS)
+def test_memoria_igual_a_sql(monkeypatch, endpoint, parametros):
+    assert consultar(monkeypatch, "memoria", endpoint, parametros) == consultar(monkeypatch, "sql", endpoint, parametros)
+
+def test_refresco_incremental(monkeypatch):
+    consultar(monkeypatch, "memoria", "/contrataciones-por-trimestre", RANGOS[0])
+    filas = instantanea_contrataciones.filas
+    cliente.post("/insertar-lote", json=[
+        {"id": 5201, "name": "Instantanea", "datetime": "2021-05-05T05:05:05Z", "department_id": "", "job_id": 1}
+    ])
+    # Solo se leen las filas nuevas; una carga completa aquí indicaría que el total no cuadró
+    leer = instantanea_contrataciones._leer
+    consultas = []
+    async def registrar(conexion, consulta, *argumentos):
+        consultas.append(consulta)
+        return await leer(conexion, consulta, *argumentos)
+    monkeypatch.setattr(instantanea_contrataciones, "_leer", registrar)
+
+    en_memoria = consultar(monkeypatch, "memoria", "/contrataciones-por-trimestre", RANGOS[0])
+    assert len(consultas) == 1 and "pg_visible_in_snapshot" in consultas[0]
+    assert instantanea_contrataciones.filas in (filas, filas + 1)
+    assert en_memoria == consultar(monkeypatch, "sql", "/contrataciones-por-trimestre", RANGOS[0])
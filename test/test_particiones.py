@@ -0,0 +1,99 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import psycopg2
+import pytest
+from db import parametros_conexion
+from carga_masiva import copiar_filas
+from init_db import archivar_anio, crear_tablas, tipo_hired_employees
+
+ESQUEMA = "prueba_particiones"
+
+@pytest.fixture
+def cursor():
+    # Las tablas se crean en un esquema propio y todo se deshace al terminar
+    conexion = psycopg2.connect(**parametros_conexion())
+    cursor = conexion.cursor()
+    cursor.execute(f"CREATE SCHEMA {ESQUEMA};")
+    cursor.execute(f"SET LOCAL search_path TO {ESQUEMA};")
+    yield cursor
+    conexion.rollback()
+    conexion.close()
+
+def empleado(i, fecha):
+    return (i, (i, f"Empleado {i}", fecha, 1, 1))
+
+def particiones(cursor):
+    cursor.execute("""
+        SELECT c.relname, (SELECT count(*) FROM hired_employees WHERE tableoid = c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'hired_employees'::regclass
+        ORDER BY c.relname;
+    """)
+    return dict(cursor.fetchall())
+
+def test_carga_crea_particiones(cursor):
+    crear_tablas(cursor, "trimestre")
+    filas = [
+        empleado(1, "2021-01-15T10:00:00"),
+        empleado(2, "2021-08-01T10:00:00"),
+        empleado(3, None),
+        empleado(4, "1800-01-01T00:00:00"),
+        empleado(1, "2021-05-01T00:00:00"),
+    ]
+    assert copiar_filas(cursor, "hired_employees", filas) == (5, 4)
+    # Un id repetido en otra carga se descarta como con la clave primaria
+    assert copiar_filas(cursor, "hired_employees", [empleado(2, "2022-01-01T00:00:00")]) == (1, 0)
+    assert particiones(cursor) == {
+        # Las particiones se crean antes de fusionar, aunque las filas luego se descarten
+        "hired_employees_2021_q1": 1,
+        "hired_employees_2021_q2": 0,
+        "hired_employees_2021_q3": 1,
+        "hired_employees_2022_q1": 0,
+        "hired_employees_default": 2,
+    }
+    cursor.execute("SELECT year, quarter, hires FROM hired_employees_rollup ORDER BY 1, 2;")
+    assert cursor.fetchall() == [(1800, 1, 1), (2021, 1, 1), (2021, 3, 1)]
+
+    cursor.execute("""
+        EXPLAIN SELECT count(*) FROM hired_employees
+        WHERE datetime >= '2021-07-01' AND datetime < '2021-10-01';
+    """)
+    plan = "\n".join(fila[0] for fila in cursor.fetchall())
+    assert "hired_employees_2021_q3" in plan
+    assert "hired_employees_2021_q1" not in plan and "hired_employees_default" not in plan
+
+def test_filas_en_default_se_mueven(cursor):
+    crear_tablas(cursor, "anio")
+    cursor.execute("INSERT INTO hired_employees VALUES (1, 'Uno', '2022-03-01', 1, 1), (2, 'Dos', '2022-04-01', 1, 1);")
+    assert particiones(cursor) == {"hired_employees_default": 2}
+    cursor.execute("SELECT asegurar_particiones_hired_employees('hired_employees_default');")
+    assert particiones(cursor) == {"hired_employees_2022": 2, "hired_employees_default": 0}
+
+    assert archivar_anio(cursor, 2022) == ["archivo_hired_employees_2022"]
+    cursor.execute("SELECT count(*) FROM hired_employees;")
+    assert cursor.fetchone()[0] == 0
+    # Los ids archivados se pueden volver a cargar
+    cursor.execute("INSERT INTO hired_employees VALUES (1, 'Uno', NULL, 1, 1);")
+    assert cursor.rowcount == 1
+
+def test_migracion_desde_tabla_simple(cursor):
+    crear_tablas(cursor)
+    assert tipo_hired_employees(cursor) == "simple"
+    copiar_filas(cursor, "hired_employees", [empleado(i, f"20{20 + i % 3}-06-01T00:00:00") for i in range(1, 10)])
+    cursor.execute("SELECT * FROM hired_employees_rollup ORDER BY 1, 2;")
+    rollup = cursor.fetchall()
+
+    crear_tablas(cursor, "anio")
+    assert tipo_hired_employees(cursor) == "particionada"
+    assert particiones(cursor) == {
+        "hired_employees_2020": 3,
+        "hired_employees_2021": 3,
+        "hired_employees_2022": 3,
+        "hired_employees_default": 0,
+    }
+    cursor.execute("SELECT * FROM hired_employees_rollup ORDER BY 1, 2;")
+    assert cursor.fetchall() == rollup
+    assert copiar_filas(cursor, "hired_employees", [empleado(1, None), empleado(10, None)]) == (2, 1)
@@ -0,0 +1,60 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from carga_masiva import FilaInvalida, convertir_fila
+from rechazos import RegistroRechazos, leer_rechazos, linea_rechazo
+
+@pytest.mark.parametrize("fila, motivo", [
+    (["", "Ana", "", "1", "1"], "id_vacio"),
+    (["1x", "Ana", "", "1", "1"], "id_no_numerico"),
+    (["1", "Ana", "", "99999999999", "1"], "department_id_fuera_de_rango"),
+    (["1", "Ana", "2021-13-01T00:00:00Z", "1", "1"], "datetime_invalido"),
+])
+def test_convertir_fila_motivos(fila, motivo):
+    with pytest.raises(FilaInvalida) as error:
+        convertir_fila("hired_employees", fila)
+    assert error.value.motivo == motivo
+
+def test_convertir_fila_claves_foraneas():
+    claves = ({1, 2}, {1})
+    with pytest.raises(FilaInvalida) as error:
+        convertir_fila("hired_employees", ["1", "Ana", "", "3", "1"], claves)
+    assert error.value.motivo == "department_id_inexistente"
+    with pytest.raises(FilaInvalida) as error:
+        convertir_fila("hired_employees", ["1", "Ana", "", "2", "7"], claves)
+    assert error.value.motivo == "job_id_inexistente"
+    # Las claves vacías se insertan como NULL y no se validan
+    assert convertir_fila("hired_employees", ["1", "Ana", "", "", ""], claves)[3:] == (None, None)
+
+def test_registro_paginado(tmp_path):
+    with RegistroRechazos(directorio=str(tmp_path)) as rechazos:
+        for i in range(1, 8):
+            rechazos.registrar(i, "id_vacio" if i % 2 else "datetime_invalido", ["", f"fila {i}"])
+    assert rechazos.resumen()["por_motivo"] == {"id_vacio": 4, "datetime_invalido": 3}
+
+    leidas = []
+    cursor = 0
+    while cursor is not None:
+        pagina, cursor = leer_rechazos(rechazos.id, cursor, 3, directorio=str(tmp_path))
+        assert len(pagina) <= 3
+        leidas.extend(r["fila"] for r in pagina)
+    assert leidas == list(range(1, 8))
+
+def test_registro_sin_rechazos_no_crea_archivo(tmp_path):
+    with RegistroRechazos(directorio=str(tmp_path)) as rechazos:
+        pass
+    assert rechazos.resumen()["url"] is None
+    assert leer_rechazos(rechazos.id, directorio=str(tmp_path)) is None
+
+def test_agregar_parte_traduce_numeros_de_fila(tmp_path):
+    parte = tmp_path / "parte"
+    parte.write_text(linea_rechazo(2, "id_vacio", ["", "x"]))
+    with RegistroRechazos(directorio=str(tmp_path)) as rechazos:
+        rechazos.registrar(1, "id_no_numerico", ["a"])
+        rechazos.agregar_parte(str(parte), 10, {"id_vacio": 1})
+    pagina, _ = leer_rechazos(rechazos.id, directorio=str(tmp_path))
+    assert [r["fila"] for r in pagina] == [1, 12]
+    assert not parte.exists()
@@ -0,0 +1,116 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+import psycopg2
+import pytest
+import db_async
+from fastapi.testclient import TestClient
+from app import app
+from cache import cache_respuestas
+from metricas import registro
+from db import parametros_conexion, replica_configurada
+from replica import COOKIE_LSN, EnrutadorLecturas, cookie_lsn, enrutador_lecturas, lsn_a_entero, lsn_de_cookie
+
+cliente = TestClient(app)
+
+# Las pruebas con réplica necesitan una segunda instancia en streaming desde la primaria:
+# POSTGRES_REPLICA_HOST (y POSTGRES_REPLICA_PORT si hace falta) apuntando al standby.
+con_replica = pytest.mark.skipif(not replica_configurada(), reason="POSTGRES_REPLICA_HOST no está definido")
+
+def destino_de_lectura(enrutador, lsn_cliente=None):
+    async def leer():
+        conexion, destino = await enrutador.obtener(lsn_cliente)
+        await enrutador.devolver(conexion, destino)
+        return destino
+    return asyncio.run(leer())
+
+@pytest.fixture
+def replica_pausada():
+    # Detiene la aplicación del WAL en la réplica y genera WAL en la primaria para que quede atrasada
+    replica = psycopg2.connect(**parametros_conexion(replica=True))
+    replica.autocommit = True
+    primaria = psycopg2.connect(**parametros_conexion())
+    primaria.autocommit = True
+    with replica.cursor() as cursor:
+        cursor.execute("SELECT pg_wal_replay_pause();")
+    with primaria.cursor() as cursor:
+        cursor.execute("SELECT pg_logical_emit_message(true, 'prueba_replica', 'atraso');")
+    yield
+    with replica.cursor() as cursor:
+        cursor.execute("SELECT pg_wal_replay_resume();")
+    with primaria.cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_insert_lsn()::TEXT;")
+        objetivo = lsn_a_entero(cursor.fetchone()[0])
+    fin = time.monotonic() + 30
+    with replica.cursor() as cursor:
+        while time.monotonic() < fin:
+            cursor.execute("SELECT pg_last_wal_replay_lsn()::TEXT;")
+            if lsn_a_entero(cursor.fetchone()[0]) >= objetivo:
+                break
+            time.sleep(0.05)
+    replica.close()
+    primaria.close()
+
+def test_lsn_a_entero():
+    assert lsn_a_entero("16/B374D848") == 0x16 << 32 | 0xB374D848
+    assert lsn_a_entero("0/10") < lsn_a_entero("1/0")
+    assert lsn_a_entero('"16/B374D848"') == lsn_a_entero("16/B374D848")
+    assert lsn_a_entero(None) == 0 and lsn_a_entero("basura") == 0
+
+def test_cookie_firmada():
+    assert lsn_de_cookie(cookie_lsn("16/B374D848")) == "16/B374D848"
+    assert lsn_de_cookie('"' + cookie_lsn("16/B374D848") + '"') == "16/B374D848"
+    # Una posición sin firma o con la firma de otra posición se ignora
+    assert lsn_de_cookie("FFFFFFFF/FFFFFFFF") is None
+    assert lsn_de_cookie("FFFFFFFF/FFFFFFFF." + cookie_lsn("16/B374D848").split(".")[1]) is None
+    assert lsn_de_cookie(None) is None and lsn_de_cookie("") is None
+
+def test_replica_caida_usa_primaria(monkeypatch):
+    monkeypatch.setenv("POSTGRES_REPLICA_HOST", "127.0.0.1")
+    monkeypatch.setenv("POSTGRES_REPLICA_PORT", "1")
+    # El backoff del pool de la réplica no debe afectar a las pruebas con la réplica real
+    monkeypatch.setattr(db_async, "_no_antes_de", {})
+    monkeypatch.setattr(db_async, "_backoff", {})
+    enrutador = EnrutadorLecturas(reintento_seg=60)
+    assert destino_de_lectura(enrutador) == "primaria"
+    # Durante el reintento no se vuelve a intentar la conexión
+    inicio = time.monotonic()
+    assert destino_de_lectura(enrutador) == "primaria"
+    assert time.monotonic() - inicio < 0.5
+
+@con_replica
+def test_lecturas_van_a_la_replica():
+    with cliente:
+        assert cliente.get("/test-db").json()["destino"] == "replica"
+    assert destino_de_lectura(EnrutadorLecturas()) == "replica"
+
+@con_replica
+def test_retraso_vuelve_a_la_primaria(replica_pausada):
+    assert destino_de_lectura(EnrutadorLecturas(retraso_max=0.0)) == "primaria"
+    assert destino_de_lectura(EnrutadorLecturas(retraso_max=3600.0)) == "replica"
+
+@con_replica
+def test_lectura_de_las_propias_escrituras(monkeypatch, replica_pausada):
+    monkeypatch.setattr(enrutador_lecturas, "retraso_max", 3600.0)
+    with cliente:
+        respuesta = cliente.post("/insertar-lote", json=[
+            {"id": 5301, "name": "Replica", "datetime": "2021-03-03T03:03:03Z", "department_id": 1, "job_id": 1}
+        ])
+        assert respuesta.status_code == 200
+        lsn = lsn_de_cookie(respuesta.cookies[COOKIE_LSN])
+        assert lsn == enrutador_lecturas.lsn_escrito
+        # Este proceso espera su escritura; otro proceso la espera solo si el cliente envía la cookie
+        assert destino_de_lectura(enrutador_lecturas) == "primaria"
+        assert destino_de_lectura(EnrutadorLecturas(retraso_max=3600.0), lsn) == "primaria"
+        assert destino_de_lectura(EnrutadorLecturas(retraso_max=3600.0)) == "replica"
+
+        # El endpoint de métricas tampoco lee de la réplica atrasada
+        etiquetas = {"target": "primaria", "reason": "lectura_propia"}
+        antes = registro.get_sample_value("db_reads_total", etiquetas) or 0
+        cache_respuestas.incrementar_version()
+        assert cliente.get("/departamentos-sobre-promedio", params={"year": 2021}).status_code == 200
+        assert registro.get_sample_value("db_reads_total", etiquetas) == antes + 1
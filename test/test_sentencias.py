@@ -0,0 +1,93 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+import app as modulo_app
+import sentencias
+from app import app
+from cache import cache_respuestas
+from db import parametros_conexion
+from db_async import cerrar_pool_async, devolver_conexion_async, obtener_conexion_async
+from metricas import registro
+from sentencias import Sentencia, consultar_async, ejecutar, registrar_sentencia, sentencias_registradas
+
+cliente = TestClient(app)
+
+def test_sql_tipado():
+    sentencia = Sentencia("prueba_tipos", ("INTEGER", "TIMESTAMP"), "SELECT $1 + 1, $2, $1")
+    assert sentencia.sql_tipado == "SELECT $1::INTEGER + 1, $2::TIMESTAMP, $1::INTEGER"
+    assert sentencia.preparar() == "PREPARE prueba_tipos (INTEGER, TIMESTAMP) AS SELECT $1 + 1, $2, $1"
+    assert sentencia.ejecutar() == "EXECUTE prueba_tipos (%s, %s)"
+    assert sentencia.ejecutar_con_literales((1, None)) == "EXECUTE prueba_tipos ('1', NULL)"
+    assert sentencia.ejecutar_con_literales(("O'Hara", 2)) == "EXECUTE prueba_tipos ('O''Hara', '2')"
+
+def test_registro_rechaza_nombre_repetido():
+    primera = registrar_sentencia("prueba_registro", ("INTEGER",), "SELECT $1")
+    assert registrar_sentencia("prueba_registro", ("INTEGER",), "SELECT $1") is primera
+    with pytest.raises(ValueError):
+        registrar_sentencia("prueba_registro", ("INTEGER",), "SELECT $1 + 1")
+    assert "insertar_hired_employees" in sentencias_registradas()
+
+def test_se_prepara_una_vez_por_conexion():
+    registrar_sentencia("prueba_una_vez", ("INTEGER",), "SELECT $1 * 2")
+    conexion = psycopg2.connect(**parametros_conexion())
+    try:
+        with conexion.cursor() as cursor:
+            for valor in (1, 2):
+                ejecutar(cursor, "prueba_una_vez", (valor,))
+                assert cursor.fetchone()[0] == valor * 2
+            # Sigue preparada después de un rollback
+            conexion.rollback()
+            ejecutar(cursor, "prueba_una_vez", (3,))
+            assert cursor.fetchone()[0] == 6
+            cursor.execute("SELECT COUNT(*) FROM pg_prepared_statements WHERE name = 'prueba_una_vez';")
+            assert cursor.fetchone()[0] == 1
+    finally:
+        conexion.close()
+
+def test_async_se_prepara_una_vez_por_conexion(monkeypatch):
+    monkeypatch.setenv("POSTGRES_POOL_MAX", "1")
+    sentencia = registrar_sentencia("prueba_async", ("INTEGER",), "SELECT $1 * 3")
+
+    async def usar_dos_veces():
+        try:
+            # La sentencia sigue preparada después de devolver la conexión al pool
+            for valor in (1, 2):
+                conexion = await obtener_conexion_async()
+                try:
+                    assert (await consultar_async(conexion, "prueba_async", valor))[0][0] == valor * 3
+                finally:
+                    await devolver_conexion_async(conexion)
+            conexion = await obtener_conexion_async()
+            try:
+                return await conexion.fetchval(
+                    "SELECT COUNT(*) FROM pg_prepared_statements WHERE statement = $1;", sentencia.sql_tipado
+                )
+            finally:
+                await devolver_conexion_async(conexion)
+        finally:
+            await cerrar_pool_async()
+
+    assert asyncio.run(usar_dos_veces()) == 1
+
+def test_planificacion_muestreada(monkeypatch):
+    monkeypatch.setattr(sentencias, "MUESTREO_PLAN", 1.0)
+    monkeypatch.setattr(modulo_app, "MOTOR_METRICAS", "sql")
+    etiquetas = {"query": "contrataciones_por_trimestre_rango"}
+    with cliente:
+        antes = registro.get_sample_value("db_query_planning_seconds_count", etiquetas) or 0
+        preparadas = registro.get_sample_value("db_statement_prepare_duration_seconds_count", etiquetas) or 0
+        for _ in range(2):
+            cache_respuestas.incrementar_version()
+            respuesta = cliente.get("/contrataciones-por-trimestre", params={
+                "from": "2021-02-03T00:00:00", "to": "2021-05-17T00:00:00",
+            })
+            assert respuesta.status_code == 200
+    assert registro.get_sample_value("db_query_planning_seconds_count", etiquetas) == antes + 2
+    # La muestra planifica la sentencia preparada con su nombre, una vez por conexión
+    assert 1 <= registro.get_sample_value("db_statement_prepare_duration_seconds_count", etiquetas) - preparadas <= 2
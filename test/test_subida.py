@@ -0,0 +1,109 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import csv
+import gzip
+import io
+import pytest
+from fastapi.testclient import TestClient
+import app as modulo_app
+import subida
+from app import app
+from subida import LectorCsvSubido, LectorMultipart, SubidaInvalida, boundary_de
+
+cliente = TestClient(app)
+
+BOUNDARY = b"----limite7MA4YWxk"
+CABECERAS = {"Content-Type": "multipart/form-data; boundary=" + BOUNDARY.decode()}
+CSV_EMPLEADOS = (
+    b'5401,Subida Uno,2021-02-01T10:00:00Z,1,1\n'
+    b'5402,"Subida, Dos",2021-03-01T10:00:00Z,2,2\n'
+    b'x,Sin id,2021-03-01T10:00:00Z,2,2\n'
+    b'5403,"Subida\nTres",2021-04-01T10:00:00Z,,'
+)
+
+def formulario(datos, campo="archivo"):
+    return (
+        b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="comentario"\r\n\r\nhola\r\n'
+        b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="' + campo.encode()
+        + b'"; filename="empleados.csv"\r\nContent-Type: text/csv\r\n\r\n' + datos
+        + b"\r\n--" + BOUNDARY + b"--\r\n"
+    )
+
+def en_trozos(datos, tamano):
+    for inicio in range(0, len(datos), tamano):
+        yield datos[inicio:inicio + tamano]
+
+def test_boundary_de():
+    assert boundary_de('multipart/form-data; boundary="abc def"') == b"abc def"
+    assert boundary_de("multipart/form-data; charset=utf-8; boundary=xyz") == b"xyz"
+    assert boundary_de("text/csv") is None and boundary_de(None) is None
+
+def test_multipart_byte_a_byte():
+    lector = LectorMultipart(BOUNDARY)
+    recibido = b"".join(b"".join(lector.alimentar(byte)) for byte in en_trozos(formulario(CSV_EMPLEADOS), 1))
+    lector.terminar()
+    assert recibido == CSV_EMPLEADOS
+    assert lector.nombre_archivo == "empleados.csv"
+
+def test_multipart_sin_archivo_o_incompleto():
+    lector = LectorMultipart(BOUNDARY)
+    lector.alimentar(formulario(b"1,a\n", campo="otro"))
+    with pytest.raises(SubidaInvalida):
+        lector.terminar()
+    lector = LectorMultipart(BOUNDARY)
+    lector.alimentar(formulario(b"1,a\n")[:-10])
+    with pytest.raises(SubidaInvalida):
+        lector.terminar()
+
+@pytest.mark.parametrize("comprimir", [False, True])
+def test_csv_en_trozos(comprimir):
+    datos = gzip.compress(CSV_EMPLEADOS[:50]) + gzip.compress(CSV_EMPLEADOS[50:]) if comprimir else CSV_EMPLEADOS
+    lector = LectorCsvSubido()
+    textos = [texto for trozo in en_trozos(datos, 7) for texto in lector.alimentar(trozo)]
+    textos.append(lector.terminar())
+    assert lector.comprimido is comprimir
+    # Ningún registro queda partido entre dos textos
+    filas = [fila for texto in textos for fila in csv.reader(io.StringIO(texto))]
+    assert filas == list(csv.reader(io.StringIO(CSV_EMPLEADOS.decode())))
+
+def test_gzip_por_pasos(monkeypatch):
+    monkeypatch.setattr(subida, "BLOQUE_DESCOMPRESION", 64)
+    datos = CSV_EMPLEADOS * 20
+    lector = LectorCsvSubido()
+    pasos = lector.alimentar(gzip.compress(datos))
+    # Cada texto sale de un paso de descompresión, no del bloque entero
+    primero = next(pasos)
+    assert 0 < len(primero) <= 64 and lector.bytes_csv <= 64
+    textos = [primero, *pasos, lector.terminar()]
+    assert "".join(textos) == datos.decode()
+
+def test_gzip_incompleto():
+    lector = LectorCsvSubido()
+    list(lector.alimentar(gzip.compress(CSV_EMPLEADOS)[:-8]))
+    with pytest.raises(SubidaInvalida):
+        lector.terminar()
+
+def test_subir_csv_comprimido():
+    with cliente:
+        respuesta = cliente.post(
+            "/subir-csv/hired_employees", headers=CABECERAS,
+            content=en_trozos(formulario(gzip.compress(CSV_EMPLEADOS)), 16),
+        )
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert cuerpo["mensaje"].startswith("Datos de hired_employees.csv cargados: 3 filas insertadas")
+    assert cuerpo["rechazos"]["por_motivo"] == {"id_no_numerico": 1}
+    assert cuerpo["comprimido"] is True
+
+def test_subir_csv_errores(monkeypatch):
+    with cliente:
+        assert cliente.post("/subir-csv/otra_tabla", headers=CABECERAS, content=formulario(b"")).status_code == 400
+        assert cliente.post("/subir-csv/jobs", content=b"1,a\n", headers={"Content-Type": "text/csv"}).status_code == 415
+        assert cliente.post("/subir-csv/jobs", headers=CABECERAS, content=formulario(b"1,a\n", campo="otro")).status_code == 400
+        monkeypatch.setattr(modulo_app, "SUBIDA_MAX_BYTES", 100)
+        # Sin Content-Length el límite se verifica a medida que llega el cuerpo
+        respuesta = cliente.post("/subir-csv/jobs", headers=CABECERAS, content=en_trozos(formulario(b"1,a\n" * 100), 64))
+        assert respuesta.status_code == 413
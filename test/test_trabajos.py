@@ -0,0 +1,39 @@
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from trabajos import ColaLlena, ColaTrabajos
+
+def test_admision_por_tabla():
+    cola = ColaTrabajos(trabajadores=2, max_por_tabla=1, max_pendientes=1)
+    liberar = threading.Event()
+
+    def bloquear(trabajo):
+        trabajo.registrar(filas=10, bytes_leidos=50)
+        liberar.wait(5)
+        return "ok"
+
+    primero = cola.enviar("jobs", "copy", bloquear, bytes_totales=100)
+    # La misma tabla espera en la cola aunque quede un hilo libre
+    segundo = cola.enviar("jobs", "copy", bloquear)
+    assert segundo.estado == "en_cola"
+    with pytest.raises(ColaLlena):
+        cola.enviar("jobs", "copy", bloquear)
+
+    liberar.set()
+    cola.cerrar()
+    assert primero.estado == "completado" and primero.resultado == "ok"
+    assert primero.estado_actual()["progreso"] == 0.5
+
+def test_trabajo_fallido():
+    cola = ColaTrabajos()
+
+    def fallar(trabajo):
+        raise RuntimeError("sin conexión")
+
+    trabajo = cola.enviar("jobs", "copy", fallar)
+    cola.cerrar()
+    assert trabajo.estado == "fallido" and trabajo.error == "sin conexión"
@@ -0,0 +1,86 @@
+import sys
+import os
+import csv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from carga_masiva import convertir_fila
+from validar_datos import ValidadorCsv, validar_csv
+
+def test_validador_coincide_con_convertir_fila():
+    ruta = os.path.join(os.path.dirname(__file__), '..', 'data', 'hired_employees.csv')
+    validador = ValidadorCsv("hired_employees", tamano_bloque=333)
+    with open(ruta) as archivo:
+        obtenidas = list(validador.filas(csv.reader(archivo)))
+    with open(ruta) as archivo:
+        esperadas = [(i, convertir_fila("hired_employees", fila)) for i, fila in enumerate(csv.reader(archivo), 1)]
+    assert obtenidas == esperadas
+
+def test_validador_cuenta_problemas_por_categoria():
+    filas = [
+        ["1", "Ana", "2021-01-01T00:00:00Z", "1", "1"],
+        ["x", "Bea", "", "", ""],
+        ["", "Carla", "", "", ""],
+        ["4", "Dora", "no es fecha", "1", "1"],
+        ["5", "Eva", "2021-01-01T00:00:00Z", "99", "1"],
+        ["6", "Fer"],
+        ["7", "Gil", "2021-02-02T00:00:00", "1", "99999999999"],
+        ["8", " Hugo ", "", " 2 ", ""],
+        ["99999999999999999999", "Ivo", "", "", ""],
+    ]
+    validador = ValidadorCsv("hired_employees", tamano_bloque=3, ids_departamentos=[1, 2])
+    validas = list(validador.filas(filas))
+
+    assert validas == [
+        (1, (1, "Ana", "2021-01-01T00:00:00Z", 1, 1)),
+        (6, (6, "Fer", None, None, None)),
+        (8, (8, "Hugo", None, 2, None)),
+    ]
+    resumen = validador.resumen()
+    assert resumen["total_filas"] == 9 and resumen["filas_validas"] == 3
+    assert resumen["problemas"] == {
+        "id_no_numerico": 1,
+        "id_vacio": 1,
+        "datetime_invalido": 1,
+        "department_id_inexistente": 1,
+        "job_id_fuera_de_rango": 1,
+        "id_fuera_de_rango": 1,
+    }
+    assert resumen["ejemplos"]["datetime_invalido"] == [4]
+    # Como en convertir_fila, las columnas faltantes se completan en lugar de rechazar la fila
+    assert resumen["columnas_distintas"] == 1
+
+def test_validador_fechas_como_fromisoformat():
+    # NumPy acepta estas fechas en el camino rápido, pero fromisoformat y convertir_fila no
+    fechas = ["2021-01-01T00:00:00Z", "-2021-01-01", "10000-01-01T00:00", "+2021-01-01", "0000-01-01T00:00"]
+    filas = [[str(i), "Ana", fecha, "", ""] for i, fecha in enumerate(fechas, 1)]
+    validador = ValidadorCsv("hired_employees")
+    assert [numero for numero, _ in validador.validar_bloque(1, filas)] == [1]
+    assert validador.problemas == {"datetime_invalido": 4}
+
+def test_validador_recarga_ids_ante_una_falta():
+    departamentos = [1]
+    recargas = []
+
+    def recargar():
+        # Otro proceso creó el departamento 2 después de copiar los ids
+        recargas.append(True)
+        departamentos.append(2)
+        return True
+
+    validador = ValidadorCsv("hired_employees", ids_departamentos=departamentos, recargar_claves=recargar)
+    validas = validador.validar_bloque(1, [
+        ["1", "Ana", "2021-01-01T00:00:00Z", "2", ""],
+        ["2", "Beto", "2021-01-01T00:00:00Z", "3", ""],
+    ])
+    assert [numero for numero, _ in validas] == [1]
+    assert validador.problemas == {"department_id_inexistente": 1}
+    assert len(recargas) == 1
+
+def test_validar_csv_escribe_filas_validas(tmp_path):
+    entrada = tmp_path / "jobs.csv"
+    entrada.write_text("1,Analista\nx,Malo\n2,\n")
+    salida = tmp_path / "validas.csv"
+    resumen = validar_csv(str(entrada), 2, "jobs", ruta_salida=str(salida))
+    assert resumen["filas_validas"] == 2
+    assert salida.read_text().splitlines() == ["1,Analista", "2,"]
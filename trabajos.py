@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+class ColaLlena(Exception):
+    """Se lanza cuando ya hay demasiadas cargas pendientes."""
+
+class Trabajo:
+    """
+    Carga en segundo plano y su progreso.
+
+    Los contadores los actualiza el hilo que ejecuta la carga mediante registrar() y los
+    lee la API con estado_actual().
+    """
+
+    def __init__(self, tabla, modo, bytes_totales=None):
+        self.id = uuid.uuid4().hex
+        self.tabla = tabla
+        self.modo = modo
+        self.estado = "en_cola"
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        self.filas_procesadas = 0
+        self.filas_rechazadas = 0
+        self.bytes_procesados = 0
+        self.bytes_totales = bytes_totales
+        self.resultado = None
+        self.error = None
+
+    def registrar(self, filas=0, rechazadas=0, bytes_leidos=0):
+        """
+        Suma progreso a los contadores del trabajo.
+
+        Args:
+            filas (int): Filas leídas del archivo.
+            rechazadas (int): Filas descartadas por problemas.
+            bytes_leidos (int): Bytes del archivo ya procesados.
+        """
+        self.filas_procesadas += filas
+        self.filas_rechazadas += rechazadas
+        self.bytes_procesados += bytes_leidos
+
+    def estado_actual(self):
+        """
+        Returns:
+            dict: Estado, contadores, filas por segundo, ETA en segundos y resultado o error.
+        """
+        fin = self.terminado or time.time()
+        segundos = fin - self.iniciado if self.iniciado else 0
+        filas_por_segundo = round(self.filas_procesadas / segundos, 1) if segundos > 0 else None
+        eta = None
+        if self.estado == "en_curso" and self.bytes_totales and self.bytes_procesados and segundos > 0:
+            restantes = max(self.bytes_totales - self.bytes_procesados, 0)
+            eta = round(restantes / (self.bytes_procesados / segundos), 1)
+        return {
+            "id": self.id,
+            "tabla": self.tabla,
+            "modo": self.modo,
+            "estado": self.estado,
+            "filas_procesadas": self.filas_procesadas,
+            "filas_rechazadas": self.filas_rechazadas,
+            "filas_por_segundo": filas_por_segundo,
+            "progreso": round(self.bytes_procesados / self.bytes_totales, 4) if self.bytes_totales else None,
+            "eta_segundos": eta,
+            "segundos": round(segundos, 2),
+            "resultado": self.resultado,
+            "error": self.error,
+        }
+
+class ColaTrabajos:
+    """
+    Cola local de cargas con un pool acotado de hilos trabajadores.
+
+    Solo se despachan trabajos de una tabla si esa tabla tiene menos de `max_por_tabla`
+    cargas en curso; el resto espera en la cola sin ocupar un hilo. Si hay más de
+    `max_pendientes` trabajos en cola, los nuevos se rechazan.
+    """
+
+    def __init__(self, trabajadores=2, max_por_tabla=1, max_pendientes=32, max_historial=200):
+        self.max_por_tabla = max_por_tabla
+        self.max_pendientes = max_pendientes
+        self.max_historial = max_historial
+        self._trabajadores = trabajadores
+        self._ejecutor = None
+        self._pendientes = deque()
+        self._en_curso = {}
+        self._trabajos = OrderedDict()
+        self._candado = threading.Lock()
+
+    def enviar(self, tabla, modo, funcion, bytes_totales=None):
+        """
+        Encola una carga.
+
+        Args:
+            tabla (str): Tabla destino (para el control de admisión).
+            modo (str): Modo de carga, solo informativo.
+            funcion (callable): Recibe el Trabajo, ejecuta la carga y devuelve su resultado.
+            bytes_totales (int): Tamaño del archivo, para calcular la ETA.
+
+        Returns:
+            Trabajo: El trabajo creado.
+
+        Raises:
+            ColaLlena: Si ya hay `max_pendientes` trabajos esperando.
+        """
+        trabajo = Trabajo(tabla, modo, bytes_totales)
+        with self._candado:
+            if len(self._pendientes) >= self.max_pendientes:
+                raise ColaLlena("Hay demasiadas cargas pendientes, intente más tarde")
+            self._trabajos[trabajo.id] = trabajo
+            while len(self._trabajos) > self.max_historial:
+                antiguo = next(iter(self._trabajos.values()))
+                if antiguo.estado in ("en_cola", "en_curso"):
+                    break
+                self._trabajos.popitem(last=False)
+            self._pendientes.append((trabajo, funcion))
+            self._despachar()
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        """
+        Returns:
+            Trabajo: El trabajo con ese id, o None si no existe o ya salió del historial.
+        """
+        return self._trabajos.get(trabajo_id)
+
+    def _despachar(self):
+        # Debe llamarse con el candado tomado
+        en_curso = sum(self._en_curso.values())
+        for trabajo, funcion in list(self._pendientes):
+            if en_curso >= self._trabajadores:
+                break
+            if self._en_curso.get(trabajo.tabla, 0) >= self.max_por_tabla:
+                continue
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self._trabajadores, thread_name_prefix="carga")
+            self._pendientes.remove((trabajo, funcion))
+            self._en_curso[trabajo.tabla] = self._en_curso.get(trabajo.tabla, 0) + 1
+            en_curso += 1
+            self._ejecutor.submit(self._ejecutar, trabajo, funcion)
+
+    def _ejecutar(self, trabajo, funcion):
+        trabajo.estado = "en_curso"
+        trabajo.iniciado = time.time()
+        try:
+            trabajo.resultado = funcion(trabajo)
+            trabajo.estado = "completado"
+        except Exception as e:
+            trabajo.error = getattr(e, "detail", None) or str(e)
+            trabajo.estado = "fallido"
+        finally:
+            trabajo.terminado = time.time()
+            with self._candado:
+                self._en_curso[trabajo.tabla] -= 1
+                self._despachar()
+
+    def cerrar(self):
+        """Cancela los trabajos en cola y espera a que terminen los que están en curso."""
+        with self._candado:
+            for trabajo, _ in self._pendientes:
+                trabajo.estado = "fallido"
+                trabajo.error = "Cancelado al detener el servicio"
+            self._pendientes.clear()
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=True)
+
+cola_cargas = ColaTrabajos(
+    trabajadores=int(os.getenv("CARGA_TRABAJADORES", "2")),
+    max_por_tabla=int(os.getenv("CARGA_MAX_POR_TABLA", "1")),
+    max_pendientes=int(os.getenv("CARGA_MAX_PENDIENTES", "32")),
+)
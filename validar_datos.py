@@ -1,66 +1,269 @@
 import csv
-from collections import defaultdict
+import warnings
+from collections import Counter
 from datetime import datetime
+from itertools import islice
+import numpy as np
+from carga_masiva import COLUMNAS, COLUMNAS_ENTERAS, MAX_ENTERO
 
-def validar_csv(ruta_archivo, columnas_esperadas, tabla):
+# Filas que se procesan juntas como arreglos de columnas
+TAMANO_BLOQUE = 100_000
+# Números de fila de ejemplo que se guardan por categoría de problema
+MAX_EJEMPLOS = 5
+
+class ValidadorCsv:
+    """
+    Motor de validación por bloques y por columnas.
+
+    Cada bloque de filas se transpone a columnas y las conversiones y máscaras de
+    validación se calculan con NumPy sobre la columna completa; solo los bloques con
+    valores inválidos se revisan valor por valor para ubicarlos. Las filas válidas se entregan como
+    un iterador y los problemas solo se cuentan por categoría, así que la memoria
+    depende del tamaño del bloque y no del archivo.
     """
-    Valida un archivo CSV y reporta problemas en las filas.
-    
+
+    def __init__(self, tabla, columnas_esperadas=None, tamano_bloque=TAMANO_BLOQUE,
+                 ids_departamentos=None, ids_trabajos=None, rechazos=None, recargar_claves=None):
+        """
+        Args:
+            tabla (str): Nombre de la tabla (define las columnas y sus validaciones).
+            columnas_esperadas (int): Número de columnas esperadas; por defecto, las de la tabla.
+            tamano_bloque (int): Filas por bloque.
+            ids_departamentos (iterable): Ids válidos de departments para validar department_id.
+            ids_trabajos (iterable): Ids válidos de jobs para validar job_id.
+            rechazos (RegistroRechazos): Si se indica, cada fila inválida se escribe en él.
+            recargar_claves (callable): Si se indica, se llama cuando un bloque trae ids que no
+                están en ids_departamentos o ids_trabajos y devuelve si los recargó (por ejemplo
+                CacheDimensiones.recargar_por_falta); los ids se vuelven a leer antes de rechazar.
+        """
+        self.tabla = tabla
+        self.nombres = COLUMNAS[tabla]
+        self.columnas_esperadas = columnas_esperadas or len(self.nombres)
+        self.tamano_bloque = tamano_bloque
+        self._fuentes_claves = {}
+        if tabla == "hired_employees":
+            if ids_departamentos is not None:
+                self._fuentes_claves[3] = ids_departamentos
+            if ids_trabajos is not None:
+                self._fuentes_claves[4] = ids_trabajos
+        self.recargar_claves = recargar_claves
+        self._copiar_claves()
+        self.total_filas = 0
+        self.filas_validas = 0
+        self.problemas = Counter()
+        self.vacios = Counter()
+        self.columnas_distintas = 0
+        self.ejemplos = {}
+        self.rechazos = rechazos
+        self._bloque = None
+        self._inicio = 1
+
+    def _copiar_claves(self):
+        self.claves_foraneas = {
+            j: np.fromiter(ids, dtype=np.int64) for j, ids in self._fuentes_claves.items()
+        }
+
+    def _inexistentes(self, valido, vacias, enteros):
+        return {
+            j: valido & ~vacias[j] & ~np.isin(enteros[j], ids) for j, ids in self.claves_foraneas.items()
+        }
+
+    def _registrar(self, categoria, numeros):
+        if not len(numeros):
+            return
+        self.problemas[categoria] += len(numeros)
+        ejemplos = self.ejemplos.setdefault(categoria, [])
+        ejemplos.extend(numeros[:MAX_EJEMPLOS - len(ejemplos)].tolist())
+        if self.rechazos is not None:
+            for numero in numeros.tolist():
+                self.rechazos.registrar(numero, categoria, self._bloque[numero - self._inicio])
+
+    def _fechas_invalidas(self, valores):
+        # Camino rápido: todo el bloque se convierte de una vez
+        invalidas = np.fromiter(map(len, valores), dtype=np.int64, count=len(valores)) < 10
+        texto = np.array(valores, dtype=str)
+        try:
+            with warnings.catch_warnings():
+                # NumPy avisa al recibir el sufijo Z u otra zona horaria, pero la interpreta bien
+                warnings.simplefilter("ignore", DeprecationWarning)
+                fechas = texto.astype("datetime64[s]")
+            # NumPy también acepta años con signo, con más de cuatro cifras o el año 0, que
+            # fromisoformat rechaza: solo se confía en el camino rápido si todos los años
+            # tienen cuatro cifras y están entre 1 y 9999
+            anio_iso = np.char.isdigit(texto.astype("U4")) & (np.char.find(texto.astype("U5"), "-") == 4)
+            if anio_iso.all() and not (fechas < np.datetime64("0001-01-01")).any():
+                return invalidas
+        except ValueError:
+            pass
+        # Solo si el bloque tiene fechas inválidas se revisa valor por valor para ubicarlas
+        for k, valor in enumerate(valores):
+            try:
+                datetime.fromisoformat(valor.replace('Z', '+00:00'))
+            except ValueError:
+                invalidas[k] = True
+        return invalidas
+
+    def _enteros(self, valores):
+        # Camino rápido: conversión de la columna completa; devuelve (valores, máscara de inválidos)
+        try:
+            convertidos = np.array(valores, dtype=str).astype(np.int64)
+            return convertidos, np.zeros(len(valores), dtype=bool)
+        except (ValueError, OverflowError):
+            pass
+        convertidos = np.zeros(len(valores), dtype=np.int64)
+        invalidos = np.zeros(len(valores), dtype=bool)
+        for k, valor in enumerate(valores):
+            try:
+                entero = int(valor)
+            except ValueError:
+                invalidos[k] = True
+                continue
+            # Un entero que no entra en int64 es numérico: se acota al rango de int64 para que
+            # se informe fuera de rango y no como no numérico
+            convertidos[k] = max(min(entero, np.iinfo(np.int64).max), -np.iinfo(np.int64).max)
+        return convertidos, invalidos
+
+    def validar_bloque(self, inicio, filas):
+        """
+        Valida un bloque de filas crudas del CSV.
+
+        Args:
+            inicio (int): Número de fila (desde 1) de la primera fila del bloque.
+            filas (list): Filas leídas con csv.reader.
+
+        Returns:
+            list: Tuplas (número de fila, valores convertidos) de las filas válidas, con el
+                mismo formato que carga_masiva.convertir_fila.
+        """
+        n = len(filas)
+        k = len(self.nombres)
+        numeros = np.arange(inicio, inicio + n)
+        self._bloque, self._inicio = filas, inicio
+
+        # Como convertir_fila, las columnas faltantes se completan con NULL y las sobrantes se
+        # ignoran; solo se cuentan las filas con otro número de columnas
+        longitudes = np.fromiter(map(len, filas), dtype=np.int64, count=n)
+        self.columnas_distintas += int((longitudes != self.columnas_esperadas).sum())
+        valido = np.ones(n, dtype=bool)
+
+        relleno = [''] * k
+        columnas = [
+            list(map(str.strip, columna))
+            for columna in zip(*((fila + relleno)[:k] for fila in filas))
+        ]
+        vacias = [np.fromiter(map(len, columna), dtype=np.int64, count=n) == 0 for columna in columnas]
+        for j, nombre in enumerate(self.nombres):
+            self.vacios[nombre] += int((vacias[j] & valido).sum())
+
+        self._registrar("id_vacio", numeros[valido & vacias[0]])
+        valido &= ~vacias[0]
+
+        enteros = {}
+        for j in COLUMNAS_ENTERAS[self.tabla]:
+            nombre = self.nombres[j]
+            con_valor = np.flatnonzero(valido & ~vacias[j])
+            convertidos, invalidos = self._enteros([columnas[j][i] for i in con_valor.tolist()])
+            no_numerico = np.zeros(n, dtype=bool)
+            no_numerico[con_valor] = invalidos
+            valores = np.zeros(n, dtype=np.int64)
+            valores[con_valor] = convertidos
+            fuera_de_rango = ~no_numerico & (np.abs(valores) > MAX_ENTERO)
+            self._registrar(f"{nombre}_no_numerico", numeros[no_numerico])
+            self._registrar(f"{nombre}_fuera_de_rango", numeros[fuera_de_rango])
+            valido &= ~(no_numerico | fuera_de_rango)
+            enteros[j] = valores
+
+        if self.tabla == "hired_employees":
+            con_valor = np.flatnonzero(valido & ~vacias[2])
+            invalidas = np.zeros(n, dtype=bool)
+            invalidas[con_valor] = self._fechas_invalidas([columnas[2][i] for i in con_valor.tolist()])
+            self._registrar("datetime_invalido", numeros[invalidas])
+            valido &= ~invalidas
+
+        inexistentes = self._inexistentes(valido, vacias, enteros)
+        # Como IdsDimension en la carga fila por fila: un id desconocido recarga los ids antes de rechazar
+        if self.recargar_claves is not None and any(m.any() for m in inexistentes.values()):
+            if self.recargar_claves():
+                self._copiar_claves()
+                inexistentes = self._inexistentes(valido, vacias, enteros)
+        for j, inexistente in inexistentes.items():
+            self._registrar(f"{self.nombres[j]}_inexistente", numeros[inexistente])
+            valido &= ~inexistente
+
+        indices = np.flatnonzero(valido)
+        salida = []
+        for j in range(k):
+            nulos = vacias[j][indices].tolist()
+            if j in enteros:
+                valores = enteros[j][indices].tolist()
+            else:
+                valores = [columnas[j][i] for i in indices.tolist()]
+            salida.append([None if nulo else valor for valor, nulo in zip(valores, nulos)])
+        return list(zip(numeros[indices].tolist(), zip(*salida)))
+
+    def filas(self, lector):
+        """
+        Valida las filas de un lector CSV y entrega las válidas a medida que se procesan.
+
+        Args:
+            lector (iterable): Filas crudas, por ejemplo un csv.reader.
+
+        Yields:
+            tuple: (número de fila, valores convertidos) por cada fila válida.
+        """
+        lector = iter(lector)
+        inicio = 1
+        while True:
+            bloque = list(islice(lector, self.tamano_bloque))
+            if not bloque:
+                break
+            validas = self.validar_bloque(inicio, bloque)
+            self.total_filas += len(bloque)
+            self.filas_validas += len(validas)
+            inicio += len(bloque)
+            yield from validas
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Totales, problemas por categoría con filas de ejemplo, columnas vacías y filas
+                con un número de columnas distinto del esperado (completadas, no rechazadas).
+        """
+        return {
+            "total_filas": self.total_filas,
+            "filas_validas": self.filas_validas,
+            "problemas": dict(self.problemas),
+            "ejemplos": {categoria: filas for categoria, filas in self.ejemplos.items()},
+            "vacios": {nombre: cuenta for nombre, cuenta in self.vacios.items() if cuenta},
+            "columnas_distintas": self.columnas_distintas,
+        }
+
+def validar_csv(ruta_archivo, columnas_esperadas, tabla, ruta_salida=None, **opciones):
+    """
+    Valida un archivo CSV por bloques y reporta los problemas por categoría.
+
     Args:
         ruta_archivo (str): Ruta del archivo CSV.
         columnas_esperadas (int): Número de columnas esperadas.
         tabla (str): Nombre de la tabla (para personalizar las validaciones).
-    
+        ruta_salida (str): Si se indica, las filas válidas se escriben en este CSV.
+        **opciones: tamano_bloque, ids_departamentos e ids_trabajos para ValidadorCsv.
+
     Returns:
-        dict: Resumen de la validación (filas válidas, inválidas, problemas detectados).
+        dict: Resumen de la validación (total de filas, filas válidas, problemas por categoría).
     """
-    problemas = defaultdict(list)
-    filas_validas = []
-    
-    with open(ruta_archivo, 'r') as archivo:
-        lector = csv.reader(archivo)
-        for i, fila in enumerate(lector, 1):
-            # Verificar número de columnas
-            if len(fila) != columnas_esperadas:
-                problemas[f"Fila {i}: Número incorrecto de columnas"].append(fila)
-                continue
-            
-            # Verificar si la primera columna (id) es numérica y no está vacía
-            if not fila[0].strip():
-                problemas[f"Fila {i}: Columna 1 (id) vacía"].append(fila)
-                continue
-            try:
-                id_valor = int(fila[0])
-            except ValueError:
-                problemas[f"Fila {i}: Columna 1 (id) no es numérica"].append(fila)
-                continue
-            
-            # Verificar valores vacíos o inválidos
-            fila_procesada = []
-            for j, valor in enumerate(fila):
-                valor = valor.strip()
-                if not valor:
-                    problemas[f"Fila {i}: Columna {j+1} vacía"].append(fila)
-                # Validaciones específicas para hired_employees
-                if tabla == "hired_employees":
-                    if j == 2 and valor:  # datetime
-                        try:
-                            datetime.fromisoformat(valor.replace('Z', '+00:00'))
-                        except ValueError:
-                            problemas[f"Fila {i}: Columna 3 (datetime) no tiene formato ISO 8601"].append(fila)
-                    if j in (3, 4) and valor:  # department_id, job_id
-                        try:
-                            int(valor)
-                        except ValueError:
-                            problemas[f"Fila {i}: Columna {j+1} no es numérica"].append(fila)
-                fila_procesada.append(valor)
-            filas_validas.append(fila_procesada)
-    
-    return {
-        "filas_validas": filas_validas,
-        "problemas": dict(problemas),
-        "total_filas": i
-    }
+    validador = ValidadorCsv(tabla, columnas_esperadas, **opciones)
+    with open(ruta_archivo, 'r', newline='') as archivo:
+        filas = validador.filas(csv.reader(archivo))
+        if ruta_salida is None:
+            for _ in filas:
+                pass
+        else:
+            with open(ruta_salida, 'w', newline='') as salida:
+                escritor = csv.writer(salida)
+                for _, valores in filas:
+                    escritor.writerow(valores)
+    return validador.resumen()
 
 # Ejemplo de uso
 rutas_archivos = {
@@ -74,5 +277,6 @@ if __name__ == "__main__":
         resultado = validar_csv(ruta, columnas, tabla)
         print(f"Validación de {tabla}:")
         print(f"Total de filas: {resultado['total_filas']}")
-        print(f"Filas válidas: {len(resultado['filas_validas'])}")
-        print("Problemas encontrados:", resultado["problemas"])
\ No newline at end of file
+        print(f"Filas válidas: {resultado['filas_validas']}")
+        print("Problemas encontrados:", resultado["problemas"])
+        print("Columnas vacías:", resultado["vacios"])